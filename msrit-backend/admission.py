@@ -0,0 +1,259 @@
+"""
+Admission control and per-client rate limiting for the Ollama proxy routes.
+
+Each client (API key from the X-API-Key header, otherwise the client IP) gets a
+token bucket of RATE_LIMIT_RPS requests per second with bursts of
+RATE_LIMIT_BURST. Admitted requests then need a generation slot: at most
+ADMISSION_MAX_CONCURRENT in total and ADMISSION_MAX_PER_MODEL per model. When
+no slot is free the request waits in a bounded queue for up to
+ADMISSION_QUEUE_TIMEOUT seconds, ordered by the SCHEDULER_POLICY; a full queue
+or an expired wait is rejected with 429 and a Retry-After header.
+
+A slot is taken only around an upstream generation (see slot() and
+take_slot()) and held until it ends, including a streamed one. Requests
+answered from a cache, sharing an identical generation already in flight or
+resuming a stream never queue for one.
+"""
+
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+from flask import g, jsonify, request
+import config
+import scheduler
+
+
+class Rejected(Exception):
+    """Raised when a request is not admitted; carries a Retry-After hint"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucketLimiter:
+    """Per-client token buckets, keeping only the most recently seen clients"""
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()  # client -> [tokens, updated]
+        self._lock = threading.Lock()
+
+    def check(self, client: str) -> None:
+        """Take one token for client or raise Rejected"""
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = [self.burst, now]
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] < 1:
+                raise Rejected("Rate limit exceeded.", (1 - bucket[0]) / self.rate)
+            bucket[0] -= 1
+
+
+class _Waiter:
+    def __init__(self, req: scheduler.Request):
+        self.req = req
+        self.event = threading.Event()
+        self.granted = False
+
+
+class AdmissionController:
+    """Global and per-model caps on concurrent generations with a bounded queue
+
+    Queued requests are ordered by the scheduling policy (see scheduler.py).
+    """
+
+    def __init__(self, max_concurrent: int, max_per_model: int, queue_size: int, queue_timeout: float, policy=None):
+        self.max_concurrent = max_concurrent
+        self.max_per_model = max_per_model
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.policy = policy or scheduler.FifoPolicy()
+        self._lock = threading.Lock()
+        self._queue = []
+        self.active = 0
+        self.active_per_model = Counter()
+        self.admitted = 0
+        self.rejected = Counter()
+        self.waited = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _has_room(self, model: str) -> bool:
+        return self.active < self.max_concurrent and self.active_per_model[model] < self.max_per_model
+
+    def _grant(self, model: str) -> None:
+        self.active += 1
+        self.active_per_model[model] += 1
+        self.admitted += 1
+
+    def acquire(self, req: scheduler.Request) -> None:
+        """Take a slot for req, waiting in the queue if needed, or raise Rejected
+
+        A request acquired again after a rejection keeps the tag it was first
+        given, so retrying does not push its client further back.
+        """
+        with self._lock:
+            if not self._queue and self._has_room(req.model):
+                if req.tag is None:
+                    self.policy.enqueue(req)
+                self.policy.dispatched(req)
+                self._grant(req.model)
+                return
+            if len(self._queue) >= self.queue_size:
+                self.rejected["queue_full"] += 1
+                raise Rejected("Server is busy, please retry.", self.queue_timeout)
+            if req.tag is None:
+                self.policy.enqueue(req)
+            waiter = _Waiter(req)
+            self._queue.append(waiter)
+
+        start = time.monotonic()
+        waiter.event.wait(self.queue_timeout)
+        waited = time.monotonic() - start
+
+        with self._lock:
+            if not waiter.granted:
+                self._queue.remove(waiter)
+                self.rejected["queue_timeout"] += 1
+                raise Rejected("Timed out waiting for a free slot.", self.queue_timeout)
+            self.waited += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def release(self, model: str) -> None:
+        """Free a slot and hand free slots to the queued requests the policy picks"""
+        with self._lock:
+            self.active -= 1
+            self.active_per_model[model] -= 1
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self._queue and self.active < self.max_concurrent:
+            eligible = [w for w in self._queue if self._has_room(w.req.model)]
+            if not eligible:
+                return
+            waiter = min(eligible, key=lambda w: w.req.tag)
+            self._queue.remove(waiter)
+            self.policy.dispatched(waiter.req)
+            self._grant(waiter.req.model)
+            waiter.granted = True
+            waiter.event.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "active": self.active,
+                "active_per_model": {m: n for m, n in self.active_per_model.items() if n},
+                "queue_depth": len(self._queue),
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+                "queue_waits": self.waited,
+                "queue_wait_seconds_total": round(self.wait_seconds_total, 6),
+                "queue_wait_seconds_max": round(self.wait_seconds_max, 6)
+            }
+
+
+limiter = TokenBucketLimiter(config.RATE_LIMIT_RPS, config.RATE_LIMIT_BURST)
+controller = AdmissionController(
+    config.ADMISSION_MAX_CONCURRENT,
+    config.ADMISSION_MAX_PER_MODEL,
+    config.ADMISSION_QUEUE_SIZE,
+    config.ADMISSION_QUEUE_TIMEOUT,
+    scheduler.build_policy()
+)
+
+
+def client_ip() -> str:
+    """Client address; behind RATE_LIMIT_TRUSTED_PROXIES proxies, the X-Forwarded-For entry the outermost one added"""
+    hops = config.RATE_LIMIT_TRUSTED_PROXIES
+    if hops:
+        forwarded = [a.strip() for a in request.headers.get('X-Forwarded-For', '').split(',') if a.strip()]
+        if len(forwarded) >= hops:
+            return forwarded[-hops]
+    return request.remote_addr
+
+
+def client_key() -> str:
+    """Rate-limit key for the current request: API key if given, else client IP"""
+    api_key = request.headers.get('X-API-Key')
+    return f"key:{api_key}" if api_key else f"ip:{client_ip()}"
+
+
+def rejected_response(e: Rejected):
+    """429 response with a Retry-After header for a rejected request"""
+    response = jsonify({"error": str(e)})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, math.ceil(e.retry_after)))
+    return response
+
+
+def install(app, endpoints: Dict[str, str], model_for=None) -> None:
+    """Put rate limiting in front of the given Flask endpoints and note how they queue for a slot
+
+    endpoints maps endpoint names to scheduling priority classes (see
+    scheduler.PRIORITIES). model_for(data) returns the model a request will
+    use; by default the 'model' field of the JSON body or OLLAMA_MODEL. The
+    route takes the slot itself, with pending(), when it calls Ollama.
+    """
+    def default_model_for(data: dict) -> str:
+        return data.get('model', config.OLLAMA_MODEL)
+
+    model_for = model_for or default_model_for
+
+    @app.before_request
+    def admit_request():
+        priority = endpoints.get(request.endpoint)
+        if priority is None:
+            return None
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            data = {}  # The route itself rejects the body
+        client = client_key()
+        model = model_for(data)
+        if not isinstance(model, str):
+            return None  # The route rejects the body before calling Ollama
+        try:
+            limiter.check(client)
+        except Rejected as e:
+            return rejected_response(e)
+        g.admission_request = scheduler.Request(model, client, priority, scheduler.estimate_cost(data))
+        return None
+
+
+def pending() -> Optional[scheduler.Request]:
+    """How the current request queues for a generation slot, if its route is admitted"""
+    return g.get('admission_request')
+
+
+def take_slot(req: Optional[scheduler.Request]) -> Callable[[], None]:
+    """Take a generation slot for req, or raise Rejected; returns the function that frees it"""
+    if req is None:
+        return lambda: None
+    controller.acquire(req)
+    return lambda: controller.release(req.model)
+
+
+@contextmanager
+def slot(req: Optional[scheduler.Request]):
+    """Hold a generation slot for req while the block calls Ollama"""
+    release = take_slot(req)
+    try:
+        yield
+    finally:
+        release()
@@ -1,12 +1,63 @@
 from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-import requests
-import json
+import time
 import config
+import ollama_client
+import model_catalog
+import response_cache
+import sessions
+import admission
+import batch
+import metrics
+import tracing
+import sse_relay
+import model_lifecycle
+import semantic_cache
+import fast_json
+import pipeline
+import conversation_log
 
 app = Flask(__name__, static_folder='static')
 CORS(app, origins=config.ALLOWED_ORIGINS)
 
+# Parse and serialize JSON bodies with orjson when it is installed
+fast_json.install(app)
+
+# Request counts, latencies and upstream timings, served at /metrics
+metrics.install(app)
+
+# Spans per route and Ollama call (when TRACING_ENABLED)
+tracing.install(app)
+
+# Load the default and hot models now rather than on the first request
+model_lifecycle.manager.start()
+
+def admission_model(data):
+    """Model a proxied request will run on, used for per-model admission caps"""
+    session_id = (request.view_args or {}).get('session_id')
+    session = sessions.store.get(session_id) if session_id else None
+    return session.model if session else data.get('model', config.OLLAMA_MODEL)
+
+# Rate limiting in front of every route that calls Ollama; each takes an
+# admission slot only around its upstream call
+admission.install(app, {
+    'stream_chat': 'interactive',
+    'stream_session_message': 'interactive',
+    'chat': 'standard',
+    'session_message': 'standard',
+    'generate': 'batch',
+    'stream_generate': 'batch'
+}, model_for=admission_model)
+
+# The four proxy routes share one pipeline; hooks add caching, keep_alive hints
+# and the conversation log
+chat_route = pipeline.Route("chat", stream=False, hooks=[
+    pipeline.KeepAlive(), pipeline.ResponseCache(), pipeline.SemanticCache(), pipeline.ConversationLog()])
+stream_chat_route = pipeline.Route("chat", stream=True, hooks=[
+    pipeline.KeepAlive(), pipeline.ResponseCache(), pipeline.SemanticCache(), pipeline.ConversationLog()])
+generate_route = pipeline.Route("generate", stream=False, hooks=[pipeline.KeepAlive(), pipeline.ResponseCache()])
+stream_generate_route = pipeline.Route("generate", stream=True, hooks=[pipeline.KeepAlive(), pipeline.ResponseCache()])
+
 @app.route('/')
 def index():
     """Serve the index page"""
@@ -14,185 +65,232 @@ def index():
 
 @app.route('/api/models', methods=['GET'])
 def get_models():
-    """Get available models from Ollama"""
+    """Get available models from Ollama (cached, revalidate with If-None-Match)"""
     try:
-        response = requests.get(f"{config.OLLAMA_API_BASE}/tags")
-        if response.status_code == 200:
-            return jsonify(response.json())
-        else:
-            return jsonify({"error": f"Failed to fetch models: {response.text}"}), 500
-    except Exception as e:
-        return jsonify({"error": f"Error connecting to Ollama: {str(e)}"}), 500
+        body, etag = model_catalog.catalog.snapshot()
+    except model_catalog.CatalogError as e:
+        return jsonify({"error": str(e)}), 500
+    
+    response = Response(body, content_type='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """Chat endpoint for non-streaming responses"""
-    data = request.json
-    
-    if not data or 'messages' not in data:
-        return jsonify({"error": "Invalid request. 'messages' field is required."}), 400
-    
-    model = data.get('model', config.OLLAMA_MODEL)
-    
-    try:
-        # Format the conversation history for Ollama
-        payload = {
-            "model": model,
-            "messages": data['messages'],
-            "stream": False
-        }
-        
-        # Optional parameters
-        if 'temperature' in data:
-            payload['temperature'] = data['temperature']
-        if 'top_p' in data:
-            payload['top_p'] = data['top_p']
-        if 'top_k' in data:
-            payload['top_k'] = data['top_k']
-        
-        response = requests.post(
-            f"{config.OLLAMA_API_BASE}/chat",
-            json=payload
-        )
-        
-        if response.status_code == 200:
-            return jsonify(response.json())
-        else:
-            return jsonify({"error": f"Ollama API error: {response.text}"}), response.status_code
-    
-    except Exception as e:
-        return jsonify({"error": f"Error: {str(e)}"}), 500
+    return chat_route.handle()
 
 @app.route('/api/chat/stream', methods=['POST'])
 def stream_chat():
     """Chat endpoint for streaming responses"""
-    data = request.json
-    
-    if not data or 'messages' not in data:
-        return jsonify({"error": "Invalid request. 'messages' field is required."}), 400
-    
-    model = data.get('model', config.OLLAMA_MODEL)
-    
-    def generate():
-        try:
-            # Format the conversation history for Ollama
-            payload = {
-                "model": model,
-                "messages": data['messages'],
-                "stream": True
-            }
-            
-            # Optional parameters
-            if 'temperature' in data:
-                payload['temperature'] = data['temperature']
-            if 'top_p' in data:
-                payload['top_p'] = data['top_p']
-            if 'top_k' in data:
-                payload['top_k'] = data['top_k']
-            
-            with requests.post(
-                f"{config.OLLAMA_API_BASE}/chat",
-                json=payload,
-                stream=True
-            ) as response:
-                if response.status_code != 200:
-                    error_msg = {'error': f'Ollama API error: {response.text}'}
-                    yield f"data: {json.dumps(error_msg)}\n\n"
-                    return
-                
-                for line in response.iter_lines():
-                    if line:
-                        yield f"data: {line.decode('utf-8')}\n\n"
-        
-        except Exception as e:
-            error_msg = {'error': str(e)}
-            yield f"data: {json.dumps(error_msg)}\n\n"
-    
-    return Response(stream_with_context(generate()), content_type='text/event-stream')
+    return stream_chat_route.handle()
 
 @app.route('/api/generate', methods=['POST'])
 def generate():
     """Generate endpoint for non-streaming text generation"""
-    data = request.json
+    return generate_route.handle()
+
+@app.route('/api/generate/batch', methods=['POST'])
+def generate_batch():
+    """Batch endpoint: generate a list of prompts, streaming NDJSON results as they finish"""
+    data = request.get_json(silent=True)
+    
+    prompts = data.get('prompts') if isinstance(data, dict) else None
+    if not isinstance(prompts, list) or not prompts or not all(isinstance(p, str) for p in prompts):
+        return jsonify({"error": "Invalid request. 'prompts' must be a non-empty list of strings."}), 400
+    
+    # The shared fields are checked as for /api/generate
+    error = pipeline.validators['generate']({**data, 'prompt': prompts[0]})
+    if error is not None:
+        return jsonify({"error": error}), 400
     
-    if not data or 'prompt' not in data:
-        return jsonify({"error": "Invalid request. 'prompt' field is required."}), 400
+    concurrency = data.get('concurrency', config.BATCH_MAX_CONCURRENCY)
+    if not isinstance(concurrency, int) or isinstance(concurrency, bool) or concurrency < 1:
+        return jsonify({"error": "Invalid request. 'concurrency' must be a positive integer."}), 400
     
     model = data.get('model', config.OLLAMA_MODEL)
+    if not model_catalog.catalog.is_known(model):
+        return jsonify({"error": f"Model '{model}' not found."}), 404
+    metrics.set_model(model)
     
+    client = admission.client_key()
     try:
-        payload = {
-            "model": model,
-            "prompt": data['prompt'],
-            "stream": False
-        }
-        
-        # Optional parameters
-        if 'temperature' in data:
-            payload['temperature'] = data['temperature']
-        if 'top_p' in data:
-            payload['top_p'] = data['top_p']
-        if 'top_k' in data:
-            payload['top_k'] = data['top_k']
-        
-        response = requests.post(
-            f"{config.OLLAMA_API_BASE}/generate",
-            json=payload
-        )
-        
-        if response.status_code == 200:
-            return jsonify(response.json())
-        else:
-            return jsonify({"error": f"Ollama API error: {response.text}"}), response.status_code
+        admission.limiter.check(client)
+    except admission.Rejected as e:
+        return admission.rejected_response(e)
     
-    except Exception as e:
-        return jsonify({"error": f"Error: {str(e)}"}), 500
+    # Shared fields and options for every prompt, built as for /api/generate
+    template = pipeline.build_payload('generate', data, model, stream=False)
+    template.setdefault('keep_alive', model_lifecycle.manager.keep_alive(model))
+    payloads = [{**template, "prompt": prompt} for prompt in prompts]
+    
+    # Job mode: run in the background and poll for results
+    if data.get('job'):
+        job = batch.jobs.start(payloads, client, concurrency)
+        return jsonify(job.to_dict()), 202
+    
+    def generate_ndjson():
+        for result in batch.run(payloads, client, concurrency):
+            yield fast_json.dumps(result) + b"\n"
+    
+    return Response(stream_with_context(generate_ndjson()), content_type='application/x-ndjson')
+
+@app.route('/api/generate/batch/<job_id>', methods=['GET'])
+def get_batch_job(job_id):
+    """Poll a batch job; ?offset=N resumes from the Nth finished result"""
+    job = batch.jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found."}), 404
+    
+    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', None, type=int)
+    return jsonify(job.to_dict(offset, limit))
 
 @app.route('/api/generate/stream', methods=['POST'])
 def stream_generate():
     """Generate endpoint for streaming text generation"""
-    data = request.json
-    
-    if not data or 'prompt' not in data:
-        return jsonify({"error": "Invalid request. 'prompt' field is required."}), 400
+    return stream_generate_route.handle()
+
+@app.route('/api/sessions', methods=['POST'])
+def create_session():
+    """Create a conversation session kept on the server"""
+    data = request.get_json(silent=True) or {}
+    error = pipeline.validate_session(data)
+    if error is not None:
+        return jsonify({"error": error}), 400
     
     model = data.get('model', config.OLLAMA_MODEL)
+    if not model_catalog.catalog.is_known(model):
+        return jsonify({"error": f"Model '{model}' not found."}), 404
+    metrics.set_model(model)
     
-    def generate_stream():
-        try:
-            payload = {
-                "model": model,
-                "prompt": data['prompt'],
-                "stream": True
-            }
+    session = sessions.store.create(model, data.get('system'))
+    return jsonify(session.to_dict()), 201
+
+@app.route('/api/sessions/<session_id>', methods=['GET'])
+def get_session(session_id):
+    """Get the history of a session"""
+    session = sessions.store.get(session_id)
+    if session is None:
+        return jsonify({"error": "Session not found."}), 404
+    return jsonify(session.to_dict())
+
+@app.route('/api/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    """End a session"""
+    if not sessions.store.delete(session_id):
+        return jsonify({"error": "Session not found."}), 404
+    return '', 204
+
+@app.route('/api/sessions/<session_id>/messages', methods=['POST'])
+def session_message(session_id):
+    """Send the next user message in a session and return the reply"""
+    session = sessions.store.get(session_id)
+    if session is None:
+        return jsonify({"error": "Session not found."}), 404
+    
+    data = request.get_json(silent=True)
+    error = pipeline.validate_session_message(data)
+    if error is not None:
+        return jsonify({"error": error}), 400
+    metrics.set_model(session.model)
+    
+    try:
+        with session.lock:
+            with admission.slot(admission.pending()):
+                response = ollama_client.post("/chat", session.payload(data['content'], stream=False))
             
-            # Optional parameters
-            if 'temperature' in data:
-                payload['temperature'] = data['temperature']
-            if 'top_p' in data:
-                payload['top_p'] = data['top_p']
-            if 'top_k' in data:
-                payload['top_k'] = data['top_k']
+            if response.status_code != 200:
+                return jsonify({"error": f"Ollama API error: {response.text}"}), response.status_code
             
-            with requests.post(
-                f"{config.OLLAMA_API_BASE}/generate",
-                json=payload,
-                stream=True
-            ) as response:
-                if response.status_code != 200:
-                    error_msg = {'error': f'Ollama API error: {response.text}'}
-                    yield f"data: {json.dumps(error_msg)}\n\n"
-                    return
-                
-                for line in response.iter_lines():
-                    if line:
-                        yield f"data: {line.decode('utf-8')}\n\n"
+            result = response.json()
+            metrics.record_generation("chat", session.model, result)
+            session.commit(data['content'], result.get('message', {}).get('content', ''))
+            return jsonify({**result, "session_id": session.id})
+    
+    except admission.Rejected as e:
+        return admission.rejected_response(e)
+    except Exception as e:
+        return jsonify({"error": f"Error: {str(e)}"}), 500
+
+@app.route('/api/sessions/<session_id>/messages/stream', methods=['POST'])
+def stream_session_message(session_id):
+    """Send the next user message in a session and stream the reply"""
+    session = sessions.store.get(session_id)
+    if session is None:
+        return jsonify({"error": "Session not found."}), 404
+    
+    data = request.get_json(silent=True)
+    error = pipeline.validate_session_message(data)
+    if error is not None:
+        return jsonify({"error": error}), 400
+    metrics.set_model(session.model)
+    
+    def generate():
+        try:
+            with session.lock:
+                payload = session.payload(data['content'], stream=True)
+                started = time.perf_counter()
+                with ollama_client.post("/chat", payload, stream=True) as response:
+                    if response.status_code != 200:
+                        yield sse_relay.frame({'error': f'Ollama API error: {response.text}'})
+                        return
+                    
+                    # Lines are parsed once, when the reply is complete
+                    framer = sse_relay.Framer()
+                    received = []
+                    for chunk in sse_relay.iter_chunks(response):
+                        lines = framer.feed(chunk)
+                        if not lines:
+                            continue
+                        if not received:
+                            metrics.record_ttft("chat", session.model, started)
+                        received.append(lines)
+                        if sse_relay.is_done(lines):
+                            # Record the turn before the client sees the end of the reply
+                            chunks = sse_relay.parse(received)
+                            session.commit(data['content'], ''.join(c.get('message', {}).get('content', '') for c in chunks))
+                            metrics.record_generation("chat", session.model, chunks[-1] if chunks else None)
+                        yield sse_relay.frame_lines(lines)
         
         except Exception as e:
-            error_msg = {'error': str(e)}
-            yield f"data: {json.dumps(error_msg)}\n\n"
+            yield sse_relay.frame({'error': str(e)})
     
-    return Response(stream_with_context(generate_stream()), content_type='text/event-stream')
+    # The slot is held until the response is closed
+    try:
+        release = admission.take_slot(admission.pending())
+    except admission.Rejected as e:
+        return admission.rejected_response(e)
+    response = Response(stream_with_context(generate()), content_type='text/event-stream')
+    response.call_on_close(release)
+    return response
+
+@app.route('/api/backends', methods=['GET'])
+def get_backends():
+    """Get health, models and in-flight request counts for each Ollama endpoint"""
+    return jsonify({"endpoints": ollama_client.pool.stats()})
+
+@app.route('/api/admission/stats', methods=['GET'])
+def get_admission_stats():
+    """Get active generations, queue depth, queue wait times and rejections"""
+    return jsonify(admission.controller.stats())
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Get response cache and semantic cache hit, miss and eviction counters"""
+    return jsonify({**response_cache.stats(), "semantic": semantic_cache.stats()})
+
+@app.route('/api/conversations/stats', methods=['GET'])
+def get_conversation_log_stats():
+    """Get conversation log queue depth and written, dropped and failed counts"""
+    return jsonify(conversation_log.stats())
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 200 once the pinned models are loaded in Ollama, else 503"""
+    status = model_lifecycle.manager.status()
+    return jsonify(status), 200 if status["ready"] else 503
 
 @app.route('/api/config', methods=['GET'])
 def get_config():
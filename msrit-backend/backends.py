@@ -0,0 +1,117 @@
+"""
+Model routing and load balancing across several Ollama instances.
+
+Each endpoint tracks its outstanding requests, the models it serves (from a
+cached /api/tags probe) and its health. Requests go to the healthy endpoint
+that serves the requested model with the fewest requests in flight. An endpoint
+that fails BACKEND_EJECT_FAILURES times in a row is ejected for
+BACKEND_EJECT_SECONDS; a background thread re-probes every endpoint every
+BACKEND_HEALTH_INTERVAL seconds to refresh models and readmit it.
+"""
+
+import threading
+import time
+from typing import Callable, List, Optional
+import config
+
+
+class Endpoint:
+    """One Ollama instance, identified by its API base URL"""
+
+    def __init__(self, base: str):
+        self.base = base
+        self.in_flight = 0
+        self.models = set()
+        self.models_updated = 0.0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.total_requests = 0
+
+    @property
+    def healthy(self) -> bool:
+        return self.ejected_until <= time.monotonic()
+
+    def serves(self, model: Optional[str]) -> bool:
+        return model is None or model in self.models
+
+    def to_dict(self) -> dict:
+        return {
+            "base": self.base,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "total_requests": self.total_requests,
+            "consecutive_failures": self.failures,
+            "models": sorted(self.models)
+        }
+
+
+class Pool:
+    """Least-outstanding-requests balancer with health checks and outlier ejection"""
+
+    def __init__(self, bases: List[str], probe: Callable[[str], List[str]]):
+        self.endpoints = [Endpoint(base) for base in bases]
+        self._probe = probe  # base URL -> model names, raises when unhealthy
+        self._lock = threading.Lock()
+        self._checker = None
+
+    def choose(self, model: Optional[str] = None) -> Endpoint:
+        """Reserve the best endpoint for a request; pair with release()"""
+        self._start_health_checks()
+        with self._lock:
+            healthy = [e for e in self.endpoints if e.healthy] or self.endpoints
+            # Prefer endpoints known to have the model; fall back to any healthy one
+            candidates = [e for e in healthy if e.serves(model)] or healthy
+            endpoint = min(candidates, key=lambda e: e.in_flight)
+            endpoint.in_flight += 1
+            endpoint.total_requests += 1
+            return endpoint
+
+    def release(self, endpoint: Endpoint, ok: bool) -> None:
+        """Finish a request started with choose() and record its outcome"""
+        with self._lock:
+            endpoint.in_flight -= 1
+            self._record(endpoint, ok)
+
+    def _record(self, endpoint: Endpoint, ok: bool) -> None:
+        if ok:
+            endpoint.failures = 0
+            return
+        endpoint.failures += 1
+        if endpoint.failures >= config.BACKEND_EJECT_FAILURES:
+            endpoint.ejected_until = time.monotonic() + config.BACKEND_EJECT_SECONDS
+
+    def check(self, endpoint: Endpoint) -> None:
+        """Probe one endpoint and refresh its model list"""
+        try:
+            models = self._probe(endpoint.base)
+        except Exception:
+            with self._lock:
+                self._record(endpoint, False)
+            return
+        with self._lock:
+            endpoint.models = set(models)
+            endpoint.models_updated = time.monotonic()
+            endpoint.ejected_until = 0.0
+            self._record(endpoint, True)
+
+    def check_all(self) -> None:
+        for endpoint in self.endpoints:
+            self.check(endpoint)
+
+    def _start_health_checks(self) -> None:
+        if self._checker is not None or config.BACKEND_HEALTH_INTERVAL <= 0:
+            return
+        with self._lock:
+            if self._checker is not None:
+                return
+            self._checker = threading.Thread(target=self._health_loop, daemon=True)
+        self._checker.start()
+
+    def _health_loop(self) -> None:
+        while True:
+            self.check_all()
+            time.sleep(config.BACKEND_HEALTH_INTERVAL)
+
+    def stats(self) -> List[dict]:
+        with self._lock:
+            return [endpoint.to_dict() for endpoint in self.endpoints]
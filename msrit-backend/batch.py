@@ -0,0 +1,137 @@
+"""
+Batch generation: many prompts with shared options in one request.
+
+Prompts run with bounded concurrency (BATCH_MAX_CONCURRENCY) and results come
+back in completion order, each tagged with the index of its prompt. A failing
+prompt yields an error result and never aborts the rest of the batch. Each
+prompt still takes an admission slot at batch priority, so a large batch
+cannot starve interactive chat; a prompt that gets no slot within
+BATCH_ADMISSION_TIMEOUT seconds yields an error result.
+
+Large batches can run as background jobs instead. Their results are kept for
+BATCH_JOB_TTL seconds and can be polled, or resumed after a dropped
+connection, from any offset.
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List, Optional
+import config
+import admission
+import metrics
+import ollama_client
+import response_cache
+import scheduler
+
+
+def generate_one(payload: dict, client: str) -> dict:
+    """Run one prompt: response cache first, then Ollama under an admission slot"""
+    cache_key = response_cache.key_for("generate", payload)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return json.loads(cached)
+
+    req = scheduler.Request(payload["model"], client, "batch", scheduler.estimate_cost(payload))
+    deadline = time.monotonic() + config.BATCH_ADMISSION_TIMEOUT
+    while True:
+        try:
+            admission.controller.acquire(req)
+            break
+        except admission.Rejected as e:
+            # Batches are not latency sensitive: back off and queue again, keeping the request's place
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError(f"No generation slot within {config.BATCH_ADMISSION_TIMEOUT} seconds: {e}")
+            time.sleep(min(e.retry_after, 5, remaining))
+
+    try:
+        response = ollama_client.post("/generate", payload)
+    finally:
+        admission.controller.release(payload["model"])
+
+    if response.status_code != 200:
+        raise RuntimeError(f"Ollama API error: {response.text}")
+    response_cache.put(cache_key, response.content)
+    result = response.json()
+    metrics.record_generation("generate", payload["model"], result)
+    return result
+
+
+def run(payloads: List[dict], client: str, concurrency: int) -> Iterator[dict]:
+    """Yield one result per payload in completion order, tagged with its index"""
+    executor = ThreadPoolExecutor(max_workers=max(1, min(concurrency, config.BATCH_MAX_CONCURRENCY)))
+    try:
+        futures = {executor.submit(generate_one, payload, client): index for index, payload in enumerate(payloads)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                yield {"index": index, **future.result()}
+            except Exception as e:
+                yield {"index": index, "error": str(e)}
+    finally:
+        # Stop queued prompts if the consumer went away
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class BatchJob:
+    """A batch running in the background, with results kept for polling"""
+
+    def __init__(self, total: int):
+        self.id = uuid.uuid4().hex
+        self.total = total
+        self.results: List[dict] = []
+        self.status = "running"
+        self.finished_at = None
+
+    def to_dict(self, offset: int = 0, limit: Optional[int] = None) -> dict:
+        end = len(self.results) if limit is None else offset + limit
+        results = self.results[offset:end]
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "total": self.total,
+            "completed": len(self.results),
+            "results": results,
+            "next_offset": offset + len(results)
+        }
+
+
+class JobStore:
+    """Background batch jobs; finished jobs are dropped after BATCH_JOB_TTL seconds"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._jobs: "OrderedDict[str, BatchJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, payloads: List[dict], client: str, concurrency: int) -> BatchJob:
+        job = BatchJob(len(payloads))
+
+        def worker():
+            for result in run(payloads, client, concurrency):
+                job.results.append(result)
+            job.status = "done"
+            job.finished_at = time.monotonic()
+
+        with self._lock:
+            self._evict()
+            self._jobs[job.id] = job
+        threading.Thread(target=worker, daemon=True).start()
+        return job
+
+    def get(self, job_id: str) -> Optional[BatchJob]:
+        with self._lock:
+            self._evict()
+            return self._jobs.get(job_id)
+
+    def _evict(self) -> None:
+        cutoff = time.monotonic() - self.ttl
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+
+jobs = JobStore(config.BATCH_JOB_TTL)
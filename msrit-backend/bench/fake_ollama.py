@@ -0,0 +1,183 @@
+"""
+Stand-in Ollama server for benchmarks.
+
+Implements /api/tags, /api/ps, /api/chat, /api/generate and /api/embeddings,
+streaming and not, with a configurable time to first token, token rate and reply length,
+so a benchmark measures the proxy rather than a model. Final frames carry the
+same eval_count, eval_duration and prompt_eval_duration fields as Ollama.
+Errors can be injected as 500 responses or as streams cut off part way.
+
+Usage:
+    python bench/fake_ollama.py [--port 11500] [--ttft 0.2] [--token-rate 50]
+                                [--tokens 64] [--error-rate 0] [--drop-rate 0]
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ["the", "model", "streams", "tokens", "back", "to", "the", "proxy", "one", "at", "a", "time"]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Fake Ollama server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--models", default="gemma3:1b", help="Comma-separated model names to serve")
+    parser.add_argument("--ttft", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="Tokens per second after the first")
+    parser.add_argument("--tokens", type=int, default=64, help="Tokens per reply")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 500")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Fraction of streams cut off half way")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, Nagle's
+    # algorithm and delayed ACKs add ~40ms to every reply
+    disable_nagle_algorithm = True
+    settings = build_parser().parse_args([])
+    rng = random.Random(0)
+    loaded = {}  # model -> keep_alive of its last load request
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            models = [{"name": name, "size": 0} for name in self.settings.models.split(",")]
+            self._send_json(200, {"models": models})
+        elif self.path == "/api/ps":
+            models = [{"name": name, "model": name, "keep_alive": keep_alive} for name, keep_alive in self.loaded.items()]
+            self._send_json(200, {"models": models})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        body = self._read_json()
+        kind = self.path.rsplit("/", 1)[-1]
+        if kind not in ("chat", "generate", "embeddings"):
+            self._send_json(404, {"error": "not found"})
+            return
+        if body.get("model") not in self.settings.models.split(","):
+            self._send_json(404, {"error": f"model '{body.get('model')}' not found"})
+            return
+        if self.rng.random() < self.settings.error_rate:
+            self._send_json(500, {"error": "injected error"})
+            return
+        if kind == "generate" and "prompt" not in body:
+            # A generate request without a prompt only loads the model
+            self.loaded[body["model"]] = body.get("keep_alive")
+            self._send_json(200, {"model": body["model"], "response": "", "done": True, "done_reason": "load"})
+            return
+        if kind == "embeddings":
+            digest = hashlib.sha256((body.get("prompt") or "").encode()).digest()
+            self._send_json(200, {"embedding": [b / 255 for b in digest]})
+            return
+
+        prompt = body.get("prompt") or "".join(m.get("content") or "" for m in body.get("messages") or [])
+        if body.get("stream", True):
+            self._stream(kind, body["model"], prompt)
+        else:
+            self._reply(kind, body["model"], prompt)
+
+    def _frame(self, kind: str, model: str, text: str) -> dict:
+        if kind == "chat":
+            return {"model": model, "message": {"role": "assistant", "content": text}, "done": False}
+        return {"model": model, "response": text, "done": False}
+
+    def _final(self, kind: str, model: str, prompt: str, text: str = "") -> dict:
+        s = self.settings
+        frame = self._frame(kind, model, text)
+        frame.update({
+            "done": True,
+            "done_reason": "stop",
+            "prompt_eval_count": len(prompt) // 4 + 1,
+            "prompt_eval_duration": int(s.ttft * 1e9),
+            "eval_count": s.tokens,
+            "eval_duration": int(s.tokens / s.token_rate * 1e9),
+            "total_duration": int((s.ttft + s.tokens / s.token_rate) * 1e9)
+        })
+        return frame
+
+    def _reply(self, kind: str, model: str, prompt: str) -> None:
+        s = self.settings
+        time.sleep(s.ttft + (s.tokens - 1) / s.token_rate)
+        text = " ".join(WORDS[i % len(WORDS)] for i in range(s.tokens))
+        self._send_json(200, self._final(kind, model, prompt, text))
+
+    def _stream(self, kind: str, model: str, prompt: str) -> None:
+        s = self.settings
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        drop_at = s.tokens // 2 if self.rng.random() < s.drop_rate else None
+        start = time.monotonic() + s.ttft
+        try:
+            for i in range(s.tokens):
+                # Sleep to an absolute schedule so the rate does not drift
+                delay = start + i / s.token_rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                if i == drop_at:
+                    self.close_connection = True
+                    return
+                word = WORDS[i % len(WORDS)] + " "
+                self._write_chunk(json.dumps(self._frame(kind, model, word)).encode() + b"\n")
+            self._write_chunk(json.dumps(self._final(kind, model, prompt)).encode() + b"\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients closing keep-alive connections is expected, not an error
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def serve(settings) -> FakeOllamaServer:
+    """Create a fake Ollama server for settings (see build_parser)"""
+    FakeOllamaHandler.settings = settings
+    FakeOllamaHandler.rng = random.Random(settings.seed)
+    FakeOllamaHandler.loaded = {}
+    return FakeOllamaServer((settings.host, settings.port), FakeOllamaHandler)
+
+
+def main():
+    settings = build_parser().parse_args()
+    server = serve(settings)
+    print(f"Fake Ollama on http://{settings.host}:{settings.port}/api "
+          f"(ttft {settings.ttft}s, {settings.token_rate} tokens/s, {settings.tokens} tokens)")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
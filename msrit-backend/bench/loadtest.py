@@ -0,0 +1,318 @@
+"""
+Load test for the routes of app.py and langraph-chat.py.
+
+Starts the fake Ollama server (bench/fake_ollama.py) and each app in its own
+process (bench/target.py), then drives every proxy route at each concurrency
+level and records per route:
+
+- latency p50/p95/p99, and time to first frame (TTFT) for streams
+- relay overhead: client latency minus the time the fake Ollama takes to
+  produce the reply, i.e. what the proxy adds
+- server CPU time per request and resident memory per open connection,
+  read from /proc for the app process (Linux only)
+
+Each request carries a unique prompt so identical-request coalescing does not
+hide upstream work; pass --identical to measure coalescing instead. Results are
+written as JSON tagged with the git commit, and two result files can be
+compared with --compare.
+
+Usage:
+    python bench/loadtest.py [--apps app.py,langraph-chat.py] [--concurrency 1,8,32]
+                             [--requests 64] [--ttft 0.2] [--token-rate 50] [--tokens 64]
+                             [--output bench-results.json]
+    python bench/loadtest.py --compare old.json new.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+MODEL = "gemma3:1b"
+
+# name, method, path, body kind, streamed, apps serving the route
+ROUTES = [
+    ("models", "GET", "/api/models", None, False, ("app.py", "langraph-chat.py")),
+    ("config", "GET", "/api/config", None, False, ("app.py", "langraph-chat.py")),
+    ("chat", "POST", "/api/chat", "chat", False, ("app.py", "langraph-chat.py")),
+    ("chat_stream", "POST", "/api/chat/stream", "chat", True, ("app.py", "langraph-chat.py")),
+    ("generate", "POST", "/api/generate", "generate", False, ("app.py",)),
+    ("generate_stream", "POST", "/api/generate/stream", "generate", True, ("app.py",)),
+    ("generate_batch", "POST", "/api/generate/batch", "batch", False, ("app.py",)),
+    ("session_message", "POST", "/api/sessions/{session}/messages", "session", False, ("app.py", "langraph-chat.py")),
+    ("session_message_stream", "POST", "/api/sessions/{session}/messages/stream", "session", True, ("app.py", "langraph-chat.py")),
+]
+
+BATCH_SIZE = 4
+
+
+def percentiles(values: List[float]) -> Optional[dict]:
+    if not values:
+        return None
+    values = sorted(values)
+
+    def pick(pct):
+        return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+    return {"p50": round(pick(50), 3), "p95": round(pick(95), 3), "p99": round(pick(99), 3), "max": round(values[-1], 3)}
+
+
+def proc_cpu_seconds(pid: int) -> float:
+    """User plus system CPU time of a process"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def proc_rss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except Exception:
+        return None
+
+
+def wait_ready(url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+class Driver:
+    """Sends one route's requests from a pool of client threads"""
+
+    def __init__(self, base: str, route: tuple, args):
+        self.base = base
+        self.name, self.method, self.path, self.body_kind, self.streamed, _ = route
+        self.args = args
+        self.counter = itertools.count()
+        self.local = threading.local()
+
+    def _session(self) -> requests.Session:
+        # One keep-alive connection (and one chat session) per client thread
+        if not hasattr(self.local, "http"):
+            self.local.http = requests.Session()
+            if self.body_kind == "session":
+                response = self.local.http.post(f"{self.base}/api/sessions", json={"model": MODEL})
+                self.local.session_id = response.json()["session_id"]
+        return self.local.http
+
+    def _body(self, n: int) -> Optional[dict]:
+        prompt = "Benchmark prompt" if self.args.identical else f"Benchmark prompt {n}"
+        if self.body_kind == "chat":
+            return {"model": MODEL, "messages": [{"role": "user", "content": prompt}]}
+        if self.body_kind == "generate":
+            return {"model": MODEL, "prompt": prompt}
+        if self.body_kind == "batch":
+            return {"model": MODEL, "prompts": [f"{prompt}.{i}" for i in range(BATCH_SIZE)], "concurrency": BATCH_SIZE}
+        if self.body_kind == "session":
+            return {"content": prompt}
+        return None
+
+    def upstream_seconds(self) -> float:
+        """Time the fake Ollama needs for one reply on this route"""
+        if self.body_kind is None:
+            return 0.0
+        # Prompts of a batch run side by side (BATCH_SIZE <= BATCH_MAX_CONCURRENCY)
+        return self.args.ttft + (self.args.tokens - 1) / self.args.token_rate
+
+    def one(self) -> dict:
+        http = self._session()
+        path = self.path.format(session=getattr(self.local, "session_id", ""))
+        start = time.perf_counter()
+        ttft = None
+        frames = 0
+        error = None
+        try:
+            response = http.request(self.method, f"{self.base}{path}", json=self._body(next(self.counter)),
+                                    stream=self.streamed, timeout=300)
+            if response.status_code >= 400:
+                error = f"status_{response.status_code}"
+            if self.streamed:
+                for line in response.iter_lines():
+                    if not line.startswith(b"data:"):
+                        continue
+                    if ttft is None:
+                        ttft = time.perf_counter() - start
+                    frames += 1
+                    if b'"error"' in line:
+                        error = "stream_error"
+            else:
+                response.content
+            response.close()
+        except requests.RequestException as e:
+            error = type(e).__name__
+        return {"latency": time.perf_counter() - start, "ttft": ttft, "frames": frames, "error": error}
+
+
+def run_level(base: str, route: tuple, concurrency: int, pid: int, args) -> dict:
+    """Drive one route at one concurrency level and summarize it"""
+    driver = Driver(base, route, args)
+    total = max(args.requests, concurrency)
+
+    # Sample memory while the connections are open
+    rss_before = proc_rss_kb(pid)
+    peak = [rss_before]
+    stop = threading.Event()
+
+    def sample():
+        while not stop.wait(0.05):
+            peak[0] = max(peak[0], proc_rss_kb(pid))
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    cpu_before = proc_cpu_seconds(pid)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda _: driver.one(), range(total)))
+    elapsed = time.perf_counter() - started
+    cpu = proc_cpu_seconds(pid) - cpu_before
+    stop.set()
+    sampler.join()
+
+    ok = [r for r in results if r["error"] is None]
+    errors = {}
+    for r in results:
+        if r["error"]:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+    upstream = driver.upstream_seconds()
+    return {
+        "route": driver.name,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": round(total / elapsed, 2),
+        "latency_ms": percentiles([r["latency"] * 1000 for r in ok]),
+        "ttft_ms": percentiles([r["ttft"] * 1000 for r in ok if r["ttft"] is not None]),
+        "relay_overhead_ms": percentiles([(r["latency"] - upstream) * 1000 for r in ok]) if upstream else None,
+        "frames_per_request": round(sum(r["frames"] for r in ok) / len(ok), 1) if ok and driver.streamed else None,
+        "cpu_ms_per_request": round(cpu * 1000 / total, 3),
+        "rss_kb_per_connection": round(max(0, peak[0] - rss_before) / concurrency, 1)
+    }
+
+
+def run_app(app: str, port: int, args) -> List[dict]:
+    ollama = f"http://127.0.0.1:{args.ollama_port}/api"
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, "target.py"), app, "--port", str(port), "--ollama", ollama],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(f"{base}/api/config")
+        results = []
+        for route in ROUTES:
+            if app not in route[5] or (args.routes and route[0] not in args.routes):
+                continue
+            # Warm up connections, the model catalog and lazy threads
+            run_level(base, route, 1, process.pid, argparse.Namespace(**{**vars(args), "requests": 2}))
+            for concurrency in args.concurrency:
+                result = run_level(base, route, concurrency, process.pid, args)
+                result["app"] = app
+                results.append(result)
+                print(f"{app:18} {result['route']:24} c={concurrency:<4} "
+                      f"p50={result['latency_ms'] and result['latency_ms']['p50']}ms "
+                      f"errors={sum(result['errors'].values())}", file=sys.stderr)
+        return results
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def compare(old_path: str, new_path: str) -> None:
+    """Print p50/p95 latency and CPU changes between two result files"""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    before = {(r["app"], r["route"], r["concurrency"]): r for r in old["results"]}
+    print(f"{'app':18} {'route':24} {'c':>4} {'p50 ms':>16} {'p95 ms':>16} {'cpu ms/req':>16}")
+    for r in new["results"]:
+        o = before.get((r["app"], r["route"], r["concurrency"]))
+        if o is None or not o["latency_ms"] or not r["latency_ms"]:
+            continue
+
+        def delta(a, b):
+            return f"{a:.1f}->{b:.1f}"
+
+        print(f"{r['app']:18} {r['route']:24} {r['concurrency']:>4} "
+              f"{delta(o['latency_ms']['p50'], r['latency_ms']['p50']):>16} "
+              f"{delta(o['latency_ms']['p95'], r['latency_ms']['p95']):>16} "
+              f"{delta(o['cpu_ms_per_request'], r['cpu_ms_per_request']):>16}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the backend routes against a fake Ollama")
+    parser.add_argument("--apps", default="app.py,langraph-chat.py")
+    parser.add_argument("--routes", default="", help="Comma-separated route names (default: all)")
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--requests", type=int, default=64, help="Requests per route and concurrency level")
+    parser.add_argument("--ttft", type=float, default=0.2)
+    parser.add_argument("--token-rate", type=float, default=50.0)
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--identical", action="store_true", help="Send identical prompts (measures coalescing)")
+    parser.add_argument("--ollama-port", type=int, default=11500)
+    parser.add_argument("--port", type=int, default=5100)
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+    args.routes = [r for r in args.routes.split(",") if r]
+
+    # The fake Ollama gets its own process so it does not compete with the driver for the GIL
+    fake = subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, "fake_ollama.py"),
+        "--port", str(args.ollama_port), "--ttft", str(args.ttft), "--token-rate", str(args.token_rate),
+        "--tokens", str(args.tokens), "--error-rate", str(args.error_rate), "--drop-rate", str(args.drop_rate)
+    ], stdout=subprocess.DEVNULL)
+
+    results = []
+    try:
+        wait_ready(f"http://127.0.0.1:{args.ollama_port}/api/tags")
+        for offset, app in enumerate(a for a in args.apps.split(",") if a):
+            results.extend(run_app(app, args.port + offset, args))
+    finally:
+        fake.terminate()
+        fake.wait()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
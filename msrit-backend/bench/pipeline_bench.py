@@ -0,0 +1,174 @@
+"""
+Micro-benchmark of the per-request CPU cost of the /api/chat proxy pipeline.
+
+Sends a large multi-turn chat request through two Flask apps in-process, with
+Ollama replaced by a stub transport adapter (no network), and compares:
+
+- legacy: the former app.py route: request.json and jsonify with the standard
+  json module, payload rebuilt field by field, the upstream body encoded by
+  requests and the reply parsed and re-serialized
+- pipeline: the route built with pipeline.Route, schema validation compiled
+  at import, fast_json (orjson when installed) for every parse and dump, and
+  the reply passed through as received
+
+Both run the same catalog check, coalescing and keep_alive hint, so the
+difference is the request handling itself.
+
+Usage:
+    python bench/pipeline_bench.py [--turns 10,100,400] [--chars 400] [--requests 300] [--repeat 5]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import requests
+from flask import Flask, jsonify, request
+from requests.adapters import HTTPAdapter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+config.BACKEND_HEALTH_INTERVAL = 0
+config.WARMUP_ENABLED = False
+config.RESPONSE_CACHE_ENABLED = False
+config.SEMANTIC_CACHE_ENABLED = False
+
+import fast_json
+import metrics
+import model_catalog
+import model_lifecycle
+import ollama_client
+import pipeline
+import singleflight
+
+TAGS = json.dumps({"models": [{"name": config.OLLAMA_MODEL}]}).encode()
+
+
+class StubAdapter(HTTPAdapter):
+    """Answers every Ollama call from memory"""
+
+    def __init__(self, reply: bytes):
+        super().__init__()
+        self.reply = reply
+
+    def send(self, prepared, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = TAGS if prepared.url.endswith("/tags") else self.reply
+        response.headers["Content-Type"] = "application/json"
+        response.url = prepared.url
+        response.request = prepared
+        return response
+
+
+def build_request(turns: int, chars: int) -> dict:
+    messages = [{"role": "system", "content": "You are a helpful AI assistant."}]
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"question {i} " + "x" * chars})
+        messages.append({"role": "assistant", "content": f"answer {i} " + "y" * chars})
+    messages.append({"role": "user", "content": "and one more question"})
+    return {"model": config.OLLAMA_MODEL, "messages": messages, "temperature": 0.7, "top_p": 0.9}
+
+
+def build_reply(chars: int) -> bytes:
+    return json.dumps({
+        "model": config.OLLAMA_MODEL, "created_at": "2025-01-01T00:00:00Z",
+        "message": {"role": "assistant", "content": "z" * chars},
+        "done": True, "done_reason": "stop", "total_duration": 1, "prompt_eval_count": 10,
+        "prompt_eval_duration": 1, "eval_count": 10, "eval_duration": 1
+    }).encode()
+
+
+def legacy_app() -> Flask:
+    app = Flask("legacy")
+
+    @app.route('/api/chat', methods=['POST'])
+    def chat():
+        data = request.json
+        if not data or 'messages' not in data:
+            return jsonify({"error": "Invalid request. 'messages' field is required."}), 400
+        model = data.get('model', config.OLLAMA_MODEL)
+        if not model_catalog.catalog.is_known(model):
+            return jsonify({"error": f"Model '{model}' not found."}), 404
+        payload = {"model": model, "messages": data['messages'], "stream": False}
+        if 'temperature' in data:
+            payload['temperature'] = data['temperature']
+        if 'top_p' in data:
+            payload['top_p'] = data['top_p']
+        if 'top_k' in data:
+            payload['top_k'] = data['top_k']
+        payload['keep_alive'] = model_lifecycle.manager.keep_alive(model)
+
+        canonical = {k: v for k, v in payload.items() if k not in ('stream', 'keep_alive')}
+        blob = json.dumps(canonical, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        flight_key = f"chat:{hashlib.sha256(blob.encode('utf-8')).hexdigest()}"
+
+        def post():
+            response = ollama_client.session.post(f"{config.OLLAMA_API_BASE}/chat", json=payload)
+            metrics.record_generation("chat", model, response.json())
+            return response
+
+        response = singleflight.calls.do(flight_key, post)
+        return jsonify(response.json())
+
+    return app
+
+
+def pipeline_app() -> Flask:
+    app = Flask("pipeline")
+    fast_json.install(app)
+    route = pipeline.Route("chat", stream=False, hooks=[
+        pipeline.KeepAlive(), pipeline.ResponseCache(), pipeline.SemanticCache()])
+
+    @app.route('/api/chat', methods=['POST'])
+    def chat():
+        return route.handle()
+
+    return app
+
+
+def measure(app: Flask, body: bytes, requests_: int, repeat: int) -> float:
+    """Best of repeat runs, in CPU microseconds per request"""
+    client = app.test_client()
+    headers = {"Content-Type": "application/json"}
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        for _ in range(requests_):
+            response = client.post('/api/chat', data=body, headers=headers)
+            assert response.status_code == 200, response.data
+            response.close()
+        best = min(best, time.process_time() - start)
+    return best * 1e6 / requests_
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request CPU cost of the /api/chat pipeline")
+    parser.add_argument("--turns", default="10,100,400", help="Comma-separated conversation lengths (user/assistant pairs)")
+    parser.add_argument("--chars", type=int, default=400, help="Characters per message")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    stub = StubAdapter(build_reply(args.chars))
+    ollama_client.session.mount("http://", stub)
+    ollama_client.session.mount("https://", stub)
+    model_catalog.catalog.refresh()
+    apps = {"legacy": legacy_app(), "pipeline": pipeline_app()}
+
+    results = {"codec": "orjson" if fast_json.orjson is not None else "json"}
+    for turns in map(int, args.turns.split(",")):
+        body = json.dumps(build_request(turns, args.chars)).encode()
+        row = {"request_bytes": len(body)}
+        for name, app in apps.items():
+            row[f"{name}_us_per_request"] = round(measure(app, body, args.requests, args.repeat), 1)
+        row["speedup"] = round(row["legacy_us_per_request"] / row["pipeline_us_per_request"], 2)
+        results[f"turns_{turns}"] = row
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
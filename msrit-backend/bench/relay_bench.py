@@ -0,0 +1,143 @@
+"""
+Micro-benchmark of the per-token CPU cost of relaying an Ollama stream as SSE.
+
+Feeds a synthetic Ollama /api/chat stream through a requests.Response (no
+network) and compares:
+
+- app_lines: the former app.py relay, iter_lines() then decode, f-string and
+  encode per line
+- app_raw: the sse_relay framing used by app.py now
+- langgraph_json: the former LangGraph node, json.loads and json.dumps per
+  token plus string concatenation of the reply
+- langgraph_raw: the sse_relay framing plus one parse of the whole reply
+
+Usage:
+    python bench/relay_bench.py [--streams 200] [--tokens 256] [--lines-per-read 1] [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sse_relay
+
+
+class FakeRaw:
+    """Stands in for urllib3's response, yielding pre-built network reads"""
+
+    chunked = True
+
+    def __init__(self, reads):
+        self._reads = reads
+
+    def stream(self, chunk_size=None, decode_content=True):
+        return iter(self._reads)
+
+
+def build_reads(tokens: int, lines_per_read: int) -> list:
+    lines = [
+        json.dumps({"model": "gemma3:1b", "created_at": "2025-01-01T00:00:00Z",
+                    "message": {"role": "assistant", "content": f"tok{i} "}, "done": False}).encode() + b"\n"
+        for i in range(tokens)
+    ]
+    lines.append(json.dumps({"model": "gemma3:1b", "message": {"role": "assistant", "content": ""},
+                             "done": True, "eval_count": tokens, "eval_duration": 1}).encode() + b"\n")
+    return [b"".join(lines[i:i + lines_per_read]) for i in range(0, len(lines), lines_per_read)]
+
+
+def response_for(reads: list) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = FakeRaw(reads)
+    return response
+
+
+def app_lines(response):
+    for line in response.iter_lines():
+        if line:
+            yield f"data: {line.decode('utf-8')}\n\n".encode('utf-8')
+
+
+def app_raw(response):
+    framer = sse_relay.Framer()
+    for chunk in sse_relay.iter_chunks(response):
+        lines = framer.feed(chunk)
+        if lines:
+            yield from sse_relay.line_frames(lines)
+
+
+def langgraph_json(response):
+    full_response = ""
+    for line in response.iter_lines():
+        if line:
+            data = json.loads(line.decode('utf-8'))
+            if "message" in data and "content" in data["message"]:
+                chunk = data["message"]["content"]
+                full_response += chunk
+                frame = json.dumps({"message": {"content": chunk}, "done": False})
+                yield f"data: {frame}\n\n".encode('utf-8')
+            if data.get("done", False):
+                break
+
+
+def langgraph_raw(response):
+    framer = sse_relay.Framer()
+    received = []
+    for chunk in sse_relay.iter_chunks(response):
+        lines = framer.feed(chunk)
+        if not lines:
+            continue
+        received.append(lines)
+        done = sse_relay.is_done(lines)
+        if done:
+            lines = lines[:max(lines.rfind(b"\n"), 0)]
+        if lines:
+            yield from sse_relay.line_frames(lines)
+        if done:
+            break
+    "".join((c.get("message") or {}).get("content", "") for c in sse_relay.parse(received))
+
+
+RELAYS = {
+    "app_lines": app_lines,
+    "app_raw": app_raw,
+    "langgraph_json": langgraph_json,
+    "langgraph_raw": langgraph_raw
+}
+
+
+def measure(relay, reads: list, streams: int, tokens: int, repeat: int) -> dict:
+    """Best of repeat runs, in CPU nanoseconds per token"""
+    best = float("inf")
+    for _ in range(repeat):
+        writes = 0
+        start = time.process_time()
+        for _ in range(streams):
+            for _ in relay(response_for(reads)):
+                writes += 1
+        best = min(best, time.process_time() - start)
+    return {
+        "ns_per_token": round(best * 1e9 / (streams * tokens), 1),
+        "writes_per_stream": round(writes / streams, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-token CPU cost of the SSE relay")
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--tokens", type=int, default=256)
+    parser.add_argument("--lines-per-read", type=int, default=1, help="NDJSON lines per network read")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    reads = build_reads(args.tokens, args.lines_per_read)
+    results = {name: measure(relay, reads, args.streams, args.tokens, args.repeat) for name, relay in RELAYS.items()}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Micro-benchmark of the BM25 retrieval index (retrieval.py).
+
+Generates a synthetic corpus with a Zipf-distributed vocabulary, builds the
+index into a temporary directory and reports the build time, index size, the
+time to open it (memory-mapped) and the latency of retrieval.augment() per
+question: search, budget selection and prompt assembly.
+
+Usage:
+    python bench/retrieval_bench.py [--documents 2000] [--words 1500] [--vocabulary 50000]
+                                    [--queries 2000] [--seed 0]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import config
+import retrieval
+
+
+def percentile(values, p):
+    return float(np.percentile(values, p))
+
+
+def write_corpus(directory: str, documents: int, words: int, vocabulary: list, rng: random.Random) -> None:
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    for d in range(documents):
+        text = rng.choices(vocabulary, weights, k=words)
+        # Paragraphs of 60 to 120 words
+        paragraphs, i = [], 0
+        while i < len(text):
+            n = rng.randint(60, 120)
+            paragraphs.append(" ".join(text[i:i + n]) + ".")
+            i += n
+        with open(os.path.join(directory, f"doc{d:05d}.txt"), "w") as f:
+            f.write("\n\n".join(paragraphs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build time, size and query latency of the retrieval index")
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=1500, help="Words per document")
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = [f"w{i}" for i in range(args.vocabulary)]
+    with tempfile.TemporaryDirectory() as temp:
+        docs, output = os.path.join(temp, "docs"), os.path.join(temp, "index")
+        os.makedirs(docs)
+        write_corpus(docs, args.documents, args.words, vocabulary, rng)
+        build = retrieval.build_index(docs, output, config.RETRIEVAL_PASSAGE_TOKENS, 1.2, 0.75)
+
+        started = time.perf_counter()
+        retrieval.index = retrieval.RetrievalIndex(output)
+        open_ms = (time.perf_counter() - started) * 1000
+
+        # Questions mix common and rare words, as real ones do
+        questions = [
+            " ".join(rng.choice(vocabulary[:200]) if rng.random() < 0.5 else rng.choice(vocabulary)
+                     for _ in range(rng.randint(3, 10)))
+            for _ in range(args.queries)
+        ]
+        for question in questions[:50]:
+            retrieval.augment([{"role": "user", "content": question}])
+        latencies = []
+        for question in questions:
+            started = time.perf_counter()
+            retrieval.augment([{"role": "user", "content": question}])
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    print(json.dumps({
+        "build": build,
+        "open_ms": round(open_ms, 3),
+        "query_ms": {
+            "mean": round(sum(latencies) / len(latencies), 4),
+            "p50": round(percentile(latencies, 50), 4),
+            "p95": round(percentile(latencies, 95), 4),
+            "p99": round(percentile(latencies, 99), 4)
+        }
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Run app.py or langraph-chat.py against a benchmark Ollama server.
+
+Points the app at the given Ollama URL and, unless asked otherwise, lifts the
+per-client rate limit and admission caps so a load test measures the proxy
+itself rather than the limits in front of it.
+
+Usage:
+    python bench/target.py app.py --port 5100 --ollama http://127.0.0.1:11500/api
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a backend app for benchmarking")
+    parser.add_argument("app", choices=["app.py", "langraph-chat.py"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5100)
+    parser.add_argument("--ollama", default="http://127.0.0.1:11500/api")
+    parser.add_argument("--keep-limits", action="store_true", help="Keep rate limiting and admission caps from config.py")
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    import config
+
+    # Must be set before the app imports ollama_client, which builds its pool
+    config.OLLAMA_API_BASE = args.ollama
+    config.OLLAMA_ENDPOINTS = [args.ollama]
+    config.FLASK_DEBUG = False
+    if not args.keep_limits:
+        config.RATE_LIMIT_RPS = 0
+        config.ADMISSION_MAX_CONCURRENT = 10000
+        config.ADMISSION_MAX_PER_MODEL = 10000
+
+    spec = importlib.util.spec_from_file_location("bench_target", os.path.join(BACKEND_DIR, args.app))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.app.run(host=args.host, port=args.port, debug=False, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,12 +7,130 @@ FLASK_HOST = "0.0.0.0"
 FLASK_PORT = 5000
 FLASK_DEBUG = True
 
+# Production server configuration (serve.py)
+SERVER_WORKERS = 1             # Processes; sessions, admission slots and stream resumption are per process
+SERVER_THREADS = 128           # Request threads per process; each open stream holds one
+SERVER_KEEP_ALIVE = 75         # Seconds to keep idle client connections open
+
 # Ollama configuration
 OLLAMA_HOST = "ollama-service.msrit-chatbot.svc.cluster.local"
 OLLAMA_PORT = 11434
 OLLAMA_MODEL = "gemma3:1b"  # Default model
 OLLAMA_API_BASE = f"http://{OLLAMA_HOST}:{OLLAMA_PORT}/api"
 
+# Ollama instances to balance across (API base URLs); requests are routed by model
+OLLAMA_ENDPOINTS = [OLLAMA_API_BASE]
+BACKEND_HEALTH_INTERVAL = 10   # Seconds between /tags probes of each endpoint (0 disables)
+BACKEND_PROBE_TIMEOUT = 5      # Read timeout for a health probe
+BACKEND_EJECT_FAILURES = 3     # Consecutive failures before an endpoint is ejected
+BACKEND_EJECT_SECONDS = 30     # How long an ejected endpoint receives no traffic
+MODEL_CATALOG_TTL = 60         # Seconds before the cached /api/models list is refreshed
+
+# Model warm-up and keep_alive hints (OLLAMA_MODEL is always kept warm)
+WARMUP_ENABLED = True
+WARMUP_MODELS = []             # Further models to load at startup and keep resident
+WARMUP_INTERVAL = 60           # Seconds between keep-warm refreshes
+WARMUP_RETRY_INTERVAL = 5      # Seconds between attempts while a pinned model is not loaded
+WARMUP_HOT_RPM = 2.0           # Requests per minute that make an unpinned model kept warm too
+WARMUP_TRAFFIC_WINDOW = 600    # Seconds of traffic used for hot models and keep_alive hints
+KEEP_ALIVE_MIN = "5m"          # keep_alive for rarely used models (Ollama's default)
+KEEP_ALIVE_MAX = "1h"          # keep_alive for pinned models and the upper bound of hints
+KEEP_ALIVE_GAP_FACTOR = 4      # Hints cover this many typical gaps between a model's requests
+
+# Admission control in front of the Ollama proxy routes
+ADMISSION_MAX_CONCURRENT = 8   # Generations running at once across all models
+ADMISSION_MAX_PER_MODEL = 4    # Generations running at once per model
+ADMISSION_QUEUE_SIZE = 32      # Requests allowed to wait for a slot (0 rejects at once)
+ADMISSION_QUEUE_TIMEOUT = 30   # Seconds a queued request waits before a 429
+SCHEDULER_POLICY = "fair"      # "fair" (priority classes + fair share) or "fifo"
+SCHEDULER_CLIENT_WEIGHTS = {}  # Fair-share weight per client key, e.g. {"key:grader": 0.5}
+
+# Batch generation (/api/generate/batch)
+BATCH_MAX_CONCURRENCY = 4      # Prompts of one batch sent to Ollama at once
+BATCH_JOB_TTL = 3600           # Seconds finished background jobs stay pollable
+BATCH_ADMISSION_TIMEOUT = 300  # Seconds a batch prompt keeps retrying for a slot before it fails
+
+# Per-client rate limiting (keyed on X-API-Key, else client IP)
+RATE_LIMIT_RPS = 0             # Sustained requests per second per client (0 disables)
+RATE_LIMIT_BURST = 10          # Requests a client may send in a burst
+RATE_LIMIT_TRUSTED_PROXIES = 0 # Proxies in front that append to X-Forwarded-For (e.g. 1 behind the ingress)
+
+# Ollama HTTP client configuration
+OLLAMA_POOL_SIZE = 32          # Max keep-alive connections to Ollama
+OLLAMA_CONNECT_TIMEOUT = 5     # Seconds to wait for a TCP connection
+OLLAMA_READ_TIMEOUT = 300      # Seconds to wait between bytes (covers model load)
+OLLAMA_MAX_RETRIES = 3         # Retries for idempotent calls (e.g. /tags)
+OLLAMA_RETRY_BACKOFF = 0.5     # Backoff factor in seconds between retries
+
+# Streaming configuration
+STREAM_QUEUE_SIZE = 64         # Chunks buffered per stream before the producer blocks
+STREAM_FLUSH_INTERVAL = 0.0    # Seconds to wait for more tokens before a write (0: send what has arrived)
+STREAM_RESUME_GRACE = 0        # Seconds a generation keeps running after its client disconnects (a few at most)
+STREAM_RESUME_TTL = 120        # Seconds a finished stream can still be resumed with Last-Event-ID
+STREAM_RESUME_MAX_BYTES = 32 * 1024 * 1024  # Bound on frames kept for resumption
+
+# Prometheus metrics (/metrics)
+METRICS_MAX_MODELS = 32        # Distinct model labels; requests for further models count as "other"
+
+# Tracing (spans per route, LangGraph node and Ollama call)
+TRACING_ENABLED = False
+TRACING_EXPORTER = "jsonl"     # "jsonl" (TRACING_JSONL_PATH or stdout) or "otlp"
+TRACING_JSONL_PATH = None      # File to append spans to; None writes to stdout
+TRACING_OTLP_ENDPOINT = "http://localhost:4318/v1/traces"  # OTLP/HTTP collector
+TRACING_SERVICE_NAME = "msrit-backend"
+TRACING_QUEUE_SIZE = 4096      # Finished spans buffered for export before dropping
+TRACING_FLUSH_INTERVAL = 1.0   # Seconds between exports
+
+# Response cache (only used for deterministic requests: temperature 0 or a fixed seed)
+RESPONSE_CACHE_ENABLED = False
+RESPONSE_CACHE_BACKEND = "memory"   # "memory" (per process) or "redis" (shared by replicas)
+RESPONSE_CACHE_TTL = 3600           # Seconds before a cached response expires
+RESPONSE_CACHE_MAX_ENTRIES = 1024   # LRU bound on the number of entries (memory backend)
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024  # Bound on total cached bytes (memory backend)
+RESPONSE_CACHE_REDIS_URL = "redis://localhost:6379/0"
+
+# Semantic cache (answers near-duplicate first questions of /api/chat; needs numpy)
+SEMANTIC_CACHE_ENABLED = False
+SEMANTIC_CACHE_EMBED_MODEL = "nomic-embed-text"  # Ollama model used for question embeddings
+SEMANTIC_CACHE_THRESHOLD = 0.92     # Cosine similarity needed for a hit
+SEMANTIC_CACHE_MAX_ENTRIES = 4096   # Questions kept; the least recently used is evicted
+SEMANTIC_CACHE_PATH = None          # Directory for the memory-mapped index; None keeps it in memory
+
+# Conversation log (write-behind transcripts of /api/chat exchanges for analytics)
+CONVERSATION_LOG_ENABLED = False
+CONVERSATION_LOG_BACKEND = "sqlite"     # "sqlite" (WAL mode) or "jsonl" (rotating gzip segments)
+CONVERSATION_LOG_SQLITE_PATH = "conversations.db"
+CONVERSATION_LOG_JSONL_DIR = "conversations"
+CONVERSATION_LOG_QUEUE_SIZE = 10000     # Exchanges buffered for the writer before dropping
+CONVERSATION_LOG_BATCH_SIZE = 500       # Exchanges written per transaction (or segment write)
+CONVERSATION_LOG_FLUSH_INTERVAL = 1.0   # Seconds a batch waits to fill before it is written
+CONVERSATION_LOG_SEGMENT_BYTES = 64 * 1024 * 1024  # Compressed size at which a JSONL segment rotates
+CONVERSATION_LOG_MAX_SEGMENTS = 0       # JSONL segments kept; older ones are deleted (0 keeps all)
+
+# Retrieval (BM25 passages added to LangGraph chat prompts; needs numpy)
+RETRIEVAL_ENABLED = False
+RETRIEVAL_INDEX_PATH = "retrieval-index"  # Directory written by `python retrieval.py build <docs>`
+RETRIEVAL_TOP_K = 4                # Best passages considered per question
+RETRIEVAL_TOKEN_BUDGET = 768       # Estimated prompt tokens the passages may add
+RETRIEVAL_PASSAGE_TOKENS = 200     # Passage size used when building the index
+
+# Share one upstream generation between identical concurrent requests
+COALESCE_REQUESTS = True
+
+# Server-side conversation sessions
+SESSION_MAX_TURNS = 20          # User/assistant pairs kept per session
+SESSION_MAX_TOKENS = 4096       # Estimated history tokens kept per session
+SESSION_IDLE_TIMEOUT = 1800     # Seconds before an idle session is evicted
+SESSION_MAX_SESSIONS = 10000    # Upper bound on live sessions
+SESSION_KEEP_ALIVE = "30m"      # keep_alive sent to Ollama so the model stays loaded
+
+# LangGraph history budget (older turns are collapsed into a rolling summary)
+HISTORY_TOKEN_BUDGET = 3072       # Estimated prompt tokens sent to the model
+HISTORY_SUMMARIZE = True          # False drops older turns without summarizing
+HISTORY_SUMMARY_TOKENS = 256      # Budget reserved for the summary message
+HISTORY_SUMMARY_MODEL = None      # Model used for summaries (None = request model)
+HISTORY_SUMMARY_CACHE_SIZE = 512  # Rolling summaries kept in memory
+
 # CORS configuration
 ALLOWED_ORIGINS = [
     "http://localhost:3000",  # React frontend default port
@@ -0,0 +1,342 @@
+"""
+Write-behind log of /api/chat exchanges for analytics.
+
+Route handlers hand each finished exchange (the request messages, the answer,
+the model, token counts and the timings Ollama returns) to record(), which
+only puts it on a bounded in-memory queue, so a reply never waits for the
+disk. A full queue drops the exchange and counts it instead of blocking.
+
+A background thread takes exchanges off the queue in batches, parses the
+Ollama bodies and writes them either to SQLite in WAL mode
+(CONVERSATION_LOG_BACKEND = "sqlite", one transaction per batch) or to
+gzip-compressed JSON lines segments that rotate once they reach
+CONVERSATION_LOG_SEGMENT_BYTES (CONVERSATION_LOG_BACKEND = "jsonl"). Whatever
+is queued is written when the process exits or close() is called.
+
+conversation_report.py runs the common reports over either store. The log is
+opt-in via CONVERSATION_LOG_ENABLED.
+"""
+
+import atexit
+import glob
+import gzip
+import hashlib
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from typing import Iterator, List, Optional, Union
+import config
+import fast_json
+import metrics
+import response_cache
+
+# Columns of the exchanges table, in insert order
+COLUMNS = (
+    "ts", "source", "model", "stream", "client", "cached", "done_reason",
+    "prompt_tokens", "completion_tokens", "latency_ms", "total_ms", "load_ms",
+    "prompt_eval_ms", "eval_ms", "messages", "answer"
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS exchanges (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    source TEXT NOT NULL,
+    model TEXT NOT NULL,
+    stream INTEGER NOT NULL,
+    client TEXT,
+    cached TEXT,
+    done_reason TEXT,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    latency_ms REAL,
+    total_ms REAL,
+    load_ms REAL,
+    prompt_eval_ms REAL,
+    eval_ms REAL,
+    messages TEXT NOT NULL,
+    answer TEXT
+);
+CREATE INDEX IF NOT EXISTS exchanges_ts ON exchanges (ts);
+CREATE INDEX IF NOT EXISTS exchanges_model_ts ON exchanges (model, ts);
+"""
+
+_INSERT = f"INSERT INTO exchanges ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+_SEGMENT_GLOB = "conversations-*.jsonl.gz"
+
+_STOP = object()
+
+
+class SQLiteStore:
+    """Exchanges table in a SQLite database in WAL mode"""
+
+    def __init__(self, path: str):
+        # Several worker processes may write to the same file
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def write(self, rows: List[dict]) -> None:
+        values = [
+            tuple(fast_json.dumps(row[c]).decode("utf-8") if c == "messages" else row[c] for c in COLUMNS)
+            for row in rows
+        ]
+        with self.conn:
+            self.conn.executemany(_INSERT, values)
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class JSONLStore:
+    """gzip-compressed JSON lines segments, rotated by size"""
+
+    def __init__(self, directory: str, segment_bytes: int, max_segments: int = 0):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self._path = None
+        self._file = None
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        # The process id keeps the segments of several workers apart
+        name = f"conversations-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl.gz"
+        self._path = os.path.join(self.directory, name)
+        self._file = gzip.open(self._path, "ab")
+        if self.max_segments:
+            for old in segments(self.directory)[:-self.max_segments]:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
+    def write(self, rows: List[dict]) -> None:
+        if self._file is None or os.path.getsize(self._path) >= self.segment_bytes:
+            self._rotate()
+        self._file.write(b"".join(fast_json.dumps(row) + b"\n" for row in rows))
+        # A sync flush leaves the open segment readable up to this batch
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def segments(directory: str) -> List[str]:
+    """JSONL segments in a directory, oldest first"""
+    return sorted(glob.glob(os.path.join(directory, _SEGMENT_GLOB)), key=os.path.getmtime)
+
+
+def read_segment(path: str) -> Iterator[dict]:
+    """Exchanges in a segment; a segment cut short by a crash yields what is complete"""
+    with gzip.open(path, "rb") as f:
+        try:
+            for line in f:
+                if line.endswith(b"\n"):
+                    yield fast_json.loads(line)
+        except (EOFError, OSError):
+            return
+
+
+def open_store():
+    """The store configured by CONVERSATION_LOG_BACKEND"""
+    if config.CONVERSATION_LOG_BACKEND == "jsonl":
+        return JSONLStore(config.CONVERSATION_LOG_JSONL_DIR, config.CONVERSATION_LOG_SEGMENT_BYTES,
+                          config.CONVERSATION_LOG_MAX_SEGMENTS)
+    return SQLiteStore(config.CONVERSATION_LOG_SQLITE_PATH)
+
+
+def _ms(final: dict, field: str) -> Optional[float]:
+    ns = final.get(field)
+    return round(ns / 1e6, 3) if isinstance(ns, (int, float)) else None
+
+
+def to_row(entry: dict) -> Optional[dict]:
+    """The stored form of a queued exchange, None if its answer is incomplete"""
+    final = entry.pop("final")
+    if isinstance(final, list):
+        final = response_cache.assemble("chat", final)
+    if isinstance(final, (bytes, str)):
+        final = fast_json.loads(final)
+    if not isinstance(final, dict):
+        return None
+    answer = entry.pop("answer")
+    if answer is None:
+        answer = (final.get("message") or {}).get("content")
+    generation = {
+        "prompt_tokens": final.get("prompt_eval_count"),
+        "completion_tokens": final.get("eval_count"),
+        "total_ms": _ms(final, "total_duration"),
+        "load_ms": _ms(final, "load_duration"),
+        "prompt_eval_ms": _ms(final, "prompt_eval_duration"),
+        "eval_ms": _ms(final, "eval_duration")
+    }
+    if entry["cached"]:
+        # A stored answer's counts and timings belong to the generation that produced it
+        generation = dict.fromkeys(generation)
+    return {**entry, **generation, "done_reason": final.get("done_reason"), "answer": answer}
+
+
+class ConversationLog:
+    """Bounded queue of finished exchanges and the background thread that writes them"""
+
+    def __init__(self, open_store, queue_size: int):
+        self._open_store = open_store
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def submit(self, entry: dict) -> None:
+        if self._thread is None:
+            self._start()
+        try:
+            if self._closed:
+                raise queue.Full
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            metrics.conversation_log_records.inc("dropped")
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        store = None
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + config.CONVERSATION_LOG_FLUSH_INTERVAL
+            while batch[-1] is not _STOP and len(batch) < config.CONVERSATION_LOG_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            stop = batch[-1] is _STOP
+            if stop:
+                batch.pop()
+            try:
+                if store is None:
+                    store = self._open_store()
+                self._write(store, batch)
+            except Exception as e:
+                self.failed += len(batch)
+                metrics.conversation_log_records.inc("failed", amount=len(batch))
+                print(f"Conversation log write failed: {e}", file=sys.stderr)
+            if stop:
+                if store is not None:
+                    store.close()
+                return
+
+    def _write(self, store, batch: List[dict]) -> None:
+        rows = []
+        for entry in batch:
+            try:
+                row = to_row(entry)
+            except Exception:
+                row = None
+            if row is not None:
+                rows.append(row)
+        if rows:
+            store.write(rows)
+        self.written += len(rows)
+        metrics.conversation_log_records.inc("written", amount=len(rows))
+        if len(rows) < len(batch):
+            self.failed += len(batch) - len(rows)
+            metrics.conversation_log_records.inc("failed", amount=len(batch) - len(rows))
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Write what is queued and stop the writer; later exchanges are dropped"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._thread is None:
+                if self._queue.empty():
+                    return
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": True,
+            "backend": config.CONVERSATION_LOG_BACKEND,
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed
+        }
+
+
+def _build_log() -> Optional[ConversationLog]:
+    if not config.CONVERSATION_LOG_ENABLED:
+        return None
+    log = ConversationLog(open_store, config.CONVERSATION_LOG_QUEUE_SIZE)
+    # Flush on a clean exit; serve.py also closes it when the server shuts down
+    atexit.register(log.close)
+    return log
+
+
+log = _build_log()
+
+
+def anonymize(client: Optional[str]) -> Optional[str]:
+    """Client key with any API key replaced by a short hash of it"""
+    if client and client.startswith("key:"):
+        return "key:" + hashlib.sha256(client[4:].encode("utf-8")).hexdigest()[:12]
+    return client
+
+
+def record(model: str, messages: list, final: Union[bytes, dict, list, None], stream: bool,
+           started: Optional[float] = None, client: Optional[str] = None, cached: Optional[str] = None,
+           answer: Optional[str] = None, source: str = "app") -> None:
+    """Queue a finished chat exchange for the writer; never blocks
+
+    final is Ollama's final body (bytes or parsed), or the NDJSON lines of a
+    completed stream; it is only parsed on the writer thread, and without one
+    there is nothing to log. answer defaults to the message in final. started
+    is the time.perf_counter() at which the request was accepted.
+    """
+    if log is None or final is None:
+        return
+    log.submit({
+        "ts": time.time(),
+        "source": source,
+        "model": model,
+        "stream": int(stream),
+        "client": anonymize(client),
+        "cached": cached,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 3) if started is not None else None,
+        "messages": messages,
+        "final": final,
+        "answer": answer
+    })
+
+
+def close() -> None:
+    if log is not None:
+        log.close()
+
+
+def stats() -> dict:
+    if log is None:
+        return {"enabled": False}
+    return log.stats()
@@ -0,0 +1,163 @@
+"""
+Reports over the conversation log (see conversation_log.py).
+
+Reads the SQLite database or the directory of JSONL segments configured in
+config.py (or given with --db / --jsonl); JSONL segments are loaded into an
+in-memory SQLite database first, so both stores answer the same queries.
+
+Usage:
+    python conversation_report.py summary [--since 24h] [--model gemma3:1b]
+    python conversation_report.py models|daily|clients [--since 7d]
+    python conversation_report.py slowest|recent [--limit 20]
+    python conversation_report.py search "exam timetable" [--limit 20]
+    python conversation_report.py export [--since 1h] > exchanges.jsonl
+
+Add --json for machine-readable output.
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import sys
+import time
+from typing import List, Tuple
+import config
+import conversation_log
+
+_SINCE = re.compile(r"^(\d+(?:\.\d+)?)([smhd])$")
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+# Report name -> (SELECT list, GROUP BY / ORDER BY tail)
+REPORTS = {
+    "summary": (
+        """COUNT(*) AS exchanges, COUNT(DISTINCT client) AS clients,
+           SUM(cached IS NOT NULL) AS cached, SUM(stream) AS streamed,
+           SUM(prompt_tokens) AS prompt_tokens, SUM(completion_tokens) AS completion_tokens,
+           ROUND(AVG(latency_ms), 1) AS avg_latency_ms, ROUND(MAX(latency_ms), 1) AS max_latency_ms,
+           ROUND(AVG(load_ms), 1) AS avg_load_ms,
+           ROUND(SUM(completion_tokens) * 1000.0 / SUM(eval_ms), 1) AS tokens_per_second""",
+        ""
+    ),
+    "models": (
+        """model, COUNT(*) AS exchanges, SUM(cached IS NOT NULL) AS cached,
+           SUM(prompt_tokens) AS prompt_tokens, SUM(completion_tokens) AS completion_tokens,
+           ROUND(AVG(latency_ms), 1) AS avg_latency_ms,
+           ROUND(SUM(completion_tokens) * 1000.0 / SUM(eval_ms), 1) AS tokens_per_second""",
+        "GROUP BY model ORDER BY exchanges DESC"
+    ),
+    "daily": (
+        """DATE(ts, 'unixepoch', 'localtime') AS day, COUNT(*) AS exchanges,
+           COUNT(DISTINCT client) AS clients, SUM(prompt_tokens) AS prompt_tokens,
+           SUM(completion_tokens) AS completion_tokens, ROUND(AVG(latency_ms), 1) AS avg_latency_ms""",
+        "GROUP BY day ORDER BY day"
+    ),
+    "clients": (
+        """client, COUNT(*) AS exchanges, SUM(prompt_tokens) AS prompt_tokens,
+           SUM(completion_tokens) AS completion_tokens,
+           DATETIME(MAX(ts), 'unixepoch', 'localtime') AS last_seen""",
+        "GROUP BY client ORDER BY exchanges DESC LIMIT :limit"
+    ),
+    "slowest": (
+        """DATETIME(ts, 'unixepoch', 'localtime') AS time, model, latency_ms, load_ms,
+           prompt_eval_ms, eval_ms, prompt_tokens, completion_tokens""",
+        "ORDER BY latency_ms DESC LIMIT :limit"
+    ),
+    "recent": (
+        """DATETIME(ts, 'unixepoch', 'localtime') AS time, model, cached, latency_ms,
+           json_extract(messages, '$[#-1].content') AS question, answer""",
+        "ORDER BY ts DESC LIMIT :limit"
+    ),
+    "search": (
+        """DATETIME(ts, 'unixepoch', 'localtime') AS time, model,
+           json_extract(messages, '$[#-1].content') AS question, answer""",
+        "ORDER BY ts DESC LIMIT :limit"
+    )
+}
+
+
+def since_seconds(value: str) -> float:
+    """Seconds in a duration such as 30m, 24h or 7d"""
+    match = _SINCE.match(value.strip())
+    if match is None:
+        raise argparse.ArgumentTypeError(f"Invalid duration: {value!r} (use e.g. 30m, 24h, 7d)")
+    return float(match.group(1)) * _UNITS[match.group(2)]
+
+
+def connect(args) -> sqlite3.Connection:
+    """Open the SQLite store, or load the JSONL segments into memory"""
+    if args.jsonl or (args.db is None and config.CONVERSATION_LOG_BACKEND == "jsonl"):
+        store = conversation_log.SQLiteStore(":memory:")
+        for path in conversation_log.segments(args.jsonl or config.CONVERSATION_LOG_JSONL_DIR):
+            rows = list(conversation_log.read_segment(path))
+            if rows:
+                store.write(rows)
+        return store.conn
+    return sqlite3.connect(f"file:{args.db or config.CONVERSATION_LOG_SQLITE_PATH}?mode=ro", uri=True)
+
+
+def run(conn: sqlite3.Connection, args) -> Tuple[List[str], List[tuple]]:
+    """Column names and rows of a report"""
+    where, params = [], {"limit": args.limit}
+    if args.since:
+        where.append("ts >= :since")
+        params["since"] = time.time() - args.since
+    if args.model:
+        where.append("model = :model")
+        params["model"] = args.model
+    if args.report == "search":
+        where.append("(messages LIKE :text OR answer LIKE :text)")
+        params["text"] = f"%{args.text}%"
+
+    if args.report == "export":
+        select, tail = ", ".join(conversation_log.COLUMNS), "ORDER BY ts"
+    else:
+        select, tail = REPORTS[args.report]
+    sql = f"SELECT {select} FROM exchanges {'WHERE ' + ' AND '.join(where) if where else ''} {tail}"
+    cursor = conn.execute(sql, params)
+    return [c[0] for c in cursor.description], cursor.fetchall()
+
+
+def print_table(columns: List[str], rows: List[tuple], width: int = 60) -> None:
+    def cell(value) -> str:
+        text = "" if value is None else str(value).replace("\n", " ")
+        return text if len(text) <= width else text[:width - 3] + "..."
+
+    cells = [[cell(v) for v in row] for row in rows]
+    widths = [max([len(c)] + [len(r[i]) for r in cells]) for i, c in enumerate(columns)]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in cells:
+        print("  ".join(v.ljust(w) for v, w in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reports over the conversation log")
+    parser.add_argument("report", choices=sorted(REPORTS) + ["export"])
+    parser.add_argument("text", nargs="?", help="Text to look for (search)")
+    parser.add_argument("--since", type=since_seconds, help="Only exchanges this recent, e.g. 30m, 24h, 7d")
+    parser.add_argument("--model")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--db", help=f"SQLite file (default {config.CONVERSATION_LOG_SQLITE_PATH})")
+    parser.add_argument("--jsonl", help=f"Directory of JSONL segments (default {config.CONVERSATION_LOG_JSONL_DIR})")
+    parser.add_argument("--json", action="store_true", help="Print JSON lines instead of a table")
+    args = parser.parse_args()
+    if args.report == "search" and not args.text:
+        parser.error("search needs the text to look for")
+
+    try:
+        columns, rows = run(connect(args), args)
+    except sqlite3.Error as e:
+        sys.exit(f"Cannot read the conversation log: {e}")
+
+    if args.json or args.report == "export":
+        for row in rows:
+            record = dict(zip(columns, row))
+            if "messages" in record:
+                record["messages"] = json.loads(record["messages"])
+            print(json.dumps(record, ensure_ascii=False))
+    else:
+        print_table(columns, rows)
+
+
+if __name__ == '__main__':
+    main()
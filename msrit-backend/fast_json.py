@@ -0,0 +1,60 @@
+"""
+JSON codec for request and response bodies.
+
+Uses orjson when it is installed, which parses and serializes several times
+faster than the standard library (and returns bytes, so bodies are not
+re-encoded), and falls back to the json module otherwise. install(app) makes
+Flask's request.get_json() and jsonify() use it too.
+"""
+
+import json
+from typing import Any
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # Optional speed-up
+    orjson = None
+
+
+if orjson is not None:
+    def loads(data) -> Any:
+        return orjson.loads(data)
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+    def dumps_canonical(obj: Any) -> bytes:
+        """Key-sorted serialization for hashing"""
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+else:
+    def loads(data) -> Any:
+        return json.loads(data)
+
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+    def dumps_canonical(obj: Any) -> bytes:
+        """Key-sorted serialization for hashing"""
+        return json.dumps(obj, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson"""
+
+    def loads(self, s, **kwargs) -> Any:
+        return orjson.loads(s)
+
+    def dumps(self, obj: Any, **kwargs) -> str:
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS)
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+
+def install(app) -> None:
+    """Use orjson for Flask's request parsing and jsonify (when available)"""
+    if orjson is not None:
+        app.json = JSONProvider(app)
@@ -0,0 +1,132 @@
+"""
+Token-budget-aware chat history for the LangGraph pipeline.
+
+Keeps the leading system message(s) and the most recent turns inside
+HISTORY_TOKEN_BUDGET and collapses older turns into a rolling summary. Summaries
+are cached by a hash of the summarized prefix, so a summary is only recomputed
+when the window slides, and then only the newly dropped turns are folded into
+the previous summary.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import config
+import ollama_client
+
+SUMMARY_PROMPT = (
+    "Summarize the following conversation between a user and an assistant in a "
+    "few sentences. Keep names, facts and open questions.\n\n"
+)
+
+_summaries: "OrderedDict[str, str]" = OrderedDict()  # prefix hash -> summary
+_lock = threading.Lock()
+
+
+def estimate_tokens(message: Dict[str, str]) -> int:
+    """Rough token estimate for one message (about four characters per token)"""
+    return len(message.get("content") or "") // 4 + 4
+
+
+def _prefix_hashes(messages: List[Dict[str, str]]) -> List[str]:
+    """Hash of every prefix of messages, computed in a single pass"""
+    hasher = hashlib.sha256()
+    hashes = []
+    for message in messages:
+        hasher.update(json.dumps([message.get("role"), message.get("content")]).encode("utf-8"))
+        hashes.append(hasher.copy().hexdigest())
+    return hashes
+
+
+def _transcript(messages: List[Dict[str, str]]) -> str:
+    return "\n".join(f"{m.get('role')}: {m.get('content')}" for m in messages)
+
+
+def _call_summarizer(model: str, previous: Optional[str], messages: List[Dict[str, str]]) -> str:
+    prompt = SUMMARY_PROMPT
+    if previous:
+        prompt += f"Summary so far: {previous}\n\n"
+    prompt += _transcript(messages)
+
+    response = ollama_client.post("/generate", {
+        "model": config.HISTORY_SUMMARY_MODEL or model,
+        "prompt": prompt,
+        "stream": False,
+        "options": {"temperature": 0}
+    })
+    response.raise_for_status()
+    return response.json().get("response", "").strip()
+
+
+def summarize(model: str, dropped: List[Dict[str, str]]) -> Optional[str]:
+    """Rolling summary of the dropped messages, reusing the longest cached prefix"""
+    hashes = _prefix_hashes(dropped)
+
+    with _lock:
+        if hashes[-1] in _summaries:
+            _summaries.move_to_end(hashes[-1])
+            return _summaries[hashes[-1]]
+        start, previous = 0, None
+        for i in range(len(hashes) - 2, -1, -1):
+            if hashes[i] in _summaries:
+                start, previous = i + 1, _summaries[hashes[i]]
+                break
+
+    try:
+        summary = _call_summarizer(model, previous, dropped[start:])
+    except Exception:
+        # Fall back to plain truncation; the reply matters more than the summary
+        return previous
+
+    with _lock:
+        _summaries[hashes[-1]] = summary
+        while len(_summaries) > config.HISTORY_SUMMARY_CACHE_SIZE:
+            _summaries.popitem(last=False)
+    return summary
+
+
+def fit_to_budget(messages: List[Dict[str, str]], model: str) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+    """Trim messages to the token budget; returns the new messages and metrics"""
+    lead = 0
+    while lead < len(messages) and messages[lead].get("role") == "system":
+        lead += 1
+    system, turns = messages[:lead], messages[lead:]
+
+    sizes = [estimate_tokens(m) for m in messages]
+    before = sum(sizes)
+    metrics = {
+        "prompt_tokens_before": before,
+        "prompt_tokens_after": before,
+        "prompt_tokens_saved": 0,
+        "summarized_messages": 0
+    }
+    if before <= config.HISTORY_TOKEN_BUDGET or not turns:
+        return messages, metrics
+
+    # Walk back from the newest turn; the latest message is always kept
+    remaining = config.HISTORY_TOKEN_BUDGET - sum(sizes[:lead]) - config.HISTORY_SUMMARY_TOKENS
+    split = len(messages) - 1
+    remaining -= sizes[split]
+    while split > lead and sizes[split - 1] <= remaining:
+        split -= 1
+        remaining -= sizes[split]
+
+    dropped, recent = messages[lead:split], messages[split:]
+    if not dropped:
+        return messages, metrics
+
+    summary = summarize(model, dropped) if config.HISTORY_SUMMARIZE else None
+    trimmed = list(system)
+    if summary:
+        trimmed.append({"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
+    trimmed.extend(recent)
+
+    after = sum(estimate_tokens(m) for m in trimmed)
+    metrics.update(
+        prompt_tokens_after=after,
+        prompt_tokens_saved=before - after,
+        summarized_messages=len(dropped)
+    )
+    return trimmed, metrics
@@ -1,21 +1,69 @@
-import json
-import requests
+import time
 from typing import Dict, List, Optional, TypedDict, Callable, Any, AsyncGenerator, Generator
 from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import config
+import ollama_client
+import model_catalog
+from stream_bridge import StreamBridge, StreamCancelled
+import sessions
+import history
+import admission
+import metrics
+import tracing
+import sse_relay
+import singleflight
+import model_lifecycle
+import semantic_cache
+import response_cache
+import fast_json
+import pipeline
+import conversation_log
+import retrieval
 from langgraph.graph import StateGraph, END
 
 # Flask app setup
 app = Flask(__name__, static_folder='static')
 CORS(app, origins=config.ALLOWED_ORIGINS)
 
+# Parse and serialize JSON bodies with orjson when it is installed
+fast_json.install(app)
+
+# Request counts, latencies and upstream timings, served at /metrics
+metrics.install(app)
+
+# Spans per route, graph node and Ollama call (when TRACING_ENABLED)
+tracing.install(app)
+
+# Load the default and hot models now rather than on the first request
+model_lifecycle.manager.start()
+
+def admission_model(data):
+    """Model a proxied request will run on, used for per-model admission caps"""
+    session_id = (request.view_args or {}).get('session_id')
+    session = sessions.store.get(session_id) if session_id else None
+    return session.model if session else data.get('model', config.OLLAMA_MODEL)
+
+# Rate limiting in front of every route that calls Ollama; the graph nodes take
+# an admission slot only around their upstream call
+admission.install(app, {
+    'stream_chat': 'interactive',
+    'stream_session_message': 'interactive',
+    'chat': 'standard',
+    'session_message': 'standard'
+}, model_for=admission_model)
+
 # Define the state structure
 class ChatState(TypedDict):
     messages: List[Dict[str, any]]  # Chat messages in the format expected by Ollama
     current_response: str           # Current response being generated
     model: str                      # Model to use for generation
-    stream_handler: Optional[Callable[[str], None]]  # Optional handler for streaming
+    stream_handler: Optional[Callable[[bytes], None]]  # Optional handler for SSE frames when streaming
+    keep_alive: Optional[str]       # How long Ollama should keep the model loaded
+    semantic: Optional[Any]         # Semantic cache lookup for the question (hit or miss)
+    final: Optional[Dict[str, Any]] # Ollama's final response (token counts and timings)
+    metrics: Dict[str, Any]         # Per-request metrics reported to the client
+    admission: Optional[Any]        # How the request queues for a generation slot (admission.pending())
 
 # Initialize the state
 def create_initial_state(system_message: str = "You are a helpful AI assistant.", model: str = config.OLLAMA_MODEL) -> ChatState:
@@ -23,10 +71,59 @@ def create_initial_state(system_message: str = "You are a helpful AI assistant."
         "messages": [{"role": "system", "content": system_message}],
         "current_response": "",
         "model": model,
-        "stream_handler": None
+        "stream_handler": None,
+        "keep_alive": None,
+        "semantic": None,
+        "final": None,
+        "metrics": {},
+        "admission": None
     }
 
 # Define the nodes for the graph
+def trim_history(state: ChatState) -> ChatState:
+    """Fit the history into the token budget, summarizing older turns"""
+    messages, metrics = history.fit_to_budget(state["messages"], state["model"])
+    return {
+        **state,
+        "messages": messages,
+        "metrics": {**(state.get("metrics") or {}), **metrics}
+    }
+
+def retrieve_passages(state: ChatState) -> ChatState:
+    """Add the indexed passages most relevant to the question, within the retrieval token budget"""
+    messages, metrics = retrieval.augment(state["messages"])
+    return {
+        **state,
+        "messages": messages,
+        "metrics": {**(state.get("metrics") or {}), **metrics}
+    }
+
+def lookup_semantic_cache(state: ChatState) -> ChatState:
+    """Answer a near-duplicate of an earlier first question from the semantic cache"""
+    similar = semantic_cache.lookup({"model": state["model"], "messages": state["messages"]})
+    if similar is None or similar.body is None:
+        return {"semantic": similar}
+    
+    final = fast_json.loads(similar.body)
+    answer = final.get("message") or {"role": "assistant", "content": ""}
+    reported = {**(state.get("metrics") or {}), "semantic_cache": {"similarity": round(similar.similarity, 4)}}
+    stream_handler = state.get("stream_handler")
+    if stream_handler:
+        stream_handler(sse_relay.frame({"message": answer, "done": False}))
+        stream_handler(sse_relay.frame({"done": True, "metrics": reported}))
+    return {
+        "semantic": similar,
+        "final": final,
+        "messages": state["messages"] + [answer],
+        "current_response": answer["content"],
+        "metrics": reported
+    }
+
+def after_semantic_lookup(state: ChatState) -> str:
+    """Skip generation when the semantic cache answered"""
+    similar = state.get("semantic")
+    return "hit" if similar is not None and similar.body is not None else "miss"
+
 def add_user_message(state: ChatState, user_message: str) -> ChatState:
     """Add a user message to the chat history"""
     return {
@@ -35,27 +132,44 @@ def add_user_message(state: ChatState, user_message: str) -> ChatState:
         "current_response": ""
     }
 
+def record_token_counts(final: dict) -> None:
+    """Put Ollama's token counts on the current node's span"""
+    span = tracing.current()
+    span.set_attribute("prompt_tokens", final.get("prompt_eval_count"))
+    span.set_attribute("completion_tokens", final.get("eval_count"))
+
+def log_exchange(messages: List[Dict[str, Any]], result: ChatState, stream: bool, started: float, client: str) -> None:
+    """Hand a finished /api/chat exchange to the conversation log"""
+    conversation_log.record(result["model"], messages, result.get("final"), stream, started=started, client=client,
+                            cached="semantic" if after_semantic_lookup(result) == "hit" else None,
+                            answer=result.get("current_response"), source="langgraph")
+
 def generate_ollama_response(state: ChatState) -> ChatState:
     """Generate a response from Ollama"""
-    url = f"{config.OLLAMA_API_BASE}/chat"
-    
     payload = {
         "model": state["model"],
         "messages": state["messages"],
         "stream": False
     }
+    if state.get("keep_alive"):
+        payload["keep_alive"] = state["keep_alive"]
     
     try:
-        response = requests.post(url, json=payload)
+        with admission.slot(state.get("admission")):
+            response = ollama_client.post("/chat", payload)
         response.raise_for_status()
         data = response.json()
+        metrics.record_generation("chat", state["model"], data)
+        record_token_counts(data)
         
         if "message" in data and "content" in data["message"]:
+            semantic_cache.store(state.get("semantic"), response.content)
             assistant_message = data["message"]
             return {
                 **state,
                 "messages": state["messages"] + [assistant_message],
-                "current_response": assistant_message["content"]
+                "current_response": assistant_message["content"],
+                "final": data
             }
         else:
             error_message = {"role": "assistant", "content": "Sorry, I couldn't generate a response."}
@@ -65,6 +179,8 @@ def generate_ollama_response(state: ChatState) -> ChatState:
                 "current_response": error_message["content"]
             }
     
+    except admission.Rejected:
+        raise  # The route answers 429
     except Exception as e:
         error_message = {"role": "assistant", "content": f"Error: {str(e)}"}
         return {
@@ -73,91 +189,115 @@ def generate_ollama_response(state: ChatState) -> ChatState:
             "current_response": error_message["content"]
         }
 
-def stream_ollama_response(state: ChatState) -> Generator[ChatState, None, None]:
-    """Stream a response from Ollama, yielding updated states"""
-    url = f"{config.OLLAMA_API_BASE}/chat"
-    
+def stream_ollama_response(state: ChatState) -> ChatState:
+    """Stream a response from Ollama through the stream handler"""
     payload = {
         "model": state["model"],
         "messages": state["messages"],
         "stream": True
     }
+    if state.get("keep_alive"):
+        payload["keep_alive"] = state["keep_alive"]
     
-    full_response = ""
-    assistant_message = {"role": "assistant", "content": ""}
+    stream_handler = state["stream_handler"]
+    received = []
+    error_message = None
     
     try:
-        with requests.post(url, json=payload, stream=True) as response:
+        started = time.perf_counter()
+        with admission.slot(state.get("admission")), ollama_client.post("/chat", payload, stream=True) as response:
             response.raise_for_status()
             
-            for line in response.iter_lines():
-                if line:
-                    try:
-                        data = json.loads(line.decode('utf-8'))
-                        
-                        # Extract content from the message
-                        if "message" in data and "content" in data["message"]:
-                            chunk = data["message"]["content"]
-                            full_response += chunk
-                            assistant_message["content"] = full_response
-                            
-                            # Update state with the current response
-                            current_state = {
-                                **state,
-                                "current_response": full_response
-                            }
-                            
-                            # Call the stream handler if provided
-                            if state["stream_handler"]:
-                                state["stream_handler"](json.dumps({
-                                    "message": {"content": chunk},
-                                    "done": False
-                                }))
-                            
-                            yield current_state
-                        
-                        # Check if streaming is complete
-                        if data.get("done", False):
-                            break
-                    
-                    except json.JSONDecodeError:
-                        pass
+            # Upstream lines are relayed as raw SSE frames and only parsed
+            # once the reply is complete
+            framer = sse_relay.Framer()
+            for chunk in sse_relay.iter_chunks(response):
+                lines = framer.feed(chunk)
+                if not lines:
+                    continue
+                if not received:
+                    metrics.record_ttft("chat", state["model"], started)
+                    tracing.current().add_event("first_token")
+                received.append(lines)
+                
+                # Our own done frame (with metrics) replaces Ollama's
+                done = sse_relay.is_done(lines)
+                if done:
+                    lines = lines[:max(lines.rfind(b"\n"), 0)]
+                
+                # The stream handler raises StreamCancelled once the client
+                # has gone away, which closes the upstream response
+                if stream_handler and lines:
+                    # A frame per line, so a resume starts at the exact line
+                    for line_frame in sse_relay.line_frames(lines):
+                        stream_handler(line_frame)
+                if done:
+                    break
+    
+    except StreamCancelled:
+        raise
     
     except Exception as e:
         error_message = f"Error: {str(e)}"
-        full_response = error_message
-        assistant_message["content"] = error_message
-        
-        if state["stream_handler"]:
-            state["stream_handler"](json.dumps({
-                "error": error_message,
-                "done": True
-            }))
+        if stream_handler:
+            stream_handler(sse_relay.frame({"error": error_message, "done": True}))
+    
+    chunks = sse_relay.parse(received)
+    final = None
+    if chunks and chunks[-1].get("done"):
+        final = chunks[-1] if error_message is None else None
+        metrics.record_generation("chat", state["model"], chunks[-1])
+        record_token_counts(chunks[-1])
+        if state.get("semantic") is not None and error_message is None:
+            semantic_cache.store(state["semantic"], response_cache.assemble("chat", b"\n".join(received).split(b"\n")))
+    full_response = error_message or "".join((c.get("message") or {}).get("content", "") for c in chunks)
     
-    # Final state with the complete response
+    # LangGraph merges the returned keys into the state, so there is no need to copy it
     final_state = {
-        **state,
-        "messages": state["messages"] + [assistant_message],
-        "current_response": full_response
+        "messages": state["messages"] + [{"role": "assistant", "content": full_response}],
+        "current_response": full_response,
+        "final": final
     }
     
-    # Signal completion to the stream handler
-    if state["stream_handler"]:
-        state["stream_handler"](json.dumps({"done": True}))
+    # Signal completion to the stream handler; the error frame already did
+    if stream_handler and error_message is None:
+        stream_handler(sse_relay.frame({"done": True, "metrics": state.get("metrics") or {}}))
     
-    yield final_state
+    return final_state
+
+def node_attributes(state: ChatState) -> dict:
+    """Span attributes for a graph node: model and prompt size"""
+    return {
+        "model": state["model"],
+        "messages": len(state["messages"]),
+        "prompt_chars": sum(len(m.get("content") or "") for m in state["messages"])
+    }
+
+def add_retrieval(workflow: StateGraph, after: str, before: str) -> None:
+    """Run the retrieval node between two nodes when an index is loaded, else join them directly"""
+    if retrieval.index is None:
+        workflow.add_edge(after, before)
+        return
+    workflow.add_node("retrieve", tracing.traced("graph.retrieve", retrieve_passages, node_attributes))
+    workflow.add_edge(after, "retrieve")
+    workflow.add_edge("retrieve", before)
 
 # Build the graph for non-streaming chat
 def build_chat_graph():
     workflow = StateGraph(ChatState)
     
     # Add nodes
-    workflow.add_node("generate_response", generate_ollama_response)
+    workflow.add_node("semantic_cache", tracing.traced("graph.semantic_cache", lookup_semantic_cache, node_attributes))
+    workflow.add_node("trim_history", tracing.traced("graph.trim_history", trim_history, node_attributes))
+    workflow.add_node("generate_response", tracing.traced("graph.generate_response", generate_ollama_response, node_attributes))
     
     # Set entry point
-    workflow.set_entry_point("generate_response")
+    workflow.set_entry_point("semantic_cache")
     
-    # Add edges (in this simple case, we just end after generating a response)
+    # Add edges (a semantic cache hit ends the run; otherwise fit the history
+    # into the budget, add retrieved passages if enabled, then generate a response)
+    workflow.add_conditional_edges("semantic_cache", after_semantic_lookup, {"hit": END, "miss": "trim_history"})
+    add_retrieval(workflow, "trim_history", "generate_response")
     workflow.add_edge("generate_response", END)
     
     return workflow.compile()
@@ -167,12 +307,17 @@ def build_streaming_chat_graph():
     workflow = StateGraph(ChatState)
     
     # Add nodes
-    workflow.add_node("stream_response", stream_ollama_response)
+    workflow.add_node("semantic_cache", tracing.traced("graph.semantic_cache", lookup_semantic_cache, node_attributes))
+    workflow.add_node("trim_history", tracing.traced("graph.trim_history", trim_history, node_attributes))
+    workflow.add_node("stream_response", tracing.traced("graph.stream_response", stream_ollama_response, node_attributes))
     
     # Set entry point
-    workflow.set_entry_point("stream_response")
+    workflow.set_entry_point("semantic_cache")
     
-    # Add edges (in this simple case, we just end after streaming a response)
+    # Add edges (a semantic cache hit ends the run; otherwise fit the history
+    # into the budget, add retrieved passages if enabled, then stream a response)
+    workflow.add_conditional_edges("semantic_cache", after_semantic_lookup, {"hit": END, "miss": "trim_history"})
+    add_retrieval(workflow, "trim_history", "stream_response")
     workflow.add_edge("stream_response", END)
     
     return workflow.compile()
@@ -189,27 +334,33 @@ def index():
 
 @app.route('/api/models', methods=['GET'])
 def get_models():
-    """Get available models from Ollama"""
+    """Get available models from Ollama (cached, revalidate with If-None-Match)"""
     try:
-        response = requests.get(f"{config.OLLAMA_API_BASE}/tags")
-        if response.status_code == 200:
-            return jsonify(response.json())
-        else:
-            return jsonify({"error": f"Failed to fetch models: {response.text}"}), 500
-    except Exception as e:
-        return jsonify({"error": f"Error connecting to Ollama: {str(e)}"}), 500
+        body, etag = model_catalog.catalog.snapshot()
+    except model_catalog.CatalogError as e:
+        return jsonify({"error": str(e)}), 500
+    
+    response = Response(body, content_type='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """Chat endpoint for non-streaming responses using LangGraph"""
-    data = request.json
-    
-    if not data or 'messages' not in data:
-        return jsonify({"error": "Invalid request. 'messages' field is required."}), 400
+    data = request.get_json(silent=True)
+    error = pipeline.validators['chat'](data)
+    if error is not None:
+        return jsonify({"error": error}), 400
     
     model = data.get('model', config.OLLAMA_MODEL)
+    if not model_catalog.catalog.is_known(model):
+        return jsonify({"error": f"Model '{model}' not found."}), 404
+    metrics.set_model(model)
     
     try:
+        started = time.perf_counter()
+        
         # Create initial state with user's messages
         system_message = next((msg["content"] for msg in data['messages'] if msg["role"] == "system"), "You are a helpful AI assistant.")
         initial_state = create_initial_state(system_message, model)
@@ -217,125 +368,217 @@ def chat():
         # Add all non-system messages to the state
         state = initial_state.copy()
         state["messages"] = [msg for msg in data['messages']]
+        state["keep_alive"] = model_lifecycle.manager.keep_alive(model)
+        state["admission"] = admission.pending()
         
         # Run the graph
-        result = chat_graph.invoke(state)
+        with tracing.span("chat_graph.invoke"):
+            result = chat_graph.invoke(state)
+        log_exchange(data['messages'], result, stream=False, started=started, client=admission.client_key())
         
         # Return the final result
         return jsonify({
             "message": result["messages"][-1],
-            "model": model
+            "model": model,
+            "metrics": result.get("metrics") or {}
         })
     
+    except admission.Rejected as e:
+        return admission.rejected_response(e)
     except Exception as e:
         return jsonify({"error": f"Error: {str(e)}"}), 500
 
 @app.route('/api/chat/stream', methods=['POST'])
 def stream_chat():
     """Chat endpoint for streaming responses using LangGraph"""
-    data = request.json
-    
-    if not data or 'messages' not in data:
-        return jsonify({"error": "Invalid request. 'messages' field is required."}), 400
+    data = request.get_json(silent=True)
+    error = pipeline.validators['chat'](data)
+    if error is not None:
+        return jsonify({"error": error}), 400
     
     model = data.get('model', config.OLLAMA_MODEL)
+    if not model_catalog.catalog.is_known(model):
+        return jsonify({"error": f"Model '{model}' not found."}), 404
+    metrics.set_model(model)
+    
+    # A reconnecting client picks up where its stream left off, if it resends the same request
+    flight_key = response_cache.make_key("langgraph", {"model": model, "messages": data['messages']})
+    resumed = pipeline.resumed_stream("langgraph", flight_key)
+    if resumed is not None:
+        return resumed
+    
+    # Create initial state with user's messages
+    system_message = next((msg["content"] for msg in data['messages'] if msg["role"] == "system"), "You are a helpful AI assistant.")
+    state = create_initial_state(system_message, model)
+    state["messages"] = [msg for msg in data['messages']]
+    state["keep_alive"] = model_lifecycle.manager.keep_alive(model)
+    state["admission"] = admission.pending()
     
-    def generate():
+    # The graph runs on a worker thread and pushes chunks into the bridge
+    bridge = StreamBridge()
+    state["stream_handler"] = bridge.put
+    started, client = time.perf_counter(), admission.client_key()
+    
+    def run_graph():
         try:
-            # Create initial state with user's messages
-            system_message = next((msg["content"] for msg in data['messages'] if msg["role"] == "system"), "You are a helpful AI assistant.")
-            initial_state = create_initial_state(system_message, model)
-            
-            # Add all non-system messages to the state
-            state = initial_state.copy()
-            state["messages"] = [msg for msg in data['messages']]
-            
-            # Define a stream handler to yield SSE events
-            def stream_handler(data_str):
-                yield f"data: {data_str}\n\n"
-            
-            # Set up the stream handler in the state
-            state["stream_handler"] = lambda data: None  # Placeholder, will be replaced in the loop
-            
-            # Run the streaming graph
-            for output in streaming_chat_graph.stream(state):
-                # Check for the stream_handler output
-                if "__end__" in output:
-                    break
-                
-                # The actual streaming happens through the stream_handler callback
-                # which is called inside the stream_ollama_response node
-                pass
-            
+            with tracing.span("streaming_chat_graph.invoke"):
+                result = streaming_chat_graph.invoke(state)
+            log_exchange(data['messages'], result, stream=True, started=started, client=client)
+        except StreamCancelled:
+            raise
         except Exception as e:
-            error_msg = {'error': str(e)}
-            yield f"data: {json.dumps(error_msg)}\n\n"
+            bridge.put(sse_relay.frame({'error': str(e)}))
+            bridge.put(sse_relay.frame({'done': True}))
     
-    # Create a custom generator that wraps the LangGraph streaming with SSE
-    def sse_generator():
+    # The worker's spans belong to this request's trace
+    run_graph = tracing.bind(run_graph)
+    
+    def produce():
+        bridge.start(run_graph)
         try:
-            # Create initial state with user's messages
-            system_message = next((msg["content"] for msg in data['messages'] if msg["role"] == "system"), "You are a helpful AI assistant.")
-            initial_state = create_initial_state(system_message, model)
-            
-            # Add all messages to the state
-            state = initial_state.copy()
-            state["messages"] = [msg for msg in data['messages']]
-            
-            # Create a buffer for the stream handler to send data through
-            buffer = []
-            event_ready = False
-            
-            # Define a stream handler that adds data to the buffer
-            def stream_handler(data_str):
-                nonlocal event_ready
-                buffer.append(data_str)
-                event_ready = True
-            
-            # Set the stream handler in the state
-            state["stream_handler"] = stream_handler
-            
-            # Start the streaming graph in a separate thread
-            import threading
-            thread = threading.Thread(target=lambda: list(streaming_chat_graph.stream(state)))
-            thread.daemon = True
-            thread.start()
-            
-            # Yield data from the buffer as it becomes available
-            while True:
-                if event_ready and buffer:
-                    data_str = buffer.pop(0)
-                    yield f"data: {data_str}\n\n"
-                    
-                    # Check if we're done
-                    try:
-                        data = json.loads(data_str)
-                        if data.get("done", False):
-                            break
-                    except:
-                        pass
-                    
-                    # Reset the event flag if buffer is empty
-                    if not buffer:
-                        event_ready = False
-                else:
-                    # Small sleep to prevent CPU spinning
-                    import time
-                    time.sleep(0.01)
-                    
-                    # Check if thread is still alive
-                    if not thread.is_alive() and not buffer:
-                        # If thread died and buffer is empty, we're done
-                        yield f"data: {{\"done\": true}}\n\n"
-                        break
+            yield from bridge
+        finally:
+            # Runs on completion and once a disconnected client's grace period ends
+            bridge.cancel()
+    
+    # Frames are kept so a dropped client can resume with Last-Event-ID; LangGraph runs are never shared
+    flight = singleflight.streams.join(flight_key, produce, kind="langgraph", share=False)
+    return Response(pipeline.sse_stream(flight), content_type='text/event-stream')
+
+def create_session_state(session, user_message: str) -> ChatState:
+    """Graph state for the next turn of a server-side session"""
+    state = create_initial_state(session.system or "You are a helpful AI assistant.", session.model)
+    state["messages"] = session.messages()
+    state["keep_alive"] = model_lifecycle.manager.keep_alive(session.model, at_least=config.SESSION_KEEP_ALIVE)
+    return add_user_message(state, user_message)
+
+@app.route('/api/sessions', methods=['POST'])
+def create_session():
+    """Create a conversation session kept on the server"""
+    data = request.get_json(silent=True) or {}
+    error = pipeline.validate_session(data)
+    if error is not None:
+        return jsonify({"error": error}), 400
+    
+    model = data.get('model', config.OLLAMA_MODEL)
+    if not model_catalog.catalog.is_known(model):
+        return jsonify({"error": f"Model '{model}' not found."}), 404
+    metrics.set_model(model)
+    
+    session = sessions.store.create(model, data.get('system'))
+    return jsonify(session.to_dict()), 201
+
+@app.route('/api/sessions/<session_id>', methods=['GET'])
+def get_session(session_id):
+    """Get the history of a session"""
+    session = sessions.store.get(session_id)
+    if session is None:
+        return jsonify({"error": "Session not found."}), 404
+    return jsonify(session.to_dict())
+
+@app.route('/api/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    """End a session"""
+    if not sessions.store.delete(session_id):
+        return jsonify({"error": "Session not found."}), 404
+    return '', 204
+
+@app.route('/api/sessions/<session_id>/messages', methods=['POST'])
+def session_message(session_id):
+    """Send the next user message in a session and return the reply using LangGraph"""
+    session = sessions.store.get(session_id)
+    if session is None:
+        return jsonify({"error": "Session not found."}), 404
+    
+    data = request.get_json(silent=True)
+    error = pipeline.validate_session_message(data)
+    if error is not None:
+        return jsonify({"error": error}), 400
+    metrics.set_model(session.model)
+    
+    try:
+        with session.lock:
+            state = create_session_state(session, data['content'])
+            state["admission"] = admission.pending()
+            with tracing.span("chat_graph.invoke"):
+                result = chat_graph.invoke(state)
+            session.commit(data['content'], result["current_response"])
         
+        return jsonify({
+            "message": result["messages"][-1],
+            "model": session.model,
+            "session_id": session.id,
+            "metrics": result.get("metrics") or {}
+        })
+    
+    except admission.Rejected as e:
+        return admission.rejected_response(e)
+    except Exception as e:
+        return jsonify({"error": f"Error: {str(e)}"}), 500
+
+@app.route('/api/sessions/<session_id>/messages/stream', methods=['POST'])
+def stream_session_message(session_id):
+    """Send the next user message in a session and stream the reply using LangGraph"""
+    session = sessions.store.get(session_id)
+    if session is None:
+        return jsonify({"error": "Session not found."}), 404
+    
+    data = request.get_json(silent=True)
+    error = pipeline.validate_session_message(data)
+    if error is not None:
+        return jsonify({"error": error}), 400
+    metrics.set_model(session.model)
+    
+    bridge = StreamBridge()
+    req = admission.pending()
+    
+    def run_graph():
+        try:
+            state = create_session_state(session, data['content'])
+            state["stream_handler"] = bridge.put
+            state["admission"] = req
+            with tracing.span("streaming_chat_graph.invoke"):
+                result = streaming_chat_graph.invoke(state)
+            session.commit(data['content'], result["current_response"])
+        except StreamCancelled:
+            raise
         except Exception as e:
-            error_msg = {'error': str(e)}
-            yield f"data: {json.dumps(error_msg)}\n\n"
-            yield f"data: {{\"done\": true}}\n\n"
+            bridge.put(sse_relay.frame({'error': str(e)}))
+            bridge.put(sse_relay.frame({'done': True}))
+        finally:
+            session.lock.release()
+    
+    # The worker's spans belong to this request's trace
+    run_graph = tracing.bind(run_graph)
+    
+    def sse_generator():
+        # Turns in one session run one at a time; the worker releases the
+        # lock once it has recorded the reply
+        session.lock.acquire()
+        bridge.start(run_graph)
+        try:
+            yield from bridge.coalesced()
+        finally:
+            bridge.cancel()
     
     return Response(stream_with_context(sse_generator()), content_type='text/event-stream')
 
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Get semantic cache hit rate, size and lookup latency"""
+    return jsonify({"semantic": semantic_cache.stats()})
+
+@app.route('/api/conversations/stats', methods=['GET'])
+def get_conversation_log_stats():
+    """Get conversation log queue depth and written, dropped and failed counts"""
+    return jsonify(conversation_log.stats())
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 200 once the pinned models are loaded in Ollama, else 503"""
+    status = model_lifecycle.manager.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
 @app.route('/api/config', methods=['GET'])
 def get_config():
     """Get the current configuration"""
@@ -0,0 +1,229 @@
+"""
+Prometheus metrics for the proxy routes, served at /metrics.
+
+Request counts, latency histograms and in-flight gauges are recorded per route
+and model by Flask request hooks. The model label is only set by a route once
+it has validated the request (set_model); requests it rejects are counted under
+"other", as are models past the first METRICS_MAX_MODELS, so clients cannot
+grow the label set. Upstream timings come from the fields Ollama
+already returns in its final frame (eval_count, eval_duration,
+prompt_eval_duration), plus time to first token measured by the relay. The
+relay only keeps a reference to the last line and parses it once the stream
+ends, so the per-token loop does no extra work.
+
+The metric types are small in-process implementations rendered in the
+Prometheus text exposition format, so no client library is needed.
+"""
+
+import bisect
+import json
+import threading
+import time
+from typing import Dict, Optional, Sequence, Tuple
+from flask import g, request, Response
+import config
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+LOOKUP_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+OTHER_MODEL = "other"
+
+_registry = []
+_models = set()
+_models_lock = threading.Lock()
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, float] = {}
+        _registry.append(self)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, values)} {value}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for values, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += bucket_count
+                    le = _format_labels(self.labels, values, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, values)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, values)} {count}")
+        return "\n".join(lines)
+
+
+requests_total = Counter("msrit_requests_total", "Requests handled, by route, model and status", ("route", "model", "status"))
+request_seconds = Histogram("msrit_request_duration_seconds", "Request latency including streaming", ("route", "model"))
+in_flight = Gauge("msrit_in_flight_requests", "Requests currently being handled", ("route",))
+errors_total = Counter("msrit_errors_total", "Errors by route and cause", ("route", "cause"))
+upstream_ttft = Histogram("msrit_upstream_ttft_seconds", "Time from the upstream request to the first token", ("kind", "model"))
+upstream_prompt_seconds = Histogram("msrit_upstream_prompt_eval_seconds", "Ollama prompt evaluation time", ("kind", "model"))
+upstream_tokens_per_second = Histogram("msrit_upstream_tokens_per_second", "Ollama generation speed", ("kind", "model"), RATE_BUCKETS)
+upstream_tokens = Counter("msrit_upstream_eval_tokens_total", "Tokens generated by Ollama", ("kind", "model"))
+upstream_errors = Counter("msrit_upstream_errors_total", "Failed upstream calls by cause", ("cause",))
+semantic_cache_lookups = Counter("msrit_semantic_cache_lookups_total", "Semantic cache lookups by result", ("result",))
+semantic_cache_seconds = Histogram("msrit_semantic_cache_lookup_seconds", "Semantic cache lookup time by stage", ("stage",), LOOKUP_BUCKETS)
+retrieval_seconds = Histogram("msrit_retrieval_seconds", "Retrieval index lookup time per question", (), LOOKUP_BUCKETS)
+conversation_log_records = Counter("msrit_conversation_log_records_total", "Logged chat exchanges by outcome (written, dropped, failed)", ("outcome",))
+
+
+def model_label(model) -> str:
+    """Label value for a model name; "other" for a non-string or once METRICS_MAX_MODELS names are in use"""
+    if not isinstance(model, str):
+        return OTHER_MODEL
+    if model in _models:
+        return model
+    with _models_lock:
+        if model not in _models:
+            if len(_models) >= config.METRICS_MAX_MODELS:
+                return OTHER_MODEL
+            _models.add(model)
+    return model
+
+
+def set_model(model) -> None:
+    """Label the current request's metrics with its model; call once the route has validated it"""
+    g.metrics_model = model_label(model)
+
+
+def record_generation(kind: str, model: str, final: Optional[dict]) -> None:
+    """Record Ollama's own timings from a final (done) response frame"""
+    if not final or not final.get("done"):
+        return
+    model = model_label(model)
+    eval_count = final.get("eval_count") or 0
+    eval_ns = final.get("eval_duration") or 0
+    prompt_ns = final.get("prompt_eval_duration")
+    if prompt_ns is not None:
+        upstream_prompt_seconds.observe(prompt_ns / 1e9, kind, model)
+    if eval_count:
+        upstream_tokens.inc(kind, model, amount=eval_count)
+        if eval_ns:
+            upstream_tokens_per_second.observe(eval_count / (eval_ns / 1e9), kind, model)
+
+
+def record_final_frame(kind: str, model: str, line: bytes) -> None:
+    """Record timings from the raw last line of an Ollama stream"""
+    try:
+        record_generation(kind, model, json.loads(line))
+    except ValueError:
+        pass
+
+
+def record_ttft(kind: str, model: str, started: float) -> None:
+    upstream_ttft.observe(time.perf_counter() - started, kind, model_label(model))
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+def install(app) -> None:
+    """Record request metrics for every /api route and serve them at /metrics"""
+
+    @app.before_request
+    def start_timer():
+        if not request.path.startswith('/api/'):
+            return
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        g.metrics = (route, time.perf_counter())
+        in_flight.inc(route)
+
+    @app.after_request
+    def record_request(response):
+        state = g.pop('metrics', None)
+        if state is None:
+            return response
+        route, started = state
+        model = g.pop('metrics_model', OTHER_MODEL)
+        status = response.status_code
+        requests_total.inc(route, model, status)
+        if status == 429:
+            errors_total.inc(route, "rate_limited")
+        elif status >= 500:
+            errors_total.inc(route, "server")
+        elif status >= 400:
+            errors_total.inc(route, "client")
+
+        # Streams are measured until the response is closed
+        def finish():
+            request_seconds.observe(time.perf_counter() - started, route, model)
+            in_flight.dec(route)
+
+        response.call_on_close(finish)
+        return response
+
+    @app.teardown_request
+    def record_exception(exc):
+        state = g.pop('metrics', None)
+        if state is not None:
+            route, started = state
+            errors_total.inc(route, "exception")
+            in_flight.dec(route)
+
+    @app.route('/metrics', methods=['GET'])
+    def get_metrics():
+        """Prometheus metrics"""
+        return Response(render(), content_type='text/plain; version=0.0.4')
@@ -0,0 +1,97 @@
+"""
+Cached catalog of the models Ollama serves.
+
+/api/models is answered from a cached copy of Ollama's /api/tags. Once the copy
+is older than MODEL_CATALOG_TTL it is refreshed on a background thread while
+the stale copy keeps being served, and a failed refresh keeps the last good
+copy. Every copy carries an ETag so browsers can revalidate with
+If-None-Match. The catalog is also used to reject unknown models before any
+upstream call.
+"""
+
+import hashlib
+import threading
+import time
+from typing import Tuple
+import config
+import ollama_client
+
+
+class CatalogError(Exception):
+    """Raised when no copy of the catalog is available"""
+
+
+def normalize(name: str) -> str:
+    """Ollama treats a model name without a tag as ':latest'"""
+    return name if ':' in name else f"{name}:latest"
+
+
+class ModelCatalog:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._body = None
+        self._etag = None
+        self._names = frozenset()
+        self._fetched_at = 0.0
+        self._refreshing = False
+
+    def refresh(self) -> None:
+        """Fetch /tags from Ollama and replace the cached copy"""
+        try:
+            response = ollama_client.get("/tags")
+        except Exception as e:
+            raise CatalogError(f"Error connecting to Ollama: {str(e)}")
+        if response.status_code != 200:
+            raise CatalogError(f"Failed to fetch models: {response.text}")
+
+        body = response.content
+        names = set()
+        for model in response.json().get("models", []):
+            names.update(normalize(model[key]) for key in ("name", "model") if model.get(key))
+
+        with self._lock:
+            self._body = body
+            self._etag = hashlib.sha1(body).hexdigest()
+            self._names = frozenset(names)
+            self._fetched_at = time.monotonic()
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except CatalogError:
+                pass  # Keep serving the last good copy
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def snapshot(self) -> Tuple[bytes, str]:
+        """Cached /tags body and its ETag; only the very first load blocks"""
+        if self._body is None:
+            self.refresh()
+        elif time.monotonic() - self._fetched_at > self.ttl:
+            self._refresh_in_background()
+        return self._body, self._etag
+
+    def is_known(self, model: str) -> bool:
+        """False only when the catalog is loaded and nobody serves the model"""
+        if self._body is None or time.monotonic() - self._fetched_at > self.ttl:
+            self._refresh_in_background()
+        if self._body is None:
+            return True
+        name = normalize(model)
+        if name in self._names:
+            return True
+        # Endpoints probed by the backend pool may serve models this copy lacks
+        return any(name in map(normalize, e.models) for e in ollama_client.pool.endpoints)
+
+
+catalog = ModelCatalog(config.MODEL_CATALOG_TTL)
@@ -0,0 +1,164 @@
+"""
+Model warm-up, keep-alive hints and readiness.
+
+Ollama loads a model on its first request and unloads it after keep_alive of
+idleness, so the first request after startup or a quiet spell pays a
+multi-second load. The manager keeps the pinned models (OLLAMA_MODEL plus
+WARMUP_MODELS) resident: a background thread loads them on every endpoint at
+startup and re-sends them every WARMUP_INTERVAL seconds, which reloads a model
+Ollama has dropped and otherwise just extends its keep_alive. Models whose
+recent traffic reaches WARMUP_HOT_RPM requests per minute are kept warm the
+same way.
+
+Requests carry a keep_alive hint sized to their model's traffic: a few times
+the typical gap between its requests, between KEEP_ALIVE_MIN and
+KEEP_ALIVE_MAX, so a model that is used every few minutes is still loaded
+when the next request comes. The readiness endpoint reports ready once every
+pinned model is resident on a healthy endpoint.
+"""
+
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+import config
+import ollama_client
+from model_catalog import normalize
+
+_DURATION = re.compile(r"^(\d+(?:\.\d+)?)([smh]?)$")
+_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600}
+
+
+def seconds(duration) -> float:
+    """Seconds in an Ollama keep_alive value such as 300, "30m" or "1h" (negative: forever)"""
+    if isinstance(duration, (int, float)):
+        return float(duration) if duration >= 0 else float("inf")
+    match = _DURATION.match(str(duration).strip())
+    if match is None:
+        raise ValueError(f"Invalid keep_alive duration: {duration!r}")
+    return float(match.group(1)) * _UNITS[match.group(2)]
+
+
+class ModelManager:
+    def __init__(self, pinned: List[str]):
+        self.pinned = list(dict.fromkeys(normalize(model) for model in pinned))
+        self._lock = threading.Lock()
+        self._requests: Dict[str, deque] = {}  # model -> recent request times
+        self._resident: Dict[str, List[str]] = {}  # endpoint base -> loaded models
+        self._errors: Dict[str, str] = {}  # endpoint base -> last warm-up error
+        self._checked_at = None
+        self._thread = None
+
+    def keep_alive(self, model: str, at_least: Optional[str] = None) -> str:
+        """Record a request for model and return the keep_alive to send with it"""
+        with self._lock:
+            self._requests.setdefault(model, deque(maxlen=1024)).append(time.monotonic())
+        return self.hint(model, at_least)
+
+    def hint(self, model: str, at_least: Optional[str] = None) -> str:
+        """keep_alive for model from its recent traffic, never below at_least"""
+        with self._lock:
+            times = self._requests.get(model) or deque()
+            gap = self._typical_gap(times, time.monotonic())
+
+        low, high = seconds(config.KEEP_ALIVE_MIN), seconds(config.KEEP_ALIVE_MAX)
+        if normalize(model) in self.pinned:
+            hint = high
+        elif gap is None:
+            hint = low
+        else:
+            hint = min(max(config.KEEP_ALIVE_GAP_FACTOR * gap, low), high)
+        if at_least is not None:
+            hint = max(hint, seconds(at_least))
+        return "-1m" if hint == float("inf") else f"{int(hint)}s"
+
+    def _typical_gap(self, times: deque, now: float) -> Optional[float]:
+        """Mean seconds between the requests of the traffic window, None with fewer than two"""
+        while times and now - times[0] > config.WARMUP_TRAFFIC_WINDOW:
+            times.popleft()
+        if len(times) < 2:
+            return None
+        return (times[-1] - times[0]) / (len(times) - 1)
+
+    def requests_per_minute(self, model: str) -> float:
+        now = time.monotonic()
+        with self._lock:
+            times = self._requests.get(model)
+            if not times:
+                return 0.0
+            self._typical_gap(times, now)
+            return len(times) * 60 / config.WARMUP_TRAFFIC_WINDOW
+
+    def warm_models(self) -> List[str]:
+        """Pinned models plus the ones hot enough to keep loaded"""
+        with self._lock:
+            seen = list(self._requests)
+        hot = [m for m in seen if normalize(m) not in self.pinned and self.requests_per_minute(m) >= config.WARMUP_HOT_RPM]
+        return self.pinned + hot
+
+    def warm(self) -> None:
+        """Load or refresh every warm model on every endpoint, then record what is resident"""
+        models = self.warm_models()
+        for endpoint in ollama_client.pool.endpoints:
+            error = None
+            for model in models:
+                # Skip endpoints known not to have the model pulled
+                if endpoint.models and model not in map(normalize, endpoint.models):
+                    continue
+                try:
+                    ollama_client.load_model(endpoint.base, model, self.hint(model))
+                except Exception as e:
+                    error = f"{model}: {str(e)}"
+            try:
+                resident = ollama_client.running_models(endpoint.base)
+            except Exception as e:
+                resident, error = [], str(e)
+            with self._lock:
+                self._resident[endpoint.base] = resident
+                if error:
+                    self._errors[endpoint.base] = error
+                else:
+                    self._errors.pop(endpoint.base, None)
+        self._checked_at = time.time()
+
+    def ready(self) -> bool:
+        """Whether every pinned model is resident on at least one healthy endpoint"""
+        if not config.WARMUP_ENABLED:
+            return True
+        healthy = {e.base for e in ollama_client.pool.endpoints if e.healthy}
+        with self._lock:
+            resident = {normalize(m) for base, models in self._resident.items() if base in healthy for m in models}
+        return all(model in resident for model in self.pinned)
+
+    def start(self) -> None:
+        """Start warming models on a background thread (once)"""
+        if self._thread is not None or not config.WARMUP_ENABLED:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            self.warm()
+            # Retry sooner while the pinned models are not loaded yet
+            time.sleep(config.WARMUP_INTERVAL if self.ready() else config.WARMUP_RETRY_INTERVAL)
+
+    def status(self) -> dict:
+        with self._lock:
+            resident = {base: sorted(models) for base, models in self._resident.items()}
+            errors = dict(self._errors)
+        return {
+            "ready": self.ready(),
+            "pinned": self.pinned,
+            "warm": self.warm_models(),
+            "resident": resident,
+            "errors": errors,
+            "checked_at": self._checked_at
+        }
+
+
+manager = ModelManager([config.OLLAMA_MODEL] + list(config.WARMUP_MODELS))
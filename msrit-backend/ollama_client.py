@@ -0,0 +1,125 @@
+"""
+Shared HTTP client for the Ollama API.
+
+Every call to Ollama goes through the pooled session in this module so that
+connections are kept alive between requests, every request has a connect and
+read timeout, and idempotent calls are retried with backoff. Requests are
+spread over the configured OLLAMA_ENDPOINTS by the backend pool.
+"""
+
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import config
+import fast_json
+import backends
+import metrics
+import tracing
+
+# (connect, read) timeout applied to every request unless overridden
+TIMEOUT = (config.OLLAMA_CONNECT_TIMEOUT, config.OLLAMA_READ_TIMEOUT)
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def _build_session() -> requests.Session:
+    """Create a session with a bounded keep-alive pool and a retry policy"""
+    retry = Retry(
+        total=config.OLLAMA_MAX_RETRIES,
+        backoff_factor=config.OLLAMA_RETRY_BACKOFF,
+        status_forcelist=(502, 503, 504),
+        # Only replay requests that are safe to send twice; POSTs are still
+        # retried on connection errors since nothing reached Ollama yet
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=len(config.OLLAMA_ENDPOINTS),
+        pool_maxsize=config.OLLAMA_POOL_SIZE,
+        pool_block=True,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+session = _build_session()
+
+# Health probes must fail fast, so they skip the retry policy
+_probe_session = requests.Session()
+
+
+def _probe(base: str) -> list:
+    """Health check used by the backend pool: the models an endpoint serves"""
+    response = _probe_session.get(f"{base}/tags", timeout=(config.OLLAMA_CONNECT_TIMEOUT, config.BACKEND_PROBE_TIMEOUT))
+    response.raise_for_status()
+    return [model["name"] for model in response.json().get("models", [])]
+
+
+pool = backends.Pool(config.OLLAMA_ENDPOINTS, _probe)
+
+
+def running_models(base: str) -> list:
+    """Models an endpoint currently holds in memory (Ollama's /api/ps)"""
+    response = _probe_session.get(f"{base}/ps", timeout=(config.OLLAMA_CONNECT_TIMEOUT, config.BACKEND_PROBE_TIMEOUT))
+    response.raise_for_status()
+    return [model["name"] for model in response.json().get("models", [])]
+
+
+def load_model(base: str, model: str, keep_alive: str) -> None:
+    """Load a model on one endpoint, or extend its keep_alive if it is loaded already"""
+    # A generate request without a prompt only loads the model
+    response = session.post(f"{base}/generate", json={"model": model, "keep_alive": keep_alive}, timeout=TIMEOUT)
+    response.raise_for_status()
+
+
+def _send(method: str, path: str, model: Optional[str], **kwargs) -> requests.Response:
+    """Send a request to the best endpoint for model, tracking it as in flight"""
+    kwargs.setdefault("timeout", TIMEOUT)
+    endpoint = pool.choose(model)
+    span = tracing.span(f"ollama {method} {path}", tracing.CLIENT, model=model, endpoint=endpoint.base)
+    try:
+        response = session.request(method, f"{endpoint.base}{path}", **kwargs)
+    except Exception as e:
+        pool.release(endpoint, ok=False)
+        metrics.upstream_errors.inc(type(e).__name__)
+        span.record_error(e)
+        span.end()
+        raise
+
+    ok = response.status_code < 500
+    span.set_attribute("http.status_code", response.status_code)
+    if response.status_code >= 400:
+        metrics.upstream_errors.inc(f"status_{response.status_code}")
+    if not kwargs.get("stream"):
+        pool.release(endpoint, ok)
+        span.end()
+        return response
+
+    # A stream stays in flight until the caller closes the response
+    close = response.close
+    released = []
+
+    def release_and_close():
+        if not released:
+            released.append(True)
+            pool.release(endpoint, ok)
+            span.end()
+        close()
+
+    response.close = release_and_close
+    return response
+
+
+def get(path: str, **kwargs) -> requests.Response:
+    """GET an Ollama API path through the shared session"""
+    return _send("GET", path, None, **kwargs)
+
+
+def post(path: str, payload: dict, stream: bool = False, **kwargs) -> requests.Response:
+    """POST a JSON payload to an Ollama API path through the shared session"""
+    body = fast_json.dumps(payload)
+    return _send("POST", path, payload.get("model"), data=body, headers=JSON_HEADERS, stream=stream, **kwargs)
@@ -0,0 +1,463 @@
+"""
+Request pipeline shared by the Ollama proxy routes of app.py.
+
+/api/chat, /api/chat/stream, /api/generate and /api/generate/stream all run
+the same steps:
+
+1. validate the JSON body against the route's schema (compiled once, at import)
+2. build the Ollama payload, forwarding Ollama's request fields (format,
+   keep_alive, tools, system, ...) and its full options set, given either as
+   an "options" object or as top-level shortcuts such as "temperature",
+   "seed" or "num_ctx"
+3. run the route's hooks, which may answer without calling Ollama
+4. call Ollama (identical concurrent calls share one upstream request) and
+   return the body as is, or relay the stream as resumable SSE
+
+Hooks are how per-route behaviour plugs in: prepare(ctx) adjusts the
+payload, lookup(ctx) may return a stored final response body, complete(ctx,
+body) sees the final body of a successful call, and finish(ctx, body) the
+final body of every answered request, stored or generated, including each
+client sharing or resuming a stream. A resumed stream makes no upstream call,
+so it runs resume(ctx) instead of prepare(ctx). Caching, keep_alive
+hints and the conversation log are hooks; rate limits run before the route
+(admission.install), and request metrics after it (metrics.install). Only the
+request that makes the upstream call takes an admission slot, so stored
+answers, requests sharing a call in flight and resumed streams never queue.
+"""
+
+import time
+from typing import Any, Callable, Dict, Optional, Sequence
+from flask import Response, jsonify, request
+import admission
+import config
+import conversation_log
+import fast_json
+import metrics
+import model_catalog
+import model_lifecycle
+import ollama_client
+import response_cache
+import semantic_cache
+import singleflight
+import sse_relay
+
+# Ollama's model options, with the JSON type each must have
+OPTION_TYPES = {
+    "num_keep": "integer", "seed": "integer", "num_predict": "integer", "top_k": "integer",
+    "top_p": "number", "min_p": "number", "typical_p": "number", "repeat_last_n": "integer",
+    "temperature": "number", "repeat_penalty": "number", "presence_penalty": "number",
+    "frequency_penalty": "number", "mirostat": "integer", "mirostat_tau": "number",
+    "mirostat_eta": "number", "penalize_newline": "boolean", "stop": "array", "numa": "boolean",
+    "num_ctx": "integer", "num_batch": "integer", "num_gpu": "integer", "main_gpu": "integer",
+    "low_vram": "boolean", "vocab_only": "boolean", "use_mmap": "boolean", "use_mlock": "boolean",
+    "num_thread": "integer"
+}
+
+MESSAGE_SCHEMA = {
+    "role": ("string", True),
+    "content": ("string", False),
+    "images": ("array", False),
+    "tool_calls": ("array", False)
+}
+
+# Request fields forwarded to Ollama as they are: name -> (type, required)
+COMMON_FIELDS = {
+    "model": ("string", False),
+    "format": (("string", "object"), False),
+    "keep_alive": (("string", "number"), False),
+    "options": ("object", False)
+}
+REQUEST_SCHEMAS = {
+    "chat": {
+        "messages": ("array", True),
+        "tools": ("array", False),
+        **COMMON_FIELDS
+    },
+    "generate": {
+        "prompt": ("string", True),
+        "suffix": ("string", False),
+        "images": ("array", False),
+        "system": ("string", False),
+        "template": ("string", False),
+        "context": ("array", False),
+        "raw": ("boolean", False),
+        **COMMON_FIELDS
+    }
+}
+
+_TYPE_CHECKS = {
+    "string": lambda v: isinstance(v, str),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "array": lambda v: isinstance(v, list),
+    "object": lambda v: isinstance(v, dict)
+}
+
+
+def _type_check(types) -> Callable[[Any], bool]:
+    if isinstance(types, str):
+        return _TYPE_CHECKS[types]
+    checks = [_TYPE_CHECKS[t] for t in types]
+    return lambda v: any(check(v) for check in checks)
+
+
+def _type_name(types) -> str:
+    """'an array', 'a string or an object', ..."""
+    names = [types] if isinstance(types, str) else types
+    return " or ".join(("an " if name[0] in "aeiou" else "a ") + name for name in names)
+
+
+def compile_schema(fields: Dict[str, tuple], where: str = "") -> Callable[[Any], Optional[str]]:
+    """Build a validator for fields (name -> (type, required)); it returns an error message or None"""
+    required = [(name, f"Invalid request. '{where}{name}' field is required.")
+                for name, (_, is_required) in fields.items() if is_required]
+    typed = [(name, _type_check(types), f"Invalid request. '{where}{name}' must be {_type_name(types)}.")
+             for name, (types, _) in fields.items()]
+
+    def validate(data) -> Optional[str]:
+        if not isinstance(data, dict):
+            data = {}
+        for name, message in required:
+            if name not in data:
+                return message
+        for name, check, message in typed:
+            if name in data and not check(data[name]):
+                return message
+        return None
+
+    return validate
+
+
+def _compile_request(kind: str) -> Callable[[Any], Optional[str]]:
+    validate_fields = compile_schema(REQUEST_SCHEMAS[kind])
+    validate_options = compile_schema({name: (t, False) for name, t in OPTION_TYPES.items()})
+    validate_nested = compile_schema({name: (t, False) for name, t in OPTION_TYPES.items()}, "options.")
+    validate_message = compile_schema(MESSAGE_SCHEMA, "messages[].")
+
+    def validate(data) -> Optional[str]:
+        error = validate_fields(data)
+        if error is None:
+            error = validate_options(data) or validate_nested(data.get("options"))
+        if error is None and kind == "chat":
+            error = next(filter(None, map(validate_message, data["messages"])), None)
+        return error
+
+    return validate
+
+
+validators = {kind: _compile_request(kind) for kind in REQUEST_SCHEMAS}
+
+# Bodies of the session routes
+validate_session = compile_schema({"model": ("string", False), "system": ("string", False)})
+validate_session_message = compile_schema({"content": ("string", True)})
+_forwarded = {kind: tuple(name for name in fields if name not in ("model", "options"))
+              for kind, fields in REQUEST_SCHEMAS.items()}
+_option_names = frozenset(OPTION_TYPES)
+
+
+def build_payload(kind: str, data: dict, model: str, stream: bool) -> dict:
+    """Ollama payload for a validated request body"""
+    payload = {"model": model, "stream": stream}
+    for name in _forwarded[kind]:
+        if name in data:
+            payload[name] = data[name]
+
+    # Top-level shortcuts first, so an explicit "options" object wins
+    options = {name: data[name] for name in _option_names.intersection(data)}
+    if data.get("options"):
+        options.update(data["options"])
+    if options:
+        payload["options"] = options
+    return payload
+
+
+class Context:
+    """One proxied request, shared by the pipeline steps and the route's hooks"""
+
+    def __init__(self, kind: str, model: str, payload: dict):
+        self.kind = kind
+        self.model = model
+        self.payload = payload
+        self.record = False  # Set by a hook that needs the final body of a stream
+        self.cached = None  # Name of the hook whose lookup answered, if one did
+        self.state = {}  # Per-hook state
+
+
+class Hook:
+    """Extension point of a route; every method is optional"""
+
+    name = None  # Recorded as Context.cached when this hook's lookup answers
+
+    def prepare(self, ctx: Context) -> None:
+        pass
+
+    def resume(self, ctx: Context) -> None:
+        pass
+
+    def lookup(self, ctx: Context) -> Optional[bytes]:
+        return None
+
+    def complete(self, ctx: Context, body: bytes) -> None:
+        pass
+
+    def finish(self, ctx: Context, body: bytes) -> None:
+        pass
+
+
+class KeepAlive(Hook):
+    """Send a keep_alive sized to the model's traffic unless the client chose one"""
+
+    def prepare(self, ctx: Context) -> None:
+        hint = model_lifecycle.manager.keep_alive(ctx.model)
+        ctx.payload.setdefault("keep_alive", hint)
+
+
+class ResponseCache(Hook):
+    """Exact-match cache for deterministic requests"""
+
+    name = "response"
+
+    def lookup(self, ctx: Context) -> Optional[bytes]:
+        key = response_cache.key_for(ctx.kind, ctx.payload)
+        if key is None:
+            return None
+        ctx.state["cache_key"] = key
+        ctx.record = True
+        return response_cache.get(key)
+
+    def complete(self, ctx: Context, body: bytes) -> None:
+        response_cache.put(ctx.state.get("cache_key"), body)
+
+
+class SemanticCache(Hook):
+    """Answers near-duplicate first questions (chat only)"""
+
+    name = "semantic"
+
+    def lookup(self, ctx: Context) -> Optional[bytes]:
+        similar = semantic_cache.lookup(ctx.payload)
+        if similar is None:
+            return None
+        ctx.state["semantic"] = similar
+        ctx.record = True
+        return similar.body
+
+    def complete(self, ctx: Context, body: bytes) -> None:
+        semantic_cache.store(ctx.state.get("semantic"), body)
+
+
+class ConversationLog(Hook):
+    """Hands every answered chat exchange to the write-behind conversation log"""
+
+    def prepare(self, ctx: Context) -> None:
+        if conversation_log.log is None:
+            return
+        ctx.record = True
+        ctx.state["log"] = (time.perf_counter(), admission.client_key())
+
+    resume = prepare
+
+    def finish(self, ctx: Context, body: bytes) -> None:
+        if "log" not in ctx.state:
+            return
+        started, client = ctx.state["log"]
+        conversation_log.record(ctx.model, ctx.payload.get("messages") or [], body, ctx.payload["stream"],
+                                started=started, client=client, cached=ctx.cached)
+
+
+def post_and_record(kind: str, payload: dict):
+    """Non-streaming Ollama call that records the generation timings"""
+    response = ollama_client.post(f"/{kind}", payload)
+    if response.status_code == 200:
+        metrics.record_generation(kind, payload["model"], fast_json.loads(response.content))
+    return response
+
+
+def relay_stream(ctx: Context, hooks: Sequence[Hook]):
+    """Relay an Ollama stream as SSE frames, then hand the final body to the hooks' complete()
+
+    Returns the final body (when a hook asked for it), which the flight keeps
+    for the finish() of each subscriber.
+    """
+    kind, payload = ctx.kind, ctx.payload
+    try:
+        started = time.perf_counter()
+        with ollama_client.post(f"/{kind}", payload, stream=True) as response:
+            if response.status_code != 200:
+                yield sse_relay.frame({'error': f'Ollama API error: {response.text}'})
+                return
+
+            # Raw lines are kept only when a hook needs the whole answer
+            framer = sse_relay.Framer()
+            recorded = [] if ctx.record else None
+            last = None
+            for chunk in sse_relay.iter_chunks(response):
+                lines = framer.feed(chunk)
+                if lines:
+                    if last is None:
+                        metrics.record_ttft(kind, payload["model"], started)
+                    last = lines
+                    if recorded is not None:
+                        recorded.append(lines)
+                    # A frame per line, so a resume starts at the exact line
+                    yield from sse_relay.line_frames(lines)
+
+            lines = framer.flush()
+            if lines:
+                last = lines
+                if recorded is not None:
+                    recorded.append(lines)
+                yield from sse_relay.line_frames(lines)
+
+            body = response_cache.assemble(kind, b"\n".join(recorded).split(b"\n")) if recorded else None
+            if body is not None:
+                for hook in hooks:
+                    hook.complete(ctx, body)
+            # Only the final frame carries Ollama's timings
+            if last is not None:
+                metrics.record_final_frame(kind, payload["model"], last[last.rfind(b"\n") + 1:])
+            return body
+
+    except Exception as e:
+        yield sse_relay.frame({'error': str(e)})
+
+
+def sse_stream(flight, start: int = 0, finish: Optional[Callable[[Any], None]] = None):
+    """SSE writes for a shared stream from frame start, with ids for resumption
+
+    finish(result) runs once this client has received the whole stream, with
+    what the producer returned.
+    """
+    try:
+        for index, batch in flight.iterate(config.STREAM_FLUSH_INTERVAL, start):
+            yield sse_relay.with_ids(flight.id, index, batch)
+        if flight.error is not None:
+            yield sse_relay.frame({'error': str(flight.error)})
+        if finish is not None and flight.result is not None:
+            finish(flight.result)
+    finally:
+        singleflight.streams.leave(flight)
+
+
+def resumed_stream(kind: str, key: str, finish: Optional[Callable[[Any], None]] = None) -> Optional[Response]:
+    """Response continuing the stream named by Last-Event-ID, or None if it is gone
+
+    The stream must have been started by the same kind of route for the same
+    request (key); any other id starts a fresh stream.
+    """
+    event_id = sse_relay.parse_event_id(request.headers.get('Last-Event-ID'))
+    flight = singleflight.streams.resume(event_id[0], kind, key) if event_id else None
+    if flight is None:
+        return None
+    return Response(sse_stream(flight, event_id[1], finish), content_type='text/event-stream')
+
+
+class Route:
+    """A proxy route: request schema, Ollama endpoint, streaming or not, and hooks"""
+
+    def __init__(self, kind: str, stream: bool, hooks: Sequence[Hook] = ()):
+        self.kind = kind
+        self.stream = stream
+        self.hooks = tuple(hooks)
+        self._validate = validators[kind]
+
+    def handle(self):
+        """Run the pipeline for the current Flask request"""
+        data = request.get_json(silent=True)
+        error = self._validate(data)
+        if error is not None:
+            return jsonify({"error": error}), 400
+
+        model = data.get('model', config.OLLAMA_MODEL)
+        if not model_catalog.catalog.is_known(model):
+            return jsonify({"error": f"Model '{model}' not found."}), 404
+        metrics.set_model(model)
+
+        if not self.stream:
+            return self._call(data, model)
+
+        # A reconnecting client picks up where its stream left off
+        if request.headers.get('Last-Event-ID'):
+            resumed = self._resume(data, model)
+            if resumed is not None:
+                return resumed
+        return self._events(data, model)
+
+    def _finish(self, ctx: Context, body) -> None:
+        for hook in self.hooks:
+            hook.finish(ctx, body)
+
+    def _resume(self, data: dict, model: str) -> Optional[Response]:
+        ctx = Context(self.kind, model, build_payload(self.kind, data, model, self.stream))
+        for hook in self.hooks:
+            hook.resume(ctx)
+        key = response_cache.make_key(self.kind, ctx.payload)
+        return resumed_stream(self.kind, key, lambda body: self._finish(ctx, body))
+
+    def _prepare(self, data: dict, model: str) -> tuple:
+        """Build the context and run the hooks; returns it with a stored body, if any"""
+        ctx = Context(self.kind, model, build_payload(self.kind, data, model, self.stream))
+        for hook in self.hooks:
+            hook.prepare(ctx)
+        for hook in self.hooks:
+            body = hook.lookup(ctx)
+            if body is not None:
+                ctx.cached = hook.name
+                return ctx, body
+        return ctx, None
+
+    def _call(self, data: dict, model: str):
+        try:
+            ctx, body = self._prepare(data, model)
+            if body is not None:
+                self._finish(ctx, body)
+                return Response(body, content_type='application/json')
+
+            # Identical concurrent requests share one upstream call, and one admission slot
+            flight_key = response_cache.make_key(self.kind, ctx.payload)
+            req = admission.pending()
+
+            def post():
+                with admission.slot(req):
+                    return post_and_record(self.kind, ctx.payload)
+
+            response = singleflight.calls.do(flight_key, post)
+
+            if response.status_code == 200:
+                for hook in self.hooks:
+                    hook.complete(ctx, response.content)
+                self._finish(ctx, response.content)
+                return Response(response.content, content_type='application/json')
+            else:
+                return jsonify({"error": f"Ollama API error: {response.text}"}), response.status_code
+
+        except admission.Rejected as e:
+            return admission.rejected_response(e)
+        except Exception as e:
+            return jsonify({"error": f"Error: {str(e)}"}), 500
+
+    def _events(self, data: dict, model: str):
+        """SSE response; joined before it is returned, so a stream without a slot is a 429"""
+        try:
+            ctx, body = self._prepare(data, model)
+            if body is not None:
+                return Response(self._replay(ctx, body), content_type='text/event-stream')
+
+            # Identical concurrent requests share one upstream stream, and one admission slot
+            flight_key = response_cache.make_key(self.kind, ctx.payload)
+            req = admission.pending()
+            flight = singleflight.streams.join(flight_key, lambda: relay_stream(ctx, self.hooks),
+                                               admit=lambda: admission.take_slot(req), kind=self.kind)
+            return Response(sse_stream(flight, finish=lambda body: self._finish(ctx, body)),
+                            content_type='text/event-stream')
+
+        except admission.Rejected as e:
+            return admission.rejected_response(e)
+        except Exception as e:
+            return Response(sse_relay.frame({'error': str(e)}), content_type='text/event-stream')
+
+    def _replay(self, ctx: Context, body: bytes):
+        for frame in response_cache.replay(self.kind, body):
+            yield sse_relay.frame(frame)
+        self._finish(ctx, body)
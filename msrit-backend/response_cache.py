@@ -0,0 +1,222 @@
+"""
+Response cache for deterministic Ollama requests.
+
+Responses are keyed on a canonical hash of the Ollama payload and only cached
+when sampling is deterministic (temperature 0 or a fixed seed), so a cached
+answer is the one Ollama would have produced anyway. Two backends are
+available: an in-process LRU with TTL and a memory bound, and a Redis backend
+shared by every replica. The cache is opt-in via RESPONSE_CACHE_ENABLED.
+
+Streaming and non-streaming requests share entries: a completed stream is
+stored as the equivalent non-streaming body, and a hit on a streaming route is
+replayed as a frame carrying the whole answer followed by the done frame.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+import config
+import fast_json
+
+try:
+    import redis
+except ImportError:  # Only needed for the shared backend
+    redis = None
+
+
+def is_deterministic(payload: dict) -> bool:
+    """True when the payload will always produce the same output"""
+    options = payload.get('options') or {}
+    temperature = payload.get('temperature', options.get('temperature'))
+    seed = payload.get('seed', options.get('seed'))
+    return temperature == 0 or seed is not None
+
+
+def make_key(kind: str, payload: dict) -> str:
+    """Canonical hash of a payload; 'stream' and 'keep_alive' do not affect the answer"""
+    canonical = {k: v for k, v in payload.items() if k not in ('stream', 'keep_alive')}
+    return f"{kind}:{hashlib.sha256(fast_json.dumps_canonical(canonical)).hexdigest()}"
+
+
+class MemoryCache:
+    """In-process LRU cache with per-entry TTL and a total size bound"""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, value = self._entries.pop(key)
+        self._size -= len(key) + len(value)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size
+            }
+
+
+class RedisCache:
+    """Cache shared by all replicas; LRU eviction is left to Redis' maxmemory policy"""
+
+    def __init__(self, url: str, ttl: float, prefix: str = "msrit:cache:"):
+        if redis is None:
+            raise RuntimeError("The redis cache backend requires the 'redis' package")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        self.client.set(self.prefix + key, value, ex=self.ttl)
+
+    def stats(self) -> dict:
+        info = self.client.info('stats')
+        return {
+            "backend": "redis",
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": info.get('evicted_keys', 0) + info.get('expired_keys', 0)
+        }
+
+
+def _build_cache():
+    if not config.RESPONSE_CACHE_ENABLED:
+        return None
+    if config.RESPONSE_CACHE_BACKEND == "redis":
+        return RedisCache(config.RESPONSE_CACHE_REDIS_URL, config.RESPONSE_CACHE_TTL)
+    return MemoryCache(
+        config.RESPONSE_CACHE_MAX_ENTRIES,
+        config.RESPONSE_CACHE_MAX_BYTES,
+        config.RESPONSE_CACHE_TTL
+    )
+
+
+cache = _build_cache()
+
+
+def key_for(kind: str, payload: dict) -> Optional[str]:
+    """Cache key for a payload, or None when the cache does not apply"""
+    if cache is None or not is_deterministic(payload):
+        return None
+    return make_key(kind, payload)
+
+
+def get(key: Optional[str]) -> Optional[bytes]:
+    """Look up a cached response body"""
+    if key is None:
+        return None
+    try:
+        return cache.get(key)
+    except Exception:
+        # A cache outage must never fail the request
+        return None
+
+
+def put(key: Optional[str], value: bytes) -> None:
+    """Store a response body"""
+    if key is None:
+        return
+    try:
+        cache.set(key, value)
+    except Exception:
+        pass
+
+
+def _text(kind: str, frame: dict) -> str:
+    if kind == "chat":
+        return (frame.get('message') or {}).get('content', '')
+    return frame.get('response', '')
+
+
+def _set_text(kind: str, frame: dict, text: str) -> None:
+    if kind == "chat":
+        frame['message'] = {**(frame.get('message') or {'role': 'assistant'}), 'content': text}
+    else:
+        frame['response'] = text
+
+
+def assemble(kind: str, lines: list) -> Optional[bytes]:
+    """The non-streaming response body equivalent to a completed stream of NDJSON lines"""
+    if not lines:
+        return None
+    try:
+        frames = [json.loads(line) for line in lines]
+    except ValueError:
+        return None
+    final = frames[-1]
+    if not final.get('done') or 'error' in final:
+        return None
+    final = dict(final)
+    _set_text(kind, final, ''.join(_text(kind, frame) for frame in frames))
+    return json.dumps(final).encode('utf-8')
+
+
+def replay(kind: str, cached: bytes) -> list:
+    """Rebuild stream frames from a cached body: the full answer, then the done frame"""
+    final = json.loads(cached)
+    head = {k: final[k] for k in ('model', 'created_at') if k in final}
+    _set_text(kind, head, _text(kind, final))
+    head['done'] = False
+    _set_text(kind, final, '')
+    return [json.dumps(head), json.dumps(final)]
+
+
+def stats() -> dict:
+    """Hit, miss and eviction counters for the configured backend"""
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
@@ -0,0 +1,331 @@
+"""
+BM25 retrieval of document passages for the LangGraph pipeline.
+
+Instead of pasting whole documents into the system message, the institution's
+documents are indexed once, offline:
+
+    python retrieval.py build docs/ [--output retrieval-index]
+
+splits every .txt, .md, .rst and .html file under the folder into passages of
+about RETRIEVAL_PASSAGE_TOKENS and writes a BM25 inverted index of them as
+NumPy arrays. The BM25 weight of every (term, passage) pair is computed at
+build time, so a query only sums the posting weights of its terms. Terms are
+stored as sorted 64-bit hashes, and every array (terms, postings, passage
+offsets) is opened memory-mapped: the service starts without reading the
+index, and worker processes share its pages through the OS page cache instead
+of each holding a copy.
+
+When RETRIEVAL_ENABLED is on, the LangGraph graphs run a retrieval node after
+trim_history: the last user message is looked up and the best
+RETRIEVAL_TOP_K passages that fit in RETRIEVAL_TOKEN_BUDGET are added as a
+system message just before it. Lookup time is reported in the response
+metrics and in msrit_retrieval_seconds. If the index cannot be opened the
+service does not start. Needs the 'numpy' package.
+
+    python retrieval.py query "hostel fees" [--index retrieval-index]
+
+shows what a question retrieves.
+"""
+
+import argparse
+import hashlib
+import html
+import json
+import math
+import os
+import re
+import shutil
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+import config
+import metrics
+
+try:
+    import numpy as np
+except ImportError:  # Only needed when retrieval is enabled
+    np = None
+
+EXTENSIONS = (".txt", ".md", ".markdown", ".rst", ".html", ".htm")
+
+CONTEXT_PROMPT = (
+    "Passages from the institution's documents that may help with the next "
+    "question. Use them when they are relevant and mention the source.\n\n"
+)
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_TAG = re.compile(r"<(script|style)\b.*?</\1>|<[^>]+>", re.IGNORECASE | re.DOTALL)
+_STOPWORDS = frozenset("""
+a about above after again all am an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having he her
+here hers him his how i if in into is it its itself just me more most my no nor not of off on once only
+or other our ours out over own same she should so some such than that the their theirs them then there
+these they this those through to too under until up very was we were what when where which while who
+whom why will with would you your yours
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words and numbers, without stopwords"""
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def term_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token, as in history.py)"""
+    return len(text) // 4 + 1
+
+
+def read_document(path: str) -> str:
+    with open(path, encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    if path.lower().endswith((".html", ".htm")):
+        text = html.unescape(_TAG.sub(" ", text))
+        text = re.sub(r"[ \t]+", " ", text)
+    return text
+
+
+def split_passages(text: str, target_tokens: int) -> List[str]:
+    """Pack paragraphs into passages of about target_tokens, splitting long ones at sentence ends"""
+    limit = target_tokens * 4
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = " ".join(paragraph.split())
+        while len(paragraph) > limit:
+            cut = paragraph.rfind(". ", limit // 2, limit) + 1 or paragraph.rfind(" ", limit // 2, limit)
+            if cut <= 0:
+                cut = limit
+            pieces.append(paragraph[:cut].strip())
+            paragraph = paragraph[cut:].strip()
+        if paragraph:
+            pieces.append(paragraph)
+
+    passages, current = [], ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 1 > limit:
+            passages.append(current)
+            current = ""
+        current = f"{current}\n{piece}" if current else piece
+    if current:
+        passages.append(current)
+    return passages
+
+
+def build_index(source_dir: str, output: str, passage_tokens: int, k1: float, b: float) -> dict:
+    """Index every document under source_dir into output; returns build statistics"""
+    if np is None:
+        raise RuntimeError("Building the retrieval index requires the 'numpy' package")
+    started = time.perf_counter()
+
+    sources, texts, passage_sources = [], [], []
+    for root, dirs, files in os.walk(source_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.lower().endswith(EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            passages = split_passages(read_document(path), passage_tokens)
+            if passages:
+                passage_sources.extend([len(sources)] * len(passages))
+                sources.append(os.path.relpath(path, source_dir))
+                texts.extend(passages)
+    if not texts:
+        raise ValueError(f"No documents with text found under {source_dir}")
+
+    # Term frequencies per passage, then BM25 weights with Lucene's idf
+    postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+    lengths = np.zeros(len(texts), dtype=np.float32)
+    for pid, text in enumerate(texts):
+        tokens = tokenize(text)
+        lengths[pid] = len(tokens)
+        for term, tf in Counter(tokens).items():
+            postings[term].append((pid, tf))
+    n, avgdl = len(texts), float(lengths.mean()) or 1.0
+    norms = k1 * (1 - b + b * lengths / avgdl)
+
+    # Terms are found by binary search over their 64-bit hashes (collisions are
+    # negligible: about one in 10^8 for a million distinct terms)
+    by_hash = sorted((term_hash(term), term) for term in postings)
+    term_hashes = np.array([h for h, _ in by_hash], dtype=np.uint64)
+    offsets = np.zeros(len(by_hash) + 1, dtype=np.int64)
+    ids, weights = [], []
+    for i, (_, term) in enumerate(by_hash):
+        entries = postings[term]
+        pids = np.array([pid for pid, _ in entries], dtype=np.int32)
+        tfs = np.array([tf for _, tf in entries], dtype=np.float32)
+        idf = math.log(1 + (n - len(entries) + 0.5) / (len(entries) + 0.5))
+        ids.append(pids)
+        weights.append((idf * tfs * (k1 + 1) / (tfs + norms[pids])).astype(np.float32))
+        offsets[i + 1] = offsets[i] + len(entries)
+
+    encoded = [text.encode("utf-8") for text in texts]
+    text_offsets = np.zeros(n + 1, dtype=np.int64)
+    text_offsets[1:] = np.cumsum([len(e) for e in encoded])
+
+    # Write next to the old index and swap, so a running service keeps its open maps
+    temp = output.rstrip("/") + ".tmp"
+    shutil.rmtree(temp, ignore_errors=True)
+    os.makedirs(temp)
+    arrays = {
+        "terms": term_hashes,
+        "offsets": offsets,
+        "postings": np.concatenate(ids),
+        "weights": np.concatenate(weights),
+        "text_offsets": text_offsets,
+        "sources": np.array(passage_sources, dtype=np.int32),
+        "tokens": np.array([estimate_tokens(t) for t in texts], dtype=np.int32)
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(temp, f"{name}.npy"), array)
+    with open(os.path.join(temp, "passages.bin"), "wb") as f:
+        f.write(b"".join(encoded))
+    meta = {"version": 1, "k1": k1, "b": b, "passages": n, "terms": len(by_hash), "avgdl": avgdl, "documents": sources}
+    with open(os.path.join(temp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    if os.path.isdir(output):
+        shutil.rmtree(output)
+    os.replace(temp, output)
+
+    return {
+        "documents": len(sources),
+        "passages": n,
+        "terms": len(by_hash),
+        "postings": int(offsets[-1]),
+        "bytes": sum(os.path.getsize(os.path.join(output, f)) for f in os.listdir(output)),
+        "seconds": round(time.perf_counter() - started, 3)
+    }
+
+
+class RetrievalIndex:
+    """A built index, opened memory-mapped"""
+
+    def __init__(self, path: str):
+        if np is None:
+            raise RuntimeError("Retrieval requires the 'numpy' package")
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        load = lambda name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        self.terms = load("terms")
+        self.offsets = load("offsets")
+        self.postings = load("postings")
+        self.weights = load("weights")
+        self.text_offsets = load("text_offsets")
+        self.sources = load("sources")
+        self.tokens = load("tokens")
+        self.texts = np.memmap(os.path.join(path, "passages.bin"), dtype=np.uint8, mode="r")
+        self.documents = self.meta["documents"]
+
+    def __len__(self) -> int:
+        return self.meta["passages"]
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """(passage, score) of the k best passages for query, best first"""
+        hashes = np.array(sorted({term_hash(t) for t in tokenize(query)}), dtype=np.uint64)
+        if not len(hashes):
+            return []
+        slots = np.searchsorted(self.terms, hashes).clip(max=len(self.terms) - 1)
+        slots = slots[self.terms[slots] == hashes]
+        if not len(slots):
+            return []
+        ids = np.concatenate([self.postings[self.offsets[s]:self.offsets[s + 1]] for s in slots])
+        weights = np.concatenate([self.weights[self.offsets[s]:self.offsets[s + 1]] for s in slots])
+
+        # One pass over the postings; cheaper than sorting them to find the distinct passages
+        scores = np.bincount(ids, weights=weights, minlength=len(self))
+        top = np.argpartition(-scores, k)[:k] if len(scores) > k else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(p), float(scores[p])) for p in top if scores[p] > 0]
+
+    def text(self, passage: int) -> str:
+        start, end = self.text_offsets[passage], self.text_offsets[passage + 1]
+        return self.texts[start:end].tobytes().decode("utf-8")
+
+    def source(self, passage: int) -> str:
+        return self.documents[self.sources[passage]]
+
+
+def _load_index() -> Optional[RetrievalIndex]:
+    if not config.RETRIEVAL_ENABLED:
+        return None
+    try:
+        return RetrievalIndex(config.RETRIEVAL_INDEX_PATH)
+    except (OSError, ValueError, KeyError) as e:
+        # Retrieval was asked for; starting without it would go unnoticed
+        raise RuntimeError(f"Cannot open the retrieval index at {config.RETRIEVAL_INDEX_PATH}: {e}") from e
+
+
+index = _load_index()
+
+
+def select(found: List[Tuple[int, float]], budget: int) -> List[int]:
+    """Passages in score order that fit in the token budget together"""
+    chosen, used = [], 0
+    for passage, _ in found:
+        size = int(index.tokens[passage])
+        if used + size <= budget:
+            chosen.append(passage)
+            used += size
+    return chosen
+
+
+def augment(messages: List[Dict[str, str]]) -> Tuple[List[Dict[str, str]], Dict[str, object]]:
+    """Add the passages relevant to the last user message; returns the new messages and metrics"""
+    if index is None or not messages or messages[-1].get("role") != "user":
+        return messages, {}
+
+    started = time.perf_counter()
+    found = index.search(messages[-1].get("content") or "", config.RETRIEVAL_TOP_K)
+    chosen = select(found, config.RETRIEVAL_TOKEN_BUDGET)
+    elapsed = time.perf_counter() - started
+    metrics.retrieval_seconds.observe(elapsed)
+
+    reported = {
+        "passages": len(chosen),
+        "tokens": sum(int(index.tokens[p]) for p in chosen),
+        "sources": sorted({index.source(p) for p in chosen}),
+        "ms": round(elapsed * 1000, 3)
+    }
+    if not chosen:
+        return messages, {"retrieval": reported}
+
+    context = CONTEXT_PROMPT + "\n\n".join(
+        f"[{i}] ({index.source(p)})\n{index.text(p)}" for i, p in enumerate(chosen, 1))
+    # Just before the question, after the system prompt and history
+    augmented = messages[:-1] + [{"role": "system", "content": context}, messages[-1]]
+    return augmented, {"retrieval": reported}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the BM25 retrieval index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Index a folder of documents")
+    build.add_argument("source", help="Folder of .txt, .md, .rst and .html documents")
+    build.add_argument("--output", default=config.RETRIEVAL_INDEX_PATH)
+    build.add_argument("--passage-tokens", type=int, default=config.RETRIEVAL_PASSAGE_TOKENS)
+    build.add_argument("--k1", type=float, default=1.2)
+    build.add_argument("--b", type=float, default=0.75)
+    query = commands.add_parser("query", help="Show the passages a question retrieves")
+    query.add_argument("text")
+    query.add_argument("--index", default=config.RETRIEVAL_INDEX_PATH)
+    query.add_argument("--k", type=int, default=config.RETRIEVAL_TOP_K)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(json.dumps(build_index(args.source, args.output, args.passage_tokens, args.k1, args.b), indent=2))
+        return
+
+    opened = RetrievalIndex(args.index)
+    started = time.perf_counter()
+    found = opened.search(args.text, args.k)
+    elapsed = time.perf_counter() - started
+    for passage, score in found:
+        print(f"{score:8.3f}  {opened.documents[opened.sources[passage]]}  (~{int(opened.tokens[passage])} tokens)")
+        print("          " + opened.text(passage)[:200].replace("\n", " "))
+    print(f"{len(found)} passages in {elapsed * 1000:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Scheduling policies for requests queued by admission control.
+
+A policy assigns each queued request a sort tag when it joins the queue; when a
+slot frees up, the eligible request with the smallest tag runs next.
+
+- FifoPolicy: first come, first served.
+- FairSharePolicy: strict priority classes (interactive chat before batch
+  generation), and within a class weighted fair queuing across clients.
+  Each request costs its estimated prompt tokens divided by the client's
+  weight. Its tag is a virtual finish time, so a client that sends many or
+  long prompts falls behind one that sends a few short ones.
+
+See scheduler_sim.py for a deterministic simulation harness;
+tests/test_scheduler.py holds the policies to bounds on its results.
+"""
+
+import itertools
+from typing import Dict
+import config
+
+# Priority classes; lower runs first
+PRIORITIES = {
+    "interactive": 0,
+    "standard": 1,
+    "batch": 2
+}
+
+
+def _chars(value) -> int:
+    return len(value) if isinstance(value, str) else 0
+
+
+def estimate_cost(data: dict) -> int:
+    """Estimated prompt tokens of a chat or generate request body
+
+    Runs before the body is validated, so fields of the wrong type count as empty.
+    """
+    if not isinstance(data, dict):
+        return 1
+    chars = _chars(data.get('prompt')) + _chars(data.get('content'))
+    messages = data.get('messages')
+    for message in messages if isinstance(messages, list) else []:
+        if isinstance(message, dict):
+            chars += _chars(message.get('content'))
+    return chars // 4 + 1
+
+
+class Request:
+    """A request waiting for a slot"""
+
+    def __init__(self, model: str, client: str = "", priority: str = "standard", cost: int = 1):
+        self.model = model
+        self.client = client
+        self.priority = PRIORITIES.get(priority, PRIORITIES["standard"])
+        self.cost = max(1, cost)
+        self.tag = None
+        self.start = 0.0
+
+
+class FifoPolicy:
+    """First come, first served"""
+
+    def __init__(self):
+        self._seq = itertools.count()
+
+    def enqueue(self, req: Request) -> None:
+        req.tag = (next(self._seq),)
+
+    def dispatched(self, req: Request) -> None:
+        pass
+
+
+class FairSharePolicy:
+    """Priority classes, then weighted fair queuing by estimated prompt size"""
+
+    def __init__(self, weights: Dict[str, float] = None):
+        self.weights = weights or {}
+        self._seq = itertools.count()
+        self.virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+
+    def enqueue(self, req: Request) -> None:
+        weight = self.weights.get(req.client, 1.0)
+        req.start = max(self.virtual_time, self._last_finish.get(req.client, 0.0))
+        finish = req.start + req.cost / weight
+        self._last_finish[req.client] = finish
+        req.tag = (req.priority, finish, next(self._seq))
+
+    def dispatched(self, req: Request) -> None:
+        # Self-clocked virtual time: advance to the start tag of the request served
+        self.virtual_time = max(self.virtual_time, req.start)
+        if len(self._last_finish) > 10000:
+            self._last_finish = {c: f for c, f in self._last_finish.items() if f > self.virtual_time}
+
+
+POLICIES = {
+    "fifo": FifoPolicy,
+    "fair": FairSharePolicy
+}
+
+
+def build_policy(name: str = None):
+    """Create the policy named in SCHEDULER_POLICY"""
+    name = name or config.SCHEDULER_POLICY
+    if name == "fair":
+        return FairSharePolicy(config.SCHEDULER_CLIENT_WEIGHTS)
+    return POLICIES[name]()
@@ -0,0 +1,122 @@
+"""
+Deterministic simulation harness for the admission scheduling policies.
+
+Replays a synthetic workload through a policy with a fixed number of
+generation slots, using simulated time only, so the same seed always gives the
+same result. The default scenario has one batch client that queues many long
+/api/generate prompts at once while interactive users keep sending short chat
+turns. tests/test_scheduler.py asserts the waits each policy must stay within.
+
+Usage:
+    python scheduler_sim.py [--policy fifo|fair|all] [--seed N] [--slots N]
+"""
+
+import argparse
+import heapq
+import json
+import random
+from collections import defaultdict
+from typing import Dict, List
+import scheduler
+
+# Simulated seconds per prompt token (prompt eval) and per reply
+PROMPT_SECONDS_PER_TOKEN = 0.002
+REPLY_SECONDS = 1.5
+
+
+class Job:
+    def __init__(self, arrival: float, client: str, priority: str, cost: int, model: str = "gemma3:1b"):
+        self.arrival = arrival
+        self.req = scheduler.Request(model, client, priority, cost)
+        self.priority = priority
+        self.started = None
+
+    @property
+    def service_time(self) -> float:
+        return self.req.cost * PROMPT_SECONDS_PER_TOKEN + REPLY_SECONDS
+
+
+def default_workload(seed: int = 0) -> List[Job]:
+    """A batch job dumping long prompts at t=0, plus a steady stream of short chats"""
+    rng = random.Random(seed)
+    jobs = [Job(0.0, "batch", "batch", rng.randint(1500, 3000)) for _ in range(40)]
+    for user in range(10):
+        t = rng.uniform(0, 2)
+        while t < 60:
+            jobs.append(Job(t, f"user{user}", "interactive", rng.randint(20, 200)))
+            t += rng.expovariate(1 / 8.0)
+    return sorted(jobs, key=lambda job: job.arrival)
+
+
+def simulate(policy, jobs: List[Job], slots: int) -> List[Job]:
+    """Run jobs through policy with the given number of slots; sets job.started"""
+    queue: List[Job] = []
+    running = []  # heap of finish times
+    now = 0.0
+    pending = list(jobs)
+    pending.reverse()
+
+    while pending or queue:
+        while pending and pending[-1].arrival <= now:
+            job = pending.pop()
+            policy.enqueue(job.req)
+            queue.append(job)
+
+        while queue and len(running) < slots:
+            job = min(queue, key=lambda j: j.req.tag)
+            queue.remove(job)
+            policy.dispatched(job.req)
+            job.started = now
+            heapq.heappush(running, now + job.service_time)
+
+        # Advance to the next completion or arrival, whichever comes first
+        next_arrival = pending[-1].arrival if pending else float("inf")
+        if running and running[0] <= next_arrival:
+            now = heapq.heappop(running)
+        else:
+            now = next_arrival
+
+    return jobs
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def summarize(jobs: List[Job]) -> Dict[str, dict]:
+    """Queue wait per priority class"""
+    waits = defaultdict(list)
+    for job in jobs:
+        waits[job.priority].append(job.started - job.arrival)
+    return {
+        priority: {
+            "requests": len(values),
+            "wait_mean": round(sum(values) / len(values), 3),
+            "wait_p50": round(percentile(values, 50), 3),
+            "wait_p95": round(percentile(values, 95), 3),
+            "wait_max": round(max(values), 3)
+        }
+        for priority, values in sorted(waits.items())
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate admission scheduling policies")
+    parser.add_argument("--policy", default="all", choices=["all"] + sorted(scheduler.POLICIES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--slots", type=int, default=4)
+    args = parser.parse_args()
+
+    names = sorted(scheduler.POLICIES) if args.policy == "all" else [args.policy]
+    results = {}
+    for name in names:
+        jobs = simulate(scheduler.POLICIES[name](), default_workload(args.seed), args.slots)
+        results[name] = summarize(jobs)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
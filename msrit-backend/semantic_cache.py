@@ -0,0 +1,294 @@
+"""
+Semantic answer cache for near-duplicate questions.
+
+The exact-match response cache misses questions asked in different words. This
+cache embeds the last user message through Ollama's embeddings endpoint
+(SEMANTIC_CACHE_EMBED_MODEL) and compares it with the questions answered so
+far: one NumPy matrix-vector product over the normalized embeddings gives
+every cosine similarity at once. The most similar question at or above
+SEMANTIC_CACHE_THRESHOLD is a hit and its stored answer is returned.
+
+Only the first question of a conversation is cached, since a later answer
+depends on the turns before it, and entries are scoped to the model and
+system prompt. The index holds at most SEMANTIC_CACHE_MAX_ENTRIES questions
+and evicts the least recently used one when full. With SEMANTIC_CACHE_PATH
+set, embeddings live in memory-mapped .npy files and answers in an
+append-only JSON lines file, so the index survives restarts. The cache is
+opt-in via SEMANTIC_CACHE_ENABLED and needs the 'numpy' package.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import List, Optional
+import config
+import metrics
+import ollama_client
+
+try:
+    import numpy as np
+except ImportError:  # Only needed when the semantic cache is enabled
+    np = None
+
+
+class Lookup:
+    """Outcome of a lookup: the answer on a hit, else what store() needs to add one"""
+
+    def __init__(self, scope: int, vector, body: Optional[bytes] = None, similarity: float = 0.0):
+        self.scope = scope
+        self.vector = vector
+        self.body = body
+        self.similarity = similarity
+
+
+class SemanticIndex:
+    """Fixed-capacity vector index with LRU eviction, optionally backed by memory-mapped files"""
+
+    def __init__(self, capacity: int, path: Optional[str] = None):
+        if np is None:
+            raise RuntimeError("The semantic cache requires the 'numpy' package")
+        self.capacity = capacity
+        self.path = path
+        self._lock = threading.Lock()
+        self._vectors = None  # (capacity, dim) float32, unit length; allocated on first add
+        self._scopes = np.zeros(capacity, dtype=np.int64)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._valid = np.zeros(capacity, dtype=bool)
+        self._bodies: List[Optional[bytes]] = [None] * capacity
+        self._count = 0  # Slots handed out so far; new entries fill these before evicting
+        self._log_lines = 0
+        self.evictions = 0
+        if path:
+            self._load()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _allocate(self, dim: int) -> None:
+        self._valid[:] = False
+        self._bodies = [None] * self.capacity
+        self._count = 0
+        if not self.path:
+            self._vectors = np.zeros((self.capacity, dim), dtype=np.float32)
+            return
+        os.makedirs(self.path, exist_ok=True)
+        self._vectors = np.lib.format.open_memmap(
+            self._file("vectors.npy"), mode="w+", dtype=np.float32, shape=(self.capacity, dim))
+        self._scopes = np.lib.format.open_memmap(
+            self._file("scopes.npy"), mode="w+", dtype=np.int64, shape=(self.capacity,))
+        self._last_used = np.lib.format.open_memmap(
+            self._file("last_used.npy"), mode="w+", dtype=np.float64, shape=(self.capacity,))
+        open(self._file("answers.jsonl"), "w").close()
+        self._log_lines = 0
+
+    def _load(self) -> None:
+        """Reopen a persisted index; a missing or mismatched one starts empty"""
+        try:
+            vectors = np.load(self._file("vectors.npy"), mmap_mode="r+")
+            scopes = np.load(self._file("scopes.npy"), mmap_mode="r+")
+            last_used = np.load(self._file("last_used.npy"), mmap_mode="r+")
+            with open(self._file("answers.jsonl"), encoding="utf-8") as f:
+                records = [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError):
+            return
+        if len(vectors) != self.capacity:
+            return  # Capacity changed; the next add starts a new index
+
+        self._vectors, self._scopes, self._last_used = vectors, scopes, last_used
+        # A reused slot is marked empty before its vector is overwritten, and its
+        # new answer line is written last, so a slot's last line matches its vector
+        for record in records:
+            slot = record["slot"]
+            body = record.get("body")
+            self._bodies[slot] = body.encode("utf-8") if body is not None else None
+            self._valid[slot] = body is not None
+            self._count = max(self._count, slot + 1)
+        self._log_lines = len(records)
+        if self._log_lines > 2 * self.capacity:
+            self._compact()
+
+    def _append(self, record: dict) -> None:
+        if not self.path:
+            return
+        with open(self._file("answers.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        self._log_lines += 1
+        if self._log_lines > 2 * self.capacity:
+            self._compact()
+
+    def _compact(self) -> None:
+        """Rewrite the answers file with one line per live entry"""
+        temp = self._file("answers.jsonl.tmp")
+        with open(temp, "w", encoding="utf-8") as f:
+            for slot in np.flatnonzero(self._valid):
+                f.write(json.dumps({"slot": int(slot), "body": self._bodies[slot].decode("utf-8")}) + "\n")
+        os.replace(temp, self._file("answers.jsonl"))
+        self._log_lines = int(self._valid.sum())
+
+    @property
+    def dim(self) -> Optional[int]:
+        return None if self._vectors is None else self._vectors.shape[1]
+
+    def __len__(self) -> int:
+        return int(self._valid.sum())
+
+    def _nearest(self, scope: int, vector) -> tuple:
+        """(slot, cosine similarity) of the closest entry in scope, slot -1 if there is none"""
+        if self._vectors is None or self.dim != len(vector) or not self._count:
+            return -1, 0.0
+        n = self._count
+        # Rows are unit length, so one matrix-vector product gives every cosine similarity
+        similarities = self._vectors[:n] @ vector
+        similarities[~(self._valid[:n] & (self._scopes[:n] == scope))] = -1.0
+        slot = int(np.argmax(similarities))
+        return slot, float(similarities[slot])
+
+    def search(self, scope: int, vector) -> tuple:
+        """(body, similarity) of the most similar entry in scope, or (None, best similarity)"""
+        with self._lock:
+            slot, similarity = self._nearest(scope, vector)
+            if slot < 0 or similarity < config.SEMANTIC_CACHE_THRESHOLD:
+                return None, similarity
+            self._last_used[slot] = time.time()
+            return self._bodies[slot], similarity
+
+    def add(self, scope: int, vector, body: bytes) -> bool:
+        """Add an answer unless a near-duplicate question was stored meanwhile"""
+        with self._lock:
+            if self.dim != len(vector):
+                # First entry, or the embedding model changed: start over
+                self._allocate(len(vector))
+            elif self._nearest(scope, vector)[1] >= config.SEMANTIC_CACHE_THRESHOLD:
+                return False
+            if self._count < self.capacity:
+                slot = self._count
+                self._count += 1
+            else:
+                # Least recently used entry goes first
+                slot = int(np.argmin(np.where(self._valid, self._last_used, -np.inf)))
+                if self._valid[slot]:
+                    self.evictions += 1
+                # Drop the old answer first; a crash before the new line leaves the slot empty
+                self._valid[slot] = False
+                self._bodies[slot] = None
+                self._append({"slot": slot, "body": None})
+            self._vectors[slot] = vector
+            self._scopes[slot] = scope
+            self._last_used[slot] = time.time()
+            self._valid[slot] = True
+            self._bodies[slot] = body
+            if self.path:
+                for array in (self._vectors, self._scopes, self._last_used):
+                    array.flush()
+            self._append({"slot": slot, "body": body.decode("utf-8")})
+            return True
+
+
+def _build_index() -> Optional[SemanticIndex]:
+    if not config.SEMANTIC_CACHE_ENABLED:
+        return None
+    return SemanticIndex(config.SEMANTIC_CACHE_MAX_ENTRIES, config.SEMANTIC_CACHE_PATH)
+
+
+index = _build_index()
+
+_stats_lock = threading.Lock()
+_stats = {"lookups": 0, "hits": 0, "misses": 0, "errors": 0, "stores": 0, "embed_seconds": 0.0, "search_seconds": 0.0}
+
+
+def _count(**amounts) -> None:
+    with _stats_lock:
+        for name, amount in amounts.items():
+            _stats[name] += amount
+
+
+def question(payload: dict) -> Optional[str]:
+    """The question to look up, or None when the answer depends on earlier turns"""
+    messages = payload.get("messages") or []
+    if not messages or messages[-1].get("role") != "user":
+        return None
+    if any(message.get("role") == "assistant" for message in messages):
+        return None
+    return messages[-1].get("content") or None
+
+
+def scope_of(payload: dict) -> int:
+    """Entries only match requests for the same model and system prompt"""
+    system = [m.get("content") or "" for m in payload.get("messages") or [] if m.get("role") == "system"]
+    blob = json.dumps([payload.get("model"), system], ensure_ascii=False).encode("utf-8")
+    return int.from_bytes(hashlib.sha256(blob).digest()[:8], "big", signed=True)
+
+
+def embed(text: str):
+    """Unit-length embedding of text from Ollama"""
+    response = ollama_client.post("/embeddings", {"model": config.SEMANTIC_CACHE_EMBED_MODEL, "prompt": text})
+    response.raise_for_status()
+    vector = np.asarray(response.json()["embedding"], dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def lookup(payload: dict) -> Optional[Lookup]:
+    """Find a stored answer to a near-duplicate question; None when the cache does not apply"""
+    if index is None:
+        return None
+    text = question(payload)
+    if text is None:
+        return None
+
+    started = time.perf_counter()
+    try:
+        vector = embed(text)
+    except Exception:
+        # An embedding failure must never fail the request
+        _count(errors=1)
+        metrics.semantic_cache_lookups.inc("error")
+        return None
+    embedded = time.perf_counter()
+    scope = scope_of(payload)
+    body, similarity = index.search(scope, vector)
+    searched = time.perf_counter()
+
+    result = "hit" if body is not None else "miss"
+    _count(lookups=1, hits=int(body is not None), misses=int(body is None),
+           embed_seconds=embedded - started, search_seconds=searched - embedded)
+    metrics.semantic_cache_lookups.inc(result)
+    metrics.semantic_cache_seconds.observe(embedded - started, "embed")
+    metrics.semantic_cache_seconds.observe(searched - embedded, "search")
+    return Lookup(scope, vector, body, similarity)
+
+
+def store(found: Optional[Lookup], body: Optional[bytes]) -> None:
+    """Add the answer to a missed lookup (a final non-streaming Ollama body)"""
+    if found is None or found.body is not None or not body:
+        return
+    try:
+        added = index.add(found.scope, found.vector, body)
+    except Exception:
+        return
+    _count(stores=int(added))
+
+
+def stats() -> dict:
+    """Hit rate, size and average lookup latency"""
+    if index is None:
+        return {"enabled": False}
+    with _stats_lock:
+        s = dict(_stats)
+    lookups = s["lookups"] or 1
+    return {
+        "enabled": True,
+        "entries": len(index),
+        "capacity": index.capacity,
+        "lookups": s["lookups"],
+        "hits": s["hits"],
+        "misses": s["misses"],
+        "errors": s["errors"],
+        "hit_rate": round(s["hits"] / lookups, 4),
+        "stores": s["stores"],
+        "evictions": index.evictions,
+        "avg_embed_ms": round(s["embed_seconds"] * 1000 / lookups, 3),
+        "avg_search_ms": round(s["search_seconds"] * 1000 / lookups, 3)
+    }
@@ -0,0 +1,59 @@
+"""
+Production launcher for the chat backend.
+
+Serves app.py, the full backend (sessions, batch, caches, admission control,
+metrics, tracing and resumable streams), under gunicorn with threaded workers.
+
+Usage:
+    python serve.py [--host HOST] [--port PORT] [--workers N] [--threads N]
+"""
+
+import argparse
+import config
+
+
+def serve_flask(args) -> None:
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for name, value in {
+                "bind": f"{args.host}:{args.port}",
+                "workers": args.workers or config.SERVER_WORKERS,
+                "worker_class": "gthread",
+                "threads": args.threads,
+                "keepalive": config.SERVER_KEEP_ALIVE,
+                "worker_exit": worker_exit
+            }.items():
+                self.cfg.set(name, value)
+
+        def load(self):
+            # Imported in each worker, so its background threads start after the fork
+            from app import app
+            return app
+
+    Server().run()
+
+
+def worker_exit(server, worker) -> None:
+    # Write the exchanges still queued for the conversation log
+    import conversation_log
+    conversation_log.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the MSRIT chat backend")
+    parser.add_argument("--host", default=config.FLASK_HOST)
+    parser.add_argument("--port", type=int, default=config.FLASK_PORT)
+    parser.add_argument("--workers", type=int, help="Number of worker processes")
+    parser.add_argument("--threads", type=int, default=config.SERVER_THREADS,
+                        help="Request threads per worker")
+    args = parser.parse_args()
+
+    print(f"Starting server on {args.host}:{args.port}")
+    print(f"Using Ollama at {config.OLLAMA_API_BASE} with model {config.OLLAMA_MODEL}")
+    serve_flask(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Server-side conversation sessions.
+
+Clients create a session once and then post only the new user message on each
+turn; the server keeps the history. History is stored as compact
+(role, content) tuples and capped by turn count and estimated tokens, and
+sessions that stay idle longer than SESSION_IDLE_TIMEOUT are evicted.
+
+Every session request sends the same message prefix plus a keep_alive hint,
+so Ollama keeps the model loaded and can reuse its cached prompt prefix.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+import config
+import model_lifecycle
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+class Session:
+    """One conversation: a system message plus a bounded message history"""
+
+    def __init__(self, model: str, system: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.model = model
+        self.system = system
+        self.history = deque()  # (role, content) tuples, oldest first
+        self.tokens = 0
+        self.last_used = time.monotonic()
+        # Held for a whole turn so turns in one session run in order
+        self.lock = threading.Lock()
+
+    def messages(self, user_message: Optional[str] = None) -> List[Dict[str, str]]:
+        """History in the format expected by Ollama, optionally with a new user message"""
+        messages = [{"role": "system", "content": self.system}] if self.system else []
+        messages.extend({"role": role, "content": content} for role, content in self.history)
+        if user_message is not None:
+            messages.append({"role": "user", "content": user_message})
+        return messages
+
+    def payload(self, user_message: str, stream: bool) -> dict:
+        """Ollama /chat payload for the next turn"""
+        return {
+            "model": self.model,
+            "messages": self.messages(user_message),
+            "stream": stream,
+            "keep_alive": model_lifecycle.manager.keep_alive(self.model, at_least=config.SESSION_KEEP_ALIVE)
+        }
+
+    def commit(self, user_message: str, reply: str) -> None:
+        """Append a finished turn and trim the oldest turns to the configured caps"""
+        for role, content in (("user", user_message), ("assistant", reply)):
+            self.history.append((role, content))
+            self.tokens += estimate_tokens(content)
+
+        while self.history and (
+            len(self.history) > 2 * config.SESSION_MAX_TURNS
+            or self.tokens > config.SESSION_MAX_TOKENS
+        ):
+            # Drop a whole user/assistant pair so history starts with a user turn
+            for _ in range(2):
+                _, content = self.history.popleft()
+                self.tokens -= estimate_tokens(content)
+
+    def to_dict(self) -> dict:
+        return {
+            "session_id": self.id,
+            "model": self.model,
+            "messages": self.messages()
+        }
+
+
+class SessionStore:
+    """Sessions ordered by last use, so idle ones are evicted from the front"""
+
+    def __init__(self, idle_timeout: float, max_sessions: int):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, model: str, system: Optional[str] = None) -> Session:
+        session = Session(model, system)
+        with self._lock:
+            self._evict()
+            self._sessions[session.id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            self._evict()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_used = time.monotonic()
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def _evict(self) -> None:
+        cutoff = time.monotonic() - self.idle_timeout
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.last_used > cutoff:
+                break
+            self._sessions.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+store = SessionStore(config.SESSION_IDLE_TIMEOUT, config.SESSION_MAX_SESSIONS)
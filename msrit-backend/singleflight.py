@@ -0,0 +1,257 @@
+"""
+In-flight request coalescing for identical concurrent prompts.
+
+Concurrent requests with the same canonical payload share one upstream
+generation. For non-streaming calls the first caller runs the request and the
+others wait for its result. For streams a single producer thread reads from
+Ollama and fans the frames out to every subscriber; a late joiner first gets
+the frames produced so far and then follows the live stream. The producer runs
+in the context of the request that started it, so its trace spans belong to
+that request's trace, and only that request queues for an admission slot.
+When the last subscriber leaves and does not come back within
+STREAM_RESUME_GRACE seconds, the producer stops and the upstream response is
+closed.
+
+Every stream has an id, and a client that lost its connection can resume it
+from any frame (see StreamGroup.resume), even after it has finished, by
+sending the same request again. What the producer returns is kept as the
+flight's result for every subscriber.
+"""
+
+import contextvars
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+import config
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class CallGroup:
+    """Share the result of one call between concurrent callers with the same key"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        if not config.COALESCE_REQUESTS:
+            return fn()
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+
+class _Flight:
+    """Frames produced so far by one upstream stream, plus its subscribers"""
+
+    def __init__(self, kind: str = "", key: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind  # Route kind and request key, which a resume must match
+        self.key = key
+        self.cond = threading.Condition()
+        self.frames = []
+        self.nbytes = 0
+        self.done = False
+        self.finished_at = None
+        self.result = None  # Return value of the producer, once done
+        self.error = None   # Why the stream never started, if it did not
+        self.cancelled = False
+        self.subscribers = 0
+
+    def publish(self, frame: Any) -> None:
+        with self.cond:
+            self.frames.append(frame)
+            if isinstance(frame, (bytes, str)):
+                self.nbytes += len(frame)
+            self.cond.notify_all()
+
+    def finish(self, result: Any = None, error: Optional[Exception] = None) -> None:
+        with self.cond:
+            self.result = result
+            self.error = error
+            self.done = True
+            self.finished_at = time.monotonic()
+            self.cond.notify_all()
+
+    def iterate(self, linger: float = 0, start: int = 0) -> Iterator[Tuple[int, list]]:
+        """Yield (index of first frame, frames) batches from start, blocking for new ones until done
+
+        A batch holds everything published since the previous one; with linger
+        set it also waits up to linger seconds for more frames to arrive.
+        """
+        position = start
+        while True:
+            with self.cond:
+                while position >= len(self.frames) and not self.done:
+                    self.cond.wait()
+                if linger and not self.done:
+                    deadline = time.monotonic() + linger
+                    remaining = linger
+                    while remaining > 0 and not self.done:
+                        self.cond.wait(remaining)
+                        remaining = deadline - time.monotonic()
+                batch = self.frames[position:]
+                if not batch:
+                    return
+            yield position, batch
+            position += len(batch)
+
+
+class StreamGroup:
+    """Fan out one upstream stream to every concurrent subscriber with the same key
+
+    Streams stay resumable by id: when the last subscriber leaves, the producer
+    keeps going for STREAM_RESUME_GRACE seconds in case the client reconnects,
+    and finished streams are kept for STREAM_RESUME_TTL seconds, within
+    STREAM_RESUME_MAX_BYTES in total.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Tuple[str, str], _Flight] = {}
+        self._resumable: "OrderedDict[str, _Flight]" = OrderedDict()
+
+    def join(self, key: Optional[str], produce: Callable[[], Iterator[Any]],
+             admit: Optional[Callable[[], Callable[[], None]]] = None, kind: str = "", share: bool = True) -> _Flight:
+        """Subscribe to the stream for (kind, key), starting produce() if none is running
+
+        A key of None, or share=False, never shares the stream; the key still
+        names the request for resume(). Call leave() when done reading.
+        Before starting a producer, admit() runs in the caller and returns the
+        function to call once the producer stops (e.g. to take and free an
+        admission slot); subscribers to a running stream never call it. If it
+        raises, the stream ends with that error for everyone who joined it.
+        """
+        with self._lock:
+            share = share and key is not None and config.COALESCE_REQUESTS
+            flight = self._flights.get((kind, key)) if share else None
+            leader = flight is None
+            if leader:
+                flight = _Flight(kind, key)
+                if share:
+                    self._flights[kind, key] = flight
+                self._resumable[flight.id] = flight
+                self._evict()
+            flight.subscribers += 1
+
+        if leader:
+            try:
+                release = admit() if admit is not None else None
+            except Exception as e:
+                with self._lock:
+                    flight.subscribers -= 1
+                    self._forget(flight)
+                flight.finish(error=e)
+                raise
+            # Context variables such as the current trace span carry over to the producer
+            context = contextvars.copy_context()
+            thread = threading.Thread(target=context.run, args=(self._run, key, flight, produce, release), daemon=True)
+            thread.start()
+        return flight
+
+    def resume(self, flight_id: str, kind: str = "", key: Optional[str] = None) -> Optional[_Flight]:
+        """Subscribe again to a running or recently finished stream, if it is still kept
+
+        Only a stream of the same kind, started for the same request key, is resumed.
+        """
+        with self._lock:
+            self._evict()
+            flight = self._resumable.get(flight_id)
+            if flight is None or flight.cancelled or flight.kind != kind or flight.key != key:
+                return None
+            flight.subscribers += 1
+            return flight
+
+    def leave(self, flight: _Flight) -> None:
+        with self._lock:
+            flight.subscribers -= 1
+            if flight.subscribers > 0 or flight.done:
+                return
+        if config.STREAM_RESUME_GRACE > 0:
+            # Give a dropped client time to reconnect before stopping generation
+            timer = threading.Timer(config.STREAM_RESUME_GRACE, self._abandon, (flight,))
+            timer.daemon = True
+            timer.start()
+        else:
+            self._abandon(flight)
+
+    def _abandon(self, flight: _Flight) -> None:
+        with self._lock:
+            if flight.subscribers > 0 or flight.done:
+                return
+            # Nobody is listening any more; stop pulling tokens from Ollama
+            flight.cancelled = True
+            self._forget(flight)
+
+    def _forget(self, flight: _Flight) -> None:
+        self._resumable.pop(flight.id, None)
+        for key, running in list(self._flights.items()):
+            if running is flight:
+                del self._flights[key]
+
+    def _evict(self) -> None:
+        """Drop finished streams past their TTL, then the oldest ones over the byte bound"""
+        now = time.monotonic()
+        for flight in list(self._resumable.values()):
+            if flight.done and now - flight.finished_at > config.STREAM_RESUME_TTL:
+                del self._resumable[flight.id]
+        total = sum(flight.nbytes for flight in self._resumable.values())
+        for flight in list(self._resumable.values()):
+            if total <= config.STREAM_RESUME_MAX_BYTES:
+                break
+            if flight.done:
+                del self._resumable[flight.id]
+                total -= flight.nbytes
+
+    def _run(self, key: Optional[str], flight: _Flight, produce: Callable[[], Iterator[Any]],
+             release: Optional[Callable[[], None]] = None) -> None:
+        frames = produce()
+        result = None
+        try:
+            while not flight.cancelled:
+                flight.publish(next(frames))
+        except StopIteration as stop:
+            result = stop.value
+        finally:
+            # Closing the generator exits its 'with' block and the upstream response
+            try:
+                frames.close()
+            finally:
+                if release is not None:
+                    release()
+            with self._lock:
+                if self._flights.get((flight.kind, key)) is flight:
+                    del self._flights[flight.kind, key]
+            flight.finish(result)
+
+
+calls = CallGroup()
+streams = StreamGroup()
@@ -0,0 +1,121 @@
+"""
+Low-overhead relay of Ollama NDJSON streams as Server-Sent Events.
+
+Upstream bytes are framed as they arrive: the complete lines of each network
+read become SSE frames by plain concatenation, so a token costs no decode,
+JSON parse, f-string or re-encode. JSON is only parsed where the server needs
+the content, and then in one call over all lines at the end of the stream
+(see parse).
+
+Consumers coalesce frames into fewer writes: whatever has been produced since
+the last write goes out together, optionally waiting STREAM_FLUSH_INTERVAL
+seconds for more.
+
+Streams relayed through singleflight.streams hold one frame per NDJSON line
+(see line_frames), and every frame carries an SSE id of the form
+"<stream id>:<index>", so a client that lost its connection can send the last
+one it saw back as Last-Event-ID and resume exactly after it.
+
+See bench/relay_bench.py for a micro-benchmark of the per-token cost.
+"""
+
+import re
+import fast_json
+from typing import Iterator, List, Optional, Tuple
+
+# Matches the final frame of an Ollama stream
+_DONE = re.compile(rb'"done"\s*:\s*true')
+
+
+def frame(data) -> bytes:
+    """One SSE frame for a dict (serialized as JSON) or an already serialized string"""
+    if not isinstance(data, (str, bytes)):
+        data = fast_json.dumps(data)
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return b"data: " + data + b"\n\n"
+
+
+def frame_lines(lines: bytes) -> bytes:
+    """SSE frames for newline-separated NDJSON lines, in one piece (for streams that are not resumed)"""
+    return b"data: " + lines.replace(b"\n", b"\n\ndata: ") + b"\n\n"
+
+
+def line_frames(lines: bytes) -> List[bytes]:
+    """One SSE frame per NDJSON line, so each line can carry its own resume id"""
+    return [b"data: " + line + b"\n\n" for line in lines.split(b"\n")]
+
+
+def with_ids(stream_id: str, index: int, batch: List[bytes]) -> bytes:
+    """Join frames into one write, tagging each with an SSE id for resumption
+
+    The id goes on the last event of each frame, before the blank line that
+    ends it, so it names the data it is sent with. Frames of resumable streams
+    hold a single event (see line_frames), so every event has its own id.
+    """
+    prefix = b"\nid: " + stream_id.encode() + b":"
+    return b"".join(frames[:-2] + prefix + b"%d\n\n" % i for i, frames in enumerate(batch, index))
+
+
+def parse_event_id(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    """(stream id, index of the next frame) for a Last-Event-ID header, or None"""
+    stream_id, _, index = (value or "").strip().rpartition(":")
+    if not stream_id or not index.isdigit():
+        return None
+    return stream_id, int(index) + 1
+
+
+def is_done(lines: bytes) -> bool:
+    """Whether the last of the given lines is the final frame of the stream"""
+    return _DONE.search(lines, lines.rfind(b"\n") + 1) is not None
+
+
+def iter_chunks(response) -> Iterator[bytes]:
+    """Upstream bytes as they arrive (one HTTP chunk at a time for chunked responses)"""
+    if getattr(response.raw, "chunked", False):
+        # Read urllib3's stream directly, skipping requests' per-chunk wrapper
+        return response.raw.stream(None, decode_content=True)
+    return response.iter_content(chunk_size=512)
+
+
+class Framer:
+    """Splits upstream bytes into complete NDJSON lines, carrying partial lines over"""
+
+    def __init__(self):
+        self._pending = b""
+
+    def feed(self, chunk: bytes) -> bytes:
+        """The complete lines ending in chunk, newline-separated, or b''
+
+        Ollama writes one JSON object per line with no blank lines, so the
+        lines are passed through without inspecting them.
+        """
+        if self._pending:
+            chunk = self._pending + chunk
+        end = chunk.rfind(b"\n")
+        if end < 0:
+            self._pending = chunk
+            return b""
+        self._pending = chunk[end + 1:]
+        return chunk[:end]
+
+    def flush(self) -> bytes:
+        """A trailing line the stream ended without a newline, or b''"""
+        lines, self._pending = self._pending.strip(), b""
+        return lines
+
+
+def parse(segments: List[bytes]) -> list:
+    """Parse NDJSON line segments (from Framer.feed) in one call; bad lines are skipped"""
+    if not segments:
+        return []
+    try:
+        return fast_json.loads(b"[" + b"\n".join(segments).replace(b"\n", b",") + b"]")
+    except ValueError:
+        chunks = []
+        for line in b"\n".join(segments).split(b"\n"):
+            try:
+                chunks.append(fast_json.loads(line))
+            except ValueError:
+                pass
+        return chunks
@@ -0,0 +1,97 @@
+"""
+Producer/consumer bridge between a streaming LangGraph run and an SSE response.
+
+The graph runs on a worker thread and pushes serialized chunks into a bounded
+queue. The response generator blocks on the queue, so an idle stream uses no
+CPU, and a slow client applies backpressure to the producer. When the client
+goes away the bridge is cancelled and the producer's next push raises
+StreamCancelled, which unwinds the node and closes the upstream response.
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterator
+import config
+
+# End-of-stream sentinel
+_END = object()
+
+
+class StreamCancelled(Exception):
+    """Raised in the producer once the consumer has gone away"""
+
+
+class StreamBridge:
+    """Bounded single-producer, single-consumer channel"""
+
+    def __init__(self, maxsize: int = config.STREAM_QUEUE_SIZE):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._cancelled = threading.Event()
+        self.thread = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def put(self, item: Any) -> None:
+        """Push a chunk, blocking while the consumer is behind"""
+        if self._cancelled.is_set():
+            raise StreamCancelled()
+        self._queue.put(item)
+
+    def close(self) -> None:
+        """Signal end of stream to the consumer"""
+        if not self._cancelled.is_set():
+            self._queue.put(_END)
+
+    def cancel(self) -> None:
+        """Stop the producer and release it if it is blocked on a full queue"""
+        self._cancelled.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+    def start(self, target: Callable[[], None]) -> threading.Thread:
+        """Run the producer on a worker thread; the stream always ends"""
+        def worker():
+            try:
+                target()
+            except StreamCancelled:
+                pass
+            finally:
+                self.close()
+
+        self.thread = threading.Thread(target=worker, daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def coalesced(self, linger: float = config.STREAM_FLUSH_INTERVAL) -> Iterator[bytes]:
+        """Yield byte chunks joined into one write: all that is queued, waiting up to linger for more"""
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                return
+            batch = [item]
+            deadline = time.monotonic() + linger
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _END:
+                    yield b"".join(batch)
+                    return
+                batch.append(item)
+            yield b"".join(batch)
+
+    def __iter__(self) -> Iterator[Any]:
+        """Yield chunks until the end-of-stream sentinel"""
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                return
+            yield item
@@ -0,0 +1,14 @@
+"""
+Shared setup for the test suite: the backend modules are imported from the
+parent directory, and nothing reaches out to Ollama at import time.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+config.WARMUP_ENABLED = False
+config.BACKEND_HEALTH_INTERVAL = 0
@@ -0,0 +1,188 @@
+import threading
+import time
+import pytest
+from flask import Flask
+import admission
+import config
+import scheduler
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_token_bucket_allows_bursts_then_refills(clock):
+    limiter = admission.TokenBucketLimiter(rate=2.0, burst=3)
+    for _ in range(3):
+        limiter.check("a")
+    with pytest.raises(admission.Rejected) as rejected:
+        limiter.check("a")
+    assert rejected.value.retry_after == pytest.approx(0.5)
+
+    limiter.check("b")  # Buckets are per client
+    clock[0] += 0.5
+    limiter.check("a")
+
+
+def test_token_bucket_disabled_at_zero_rate():
+    limiter = admission.TokenBucketLimiter(rate=0, burst=1)
+    for _ in range(100):
+        limiter.check("a")
+
+
+def test_token_bucket_keeps_only_recent_clients(clock):
+    limiter = admission.TokenBucketLimiter(rate=1.0, burst=1, max_clients=2)
+    for client in ("a", "b", "c"):
+        limiter.check(client)
+    assert list(limiter._buckets) == ["b", "c"]
+
+
+def test_controller_caps_and_queue():
+    controller = admission.AdmissionController(max_concurrent=2, max_per_model=1, queue_size=1, queue_timeout=0.05)
+    controller.acquire(scheduler.Request("m1"))
+    controller.acquire(scheduler.Request("m2"))
+
+    # The queue holds one waiter; it times out since nothing is released
+    with pytest.raises(admission.Rejected, match="Timed out"):
+        controller.acquire(scheduler.Request("m1"))
+
+    waiter = threading.Thread(target=controller.acquire, args=(scheduler.Request("m1"),))
+    waiter.start()
+    while not controller.stats()["queue_depth"]:
+        time.sleep(0.001)
+    with pytest.raises(admission.Rejected, match="busy"):
+        controller.acquire(scheduler.Request("m1"))
+
+    controller.release("m1")  # Hands the slot to the queued request
+    waiter.join(timeout=1)
+    stats = controller.stats()
+    assert stats["active_per_model"] == {"m1": 1, "m2": 1}
+    assert stats["rejected"] == {"queue_timeout": 1, "queue_full": 1}
+    assert stats["queue_depth"] == 0
+
+
+def test_per_model_cap_lets_other_models_through():
+    controller = admission.AdmissionController(max_concurrent=4, max_per_model=1, queue_size=4, queue_timeout=0.05)
+    controller.acquire(scheduler.Request("m1"))
+    controller.acquire(scheduler.Request("m2"))
+    assert controller.stats()["active"] == 2
+
+
+@pytest.mark.parametrize("hops, forwarded, expected", [
+    (0, "203.0.113.9", "ip:10.0.0.1"),
+    (1, "203.0.113.9", "ip:203.0.113.9"),
+    (1, "198.51.100.1, 203.0.113.9", "ip:203.0.113.9"),
+    (2, "198.51.100.1, 203.0.113.9", "ip:198.51.100.1"),
+    (2, "203.0.113.9", "ip:10.0.0.1"),
+    (1, None, "ip:10.0.0.1"),
+])
+def test_client_key_trusts_only_configured_proxies(monkeypatch, hops, forwarded, expected):
+    monkeypatch.setattr(config, "RATE_LIMIT_TRUSTED_PROXIES", hops)
+    headers = {"X-Forwarded-For": forwarded} if forwarded else {}
+    with Flask(__name__).test_request_context(headers=headers, environ_base={"REMOTE_ADDR": "10.0.0.1"}):
+        assert admission.client_key() == expected
+
+
+def test_api_key_wins_over_address():
+    with Flask(__name__).test_request_context(headers={"X-API-Key": "secret"}):
+        assert admission.client_key() == "key:secret"
+
+
+@pytest.mark.parametrize("model", [5, ["x"], {"a": 1}])
+def test_non_string_model_is_a_client_error(model):
+    import app
+    response = app.app.test_client().post('/api/chat', json={"model": model, "messages": []})
+    assert response.status_code == 400
+    response.close()
+    assert admission.controller.stats()["active"] == 0
+
+
+class GatedUpstream:
+    """A streaming Ollama /chat response that starts once the test opens the gate"""
+
+    status_code = 200
+    text = ""
+    raw = None
+
+    def __init__(self, gate: threading.Event):
+        self.gate = gate
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def iter_content(self, chunk_size=None):
+        self.gate.wait(5)
+        yield b'{"message": {"role": "assistant", "content": "hi"}, "done": false}\n'
+        yield b'{"message": {"role": "assistant", "content": ""}, "done": true, "eval_count": 1}\n'
+
+
+@pytest.fixture
+def admitted_app(monkeypatch):
+    import model_catalog
+    import pipeline
+    controller = admission.AdmissionController(max_concurrent=8, max_per_model=4, queue_size=32, queue_timeout=5)
+    monkeypatch.setattr(admission, "controller", controller)
+    monkeypatch.setattr(model_catalog.catalog, "is_known", lambda model: True)
+    gate, calls = threading.Event(), []
+
+    def post(path, payload, stream=False, **kwargs):
+        calls.append(payload)
+        return GatedUpstream(gate)
+
+    monkeypatch.setattr(pipeline.ollama_client, "post", post)
+    app = Flask(__name__)
+    admission.install(app, {'stream_chat': 'interactive'})
+    app.add_url_rule('/api/chat/stream', 'stream_chat', pipeline.Route("chat", stream=True).handle, methods=['POST'])
+    return app, controller, calls, gate
+
+
+def test_identical_streams_share_one_slot(admitted_app):
+    import singleflight
+    app, controller, calls, gate = admitted_app
+    body = {"messages": [{"role": "user", "content": "hi"}]}
+    results = []
+
+    def request():
+        response = app.test_client().post('/api/chat/stream', json=body)
+        results.append((response.status_code, response.get_data()))
+        response.close()
+
+    threads = [threading.Thread(target=request) for _ in range(12)]
+    for thread in threads:
+        thread.start()
+    # Every request joins before the upstream sends anything
+    deadline = time.monotonic() + 5
+    while sum(f.subscribers for f in singleflight.streams._flights.values()) < 12 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    gate.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(results) == 12
+    for status, data in results:
+        assert status == 200
+        assert b'"done": true' in data
+
+    stats = controller.stats()
+    assert len(calls) == 1
+    assert stats["admitted"] == 1
+    assert stats["queue_waits"] == 0
+    assert stats["active"] == 0
+
+
+def test_stream_without_a_slot_is_rejected(admitted_app, monkeypatch):
+    app, _, calls, gate = admitted_app
+    monkeypatch.setattr(admission, "controller", admission.AdmissionController(0, 0, 0, 0.01))
+    gate.set()
+
+    response = app.test_client().post('/api/chat/stream', json={"messages": [{"role": "user", "content": "hi"}]})
+    assert response.status_code == 429
+    assert response.headers['Retry-After']
+    response.close()
+    assert calls == []
@@ -0,0 +1,78 @@
+import pytest
+import model_catalog
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import app
+    monkeypatch.setattr(model_catalog.catalog, "is_known", lambda model: True)
+    return app.app.test_client()
+
+
+@pytest.mark.parametrize("body, message", [
+    ({"prompts": []}, "'prompts' must be a non-empty list of strings"),
+    ({"prompts": ["a", 2]}, "'prompts' must be a non-empty list of strings"),
+    ({"prompts": ["a"], "concurrency": "x"}, "'concurrency' must be a positive integer"),
+    ({"prompts": ["a"], "concurrency": 0}, "'concurrency' must be a positive integer"),
+    ({"prompts": ["a"], "temperature": "hot"}, "'temperature' must be a number"),
+    ({"prompts": ["a"], "model": 5}, "'model' must be a string"),
+])
+def test_invalid_batches_are_rejected(client, body, message):
+    response = client.post('/api/generate/batch', json=body)
+    assert response.status_code == 400
+    assert message in response.get_json()["error"]
+    response.close()
+
+
+def test_batch_payloads_are_built_like_generate(client, monkeypatch):
+    import batch
+    runs = []
+
+    def run(payloads, client_key, concurrency):
+        runs.append((payloads, concurrency))
+        return iter([{"index": i, "response": "ok"} for i in range(len(payloads))])
+
+    monkeypatch.setattr(batch, "run", run)
+    response = client.post('/api/generate/batch', json={
+        "prompts": ["one", "two"], "temperature": 0, "top_k": 5, "system": "Be brief.", "concurrency": 2})
+    assert response.status_code == 200
+    assert len(response.get_data().splitlines()) == 2
+    response.close()
+
+    (payloads, concurrency), = runs
+    assert concurrency == 2
+    assert [p["prompt"] for p in payloads] == ["one", "two"]
+    for payload in payloads:
+        assert payload["options"] == {"temperature": 0, "top_k": 5}
+        assert payload["system"] == "Be brief."
+        assert payload["stream"] is False
+        assert "temperature" not in payload and "keep_alive" in payload
+
+
+def test_prompt_without_a_slot_fails_after_the_deadline(monkeypatch):
+    import admission
+    import batch
+    import config
+    import response_cache
+    monkeypatch.setattr(config, "BATCH_ADMISSION_TIMEOUT", 0.05)
+    monkeypatch.setattr(response_cache, "get", lambda key: None)
+    # No slots and no queue: every attempt is rejected at once
+    monkeypatch.setattr(admission, "controller", admission.AdmissionController(0, 0, 0, 0.01))
+
+    results = list(batch.run([{"model": "m", "prompt": "p"}], "ip:test", 1))
+    assert results[0]["index"] == 0
+    assert "No generation slot" in results[0]["error"]
+
+
+def test_retried_request_keeps_its_fair_share_tag():
+    import admission
+    import scheduler
+    policy = scheduler.FairSharePolicy()
+    controller = admission.AdmissionController(1, 1, 4, 0.01, policy)
+    controller.acquire(scheduler.Request("m", "other"))  # Holds the only slot
+
+    req = scheduler.Request("m", "ip:batch", "batch", cost=10)
+    for _ in range(3):
+        with pytest.raises(admission.Rejected):
+            controller.acquire(req)
+    assert policy._last_finish["ip:batch"] == 10
@@ -0,0 +1,59 @@
+import pytest
+import config
+import metrics
+
+
+@pytest.fixture
+def client():
+    import app
+    return app.app.test_client()
+
+
+def test_counter_and_histogram_exposition():
+    counter = metrics.Counter("test_total", "A counter", ("route",))
+    histogram = metrics.Histogram("test_seconds", "A histogram", ("route",), buckets=(0.1, 1))
+    try:
+        counter.inc("/a")
+        counter.inc("/a", amount=2)
+        histogram.observe(0.5, "/a")
+        assert counter.render().splitlines() == [
+            "# HELP test_total A counter",
+            "# TYPE test_total counter",
+            'test_total{route="/a"} 3',
+        ]
+        assert histogram.render().splitlines()[2:] == [
+            'test_seconds_bucket{route="/a",le="0.1"} 0',
+            'test_seconds_bucket{route="/a",le="1"} 1',
+            'test_seconds_bucket{route="/a",le="+Inf"} 1',
+            'test_seconds_sum{route="/a"} 0.5',
+            'test_seconds_count{route="/a"} 1',
+        ]
+    finally:
+        metrics._registry.remove(counter)
+        metrics._registry.remove(histogram)
+
+
+def test_label_values_are_escaped():
+    assert metrics._format_labels(("model",), ('a"b\\c\n',)) == '{model="a\\"b\\\\c\\n"}'
+
+
+def test_model_label_is_bounded(monkeypatch):
+    monkeypatch.setattr(metrics, "_models", set())
+    monkeypatch.setattr(config, "METRICS_MAX_MODELS", 2)
+    assert metrics.model_label("a") == "a"
+    assert metrics.model_label("b") == "b"
+    assert metrics.model_label("c") == metrics.OTHER_MODEL
+    assert metrics.model_label("a") == "a"
+    assert metrics.model_label(5) == metrics.OTHER_MODEL
+
+
+def test_invalid_model_does_not_break_metrics(client):
+    response = client.post('/api/chat', json={"model": 5, "messages": []})
+    assert response.status_code == 400
+    response.close()
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    assert 'msrit_requests_total{route="/api/chat",model="other",status="400"}' in body
+    assert 'msrit_in_flight_requests{route="/api/chat"} 0' in body
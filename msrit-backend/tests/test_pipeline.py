@@ -0,0 +1,169 @@
+import json
+import threading
+import time
+import pytest
+from flask import Flask
+import conversation_log
+import model_catalog
+import pipeline
+
+
+class FakeStream:
+    """A streaming Ollama /chat response, one line every interval seconds"""
+
+    status_code = 200
+    text = ""
+
+    def __init__(self, tokens, interval: float):
+        self.lines = [json.dumps({"message": {"role": "assistant", "content": t}, "done": False}).encode() + b"\n"
+                      for t in tokens]
+        self.lines.append(json.dumps({"message": {"role": "assistant", "content": ""}, "done": True,
+                                      "eval_count": len(tokens), "eval_duration": 1000}).encode() + b"\n")
+        self.interval = interval
+        self.raw = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def iter_content(self, chunk_size=None):
+        for line in self.lines:
+            time.sleep(self.interval)
+            yield line
+
+
+@pytest.fixture
+def chat_app(monkeypatch):
+    upstream_calls = []
+    logged = []
+
+    def post(path, payload, stream=False, **kwargs):
+        upstream_calls.append(payload)
+        return FakeStream(["Hello", " there"], interval=0.05)
+
+    monkeypatch.setattr(pipeline.ollama_client, "post", post)
+    monkeypatch.setattr(model_catalog.catalog, "is_known", lambda model: True)
+    monkeypatch.setattr(conversation_log, "log", object())
+    monkeypatch.setattr(conversation_log, "record", lambda *args, **kwargs: logged.append((args, kwargs)))
+
+    app = Flask(__name__)
+    route = pipeline.Route("chat", stream=True, hooks=[pipeline.ConversationLog()])
+    app.add_url_rule('/api/chat/stream', 'stream_chat', route.handle, methods=['POST'])
+    return app, upstream_calls, logged
+
+
+BODY = {"messages": [{"role": "user", "content": "hi"}]}
+
+
+def read_stream(app, headers=None) -> bytes:
+    response = app.test_client().post('/api/chat/stream', json=BODY, headers=headers or {})
+    data = response.get_data()
+    response.close()
+    return data
+
+
+def stream_id_of(data: bytes) -> str:
+    last_id = data.decode().strip().split("\n")[-1]
+    assert last_id.startswith("id: ")
+    return last_id[4:].rpartition(":")[0]
+
+
+def test_every_subscriber_of_a_shared_stream_is_logged(chat_app):
+    app, upstream_calls, logged = chat_app
+    results = [None] * 4
+
+    def client(i):
+        results[i] = read_stream(app)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert len(upstream_calls) == 1
+    assert all(r == results[0] and b'"done":true' in r.replace(b" ", b"") for r in results)
+    assert len(logged) == 4
+    for args, kwargs in logged:
+        assert args[1] == BODY["messages"]
+        assert json.loads(args[2])["message"]["content"] == "Hello there"
+
+
+def test_resumed_stream_is_logged(chat_app):
+    app, upstream_calls, logged = chat_app
+    first = read_stream(app)
+    stream_id = stream_id_of(first)
+
+    resumed = read_stream(app, {"Last-Event-ID": f"{stream_id}:0"})
+    assert len(upstream_calls) == 1
+    # Everything after the first frame, from the replay buffer
+    assert resumed and resumed != first and first.endswith(resumed)
+    assert len(logged) == 2
+
+
+def test_resume_starts_after_the_last_line_received(chat_app, monkeypatch):
+    app, upstream_calls, logged = chat_app
+    upstream = FakeStream(["one", " two", " three"], interval=0)
+    # All lines arrive in one read
+    upstream.lines = [b"".join(upstream.lines)]
+    monkeypatch.setattr(pipeline.ollama_client, "post", lambda path, payload, stream=False, **kwargs: upstream)
+
+    first = read_stream(app)
+    ids = [line[4:] for line in first.decode().split("\n") if line.startswith("id: ")]
+    assert len(ids) == 4  # One per line, not one per read
+
+    # The client saw the first two lines before the connection dropped
+    resumed = read_stream(app, {"Last-Event-ID": ids[1]})
+    events = [json.loads(line[6:]) for line in resumed.decode().split("\n") if line.startswith("data: ")]
+    assert [e["message"]["content"] for e in events] == [" three", ""]
+
+
+def test_stream_id_resumes_only_the_same_route_and_request(chat_app):
+    app, upstream_calls, logged = chat_app
+    route = pipeline.Route("generate", stream=True)
+    app.add_url_rule('/api/generate/stream', 'stream_generate', route.handle, methods=['POST'])
+    stream_id = stream_id_of(read_stream(app))
+    client = app.test_client()
+
+    # Another route: a fresh generate stream, not a replay of the chat
+    response = client.post('/api/generate/stream', json={"prompt": "hi"},
+                           headers={"Last-Event-ID": f"{stream_id}:0"})
+    response.get_data()
+    response.close()
+    assert len(upstream_calls) == 2
+    assert upstream_calls[-1]["prompt"] == "hi"
+
+    # The same route with a different request: a fresh chat stream
+    other = {"messages": [{"role": "user", "content": "something else"}]}
+    response = client.post('/api/chat/stream', json=other, headers={"Last-Event-ID": f"{stream_id}:0"})
+    response.get_data()
+    response.close()
+    assert len(upstream_calls) == 3
+    assert upstream_calls[-1]["messages"] == other["messages"]
+
+
+def test_stream_upstream_span_is_a_child_of_the_route_span(chat_app, monkeypatch):
+    import config
+    import tracing
+    app, _, _ = chat_app
+    spans = []
+    monkeypatch.setattr(config, "TRACING_ENABLED", True)
+    monkeypatch.setattr(tracing._exporter, "submit", spans.append)
+    tracing.install(app)
+
+    fake_post = pipeline.ollama_client.post
+
+    def traced_post(path, payload, stream=False, **kwargs):
+        # As ollama_client._send does
+        with tracing.span(f"ollama POST {path}", tracing.CLIENT):
+            return fake_post(path, payload, stream, **kwargs)
+
+    monkeypatch.setattr(pipeline.ollama_client, "post", traced_post)
+    read_stream(app)
+
+    server = next(s for s in spans if s.kind == tracing.SERVER)
+    upstream = next(s for s in spans if s.kind == tracing.CLIENT)
+    assert upstream.trace_id == server.trace_id
+    assert upstream.parent_id == server.span_id
@@ -0,0 +1,15 @@
+import pytest
+import config
+import retrieval
+
+
+def test_missing_index_fails_at_startup_when_enabled(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "RETRIEVAL_ENABLED", True)
+    monkeypatch.setattr(config, "RETRIEVAL_INDEX_PATH", str(tmp_path / "missing"))
+    with pytest.raises(RuntimeError, match="retrieval index"):
+        retrieval._load_index()
+
+
+def test_no_index_when_disabled(monkeypatch):
+    monkeypatch.setattr(config, "RETRIEVAL_ENABLED", False)
+    assert retrieval._load_index() is None
@@ -0,0 +1,44 @@
+import scheduler
+import scheduler_sim
+
+SEED = 0
+SLOTS = 4
+
+
+def run(policy: str, jobs=None) -> dict:
+    jobs = jobs if jobs is not None else scheduler_sim.default_workload(SEED)
+    return scheduler_sim.summarize(scheduler_sim.simulate(scheduler.POLICIES[policy](), jobs, SLOTS))
+
+
+def test_simulation_is_deterministic():
+    assert run("fair") == run("fair")
+    assert run("fifo") == run("fifo")
+
+
+def test_fair_share_keeps_interactive_waits_short():
+    fair = run("fair")["interactive"]
+    fifo = run("fifo")["interactive"]
+
+    # A batch client dumping 40 long prompts must not hold up chat turns: they
+    # wait at most for one running batch prompt to finish
+    assert fair["wait_mean"] < 5
+    assert fair["wait_p95"] < 15
+    assert fair["wait_mean"] < fifo["wait_mean"] / 5
+    assert fair["wait_p95"] < fifo["wait_p95"]
+
+
+def test_every_batch_prompt_still_runs():
+    fair = run("fair")["batch"]
+    assert fair["requests"] == 40
+    assert fair["wait_max"] < 120
+
+
+def test_short_prompts_are_not_stuck_behind_long_ones_within_a_class():
+    heavy = [scheduler_sim.Job(0.0, "heavy", "batch", 3000) for _ in range(10)]
+    light = [scheduler_sim.Job(0.1, "light", "batch", 50) for _ in range(3)]
+    jobs = scheduler_sim.simulate(scheduler.FairSharePolicy(), heavy + light, slots=1)
+
+    light_starts = [job.started for job in jobs if job.req.client == "light"]
+    heavy_starts = sorted(job.started for job in jobs if job.req.client == "heavy")
+    # The light client's prompts run right after the heavy prompt in progress
+    assert max(light_starts) < heavy_starts[2]
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from semantic_cache import SemanticIndex
+
+A = np.array([1.0, 0.0], dtype=np.float32)
+B = np.array([0.0, 1.0], dtype=np.float32)
+
+
+def test_index_is_reloaded_from_disk(tmp_path):
+    index = SemanticIndex(2, str(tmp_path))
+    assert index.add(0, A, b'{"answer": "a"}')
+
+    reopened = SemanticIndex(2, str(tmp_path))
+    assert reopened.search(0, A)[0] == b'{"answer": "a"}'
+    assert reopened.search(1, A)[0] is None  # Other scope
+
+
+def test_crash_while_reusing_a_slot_leaves_it_empty(tmp_path):
+    index = SemanticIndex(1, str(tmp_path))
+    assert index.add(0, A, b'{"answer": "a"}')
+
+    # The process dies after the new vector is flushed, before its answer line
+    append = index._append
+
+    def crash(record):
+        if record["body"] is not None:
+            raise SystemExit("crash")
+        append(record)
+
+    index._append = crash
+    with pytest.raises(SystemExit):
+        index.add(0, B, b'{"answer": "b"}')
+
+    reopened = SemanticIndex(1, str(tmp_path))
+    assert len(reopened) == 0
+    assert reopened.search(0, B)[0] is None
+    assert reopened.search(0, A)[0] is None
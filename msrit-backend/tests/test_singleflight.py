@@ -0,0 +1,107 @@
+import threading
+import time
+import pytest
+import config
+from singleflight import CallGroup, StreamGroup
+
+
+@pytest.fixture(autouse=True)
+def no_leftover_threads():
+    """Wait for the producers a test started, so later tests see a quiet process"""
+    before = set(threading.enumerate())
+    yield
+    for thread in set(threading.enumerate()) - before:
+        thread.join(2)
+
+
+def test_concurrent_calls_share_one_result():
+    group, started, release = CallGroup(), threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "answer"
+
+    leader = threading.Thread(target=lambda: results.append(group.do("key", fn)))
+    leader.start()
+    assert started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(group.do("key", fn))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert calls == [1]
+    assert results == ["answer"] * 4
+
+
+def test_call_error_reaches_every_caller():
+    group = CallGroup()
+
+    def fn():
+        raise ValueError("upstream failed")
+
+    with pytest.raises(ValueError):
+        group.do("key", fn)
+    # The failed call is not kept; the next caller runs again
+    assert group.do("key", lambda: "ok") == "ok"
+
+
+def test_stream_fans_out_to_late_joiners():
+    group, release = StreamGroup(), threading.Event()
+    produced = []
+
+    def produce():
+        produced.append(1)
+        yield b"a"
+        release.wait(5)
+        yield b"b"
+        return "done"
+
+    first = group.join("key", produce)
+    while not first.frames:
+        time.sleep(0.01)
+    second = group.join("key", produce)
+    assert second is first
+    release.set()
+
+    frames = [frame for _, batch in second.iterate() for frame in batch]
+    assert frames == [b"a", b"b"]
+    assert first.result == "done"
+    assert produced == [1]
+    group.leave(first)
+    group.leave(second)
+
+
+def test_producer_stops_when_the_last_subscriber_leaves(monkeypatch):
+    monkeypatch.setattr(config, "STREAM_RESUME_GRACE", 0)
+    group, closed = StreamGroup(), threading.Event()
+
+    def produce():
+        try:
+            while True:
+                time.sleep(0.01)
+                yield b"token"
+        finally:
+            closed.set()
+
+    flight = group.join("key", produce)
+    other = group.join("key", produce)
+    group.leave(flight)
+    assert not flight.cancelled
+
+    group.leave(other)
+    assert flight.cancelled
+    assert closed.wait(1)
+    with flight.cond:
+        while not flight.done:
+            assert flight.cond.wait(1)
+    assert group.resume(flight.id) is None
+    # A new request for the same key starts a fresh generation
+    fresh = group.join("key", produce)
+    assert fresh is not flight
+    group.leave(fresh)
@@ -0,0 +1,70 @@
+import sse_relay
+
+
+def parse_events(stream: bytes) -> list:
+    """Dispatched events as (data, last event id), following the SSE parsing rules"""
+    events, data, last_id = [], [], ""
+    for line in stream.decode("utf-8").split("\n"):
+        if not line:
+            if data:
+                events.append(("\n".join(data), last_id))
+            data = []
+            continue
+        field, _, value = line.partition(":")
+        value = value[1:] if value.startswith(" ") else value
+        if field == "data":
+            data.append(value)
+        elif field == "id":
+            last_id = value
+    return events
+
+
+def test_frame_serializes_dicts_and_passes_strings_through():
+    assert sse_relay.frame({"done": True}) == b'data: {"done":true}\n\n'
+    assert sse_relay.frame("plain") == b"data: plain\n\n"
+    assert sse_relay.frame(b"raw") == b"data: raw\n\n"
+
+
+def test_frame_lines_makes_one_event_per_line():
+    assert sse_relay.frame_lines(b'{"a":1}\n{"b":2}') == b'data: {"a":1}\n\ndata: {"b":2}\n\n'
+
+
+def test_ids_are_attached_to_the_data_they_name():
+    batch = [sse_relay.frame_lines(b'{"a":1}'), sse_relay.frame_lines(b'{"b":2}\n{"c":3}')]
+    stream = sse_relay.with_ids("abc", 5, batch)
+
+    assert stream == (b'data: {"a":1}\nid: abc:5\n\n'
+                      b'data: {"b":2}\n\ndata: {"c":3}\nid: abc:6\n\n')
+    assert parse_events(stream) == [('{"a":1}', "abc:5"), ('{"b":2}', "abc:5"), ('{"c":3}', "abc:6")]
+
+
+def test_every_line_gets_its_own_id():
+    batch = sse_relay.line_frames(b'{"a":1}\n{"b":2}') + sse_relay.line_frames(b'{"c":3}')
+    stream = sse_relay.with_ids("abc", 5, batch)
+    assert parse_events(stream) == [('{"a":1}', "abc:5"), ('{"b":2}', "abc:6"), ('{"c":3}', "abc:7")]
+
+
+def test_parse_event_id():
+    assert sse_relay.parse_event_id("abc:5") == ("abc", 6)
+    assert sse_relay.parse_event_id(" abc:0 ") == ("abc", 1)
+    for value in (None, "", "abc", "abc:", ":3", "abc:x"):
+        assert sse_relay.parse_event_id(value) is None
+
+
+def test_framer_carries_partial_lines_over():
+    framer = sse_relay.Framer()
+    assert framer.feed(b'{"a"') == b""
+    assert framer.feed(b':1}\n{"b":2}\n{"c"') == b'{"a":1}\n{"b":2}'
+    assert framer.flush() == b'{"c"'
+    assert framer.flush() == b""
+
+
+def test_is_done_looks_at_the_last_line_only():
+    assert sse_relay.is_done(b'{"done": false}\n{"done": true}')
+    assert not sse_relay.is_done(b'{"done": true}\n{"done": false}')
+
+
+def test_parse_skips_bad_lines():
+    assert sse_relay.parse([b'{"a":1}\n{"b":2}', b'{"c":3}']) == [{"a": 1}, {"b": 2}, {"c": 3}]
+    assert sse_relay.parse([b'{"a":1}\nnot json']) == [{"a": 1}]
+    assert sse_relay.parse([]) == []
@@ -0,0 +1,91 @@
+import threading
+import time
+import pytest
+from stream_bridge import StreamBridge
+
+
+class SlowUpstream:
+    """Stands in for a streaming Ollama response: one chunk every interval seconds"""
+
+    def __init__(self, interval: float, chunks: int = 1000):
+        self.interval = interval
+        self.chunks = chunks
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+    def __iter__(self):
+        for i in range(self.chunks):
+            time.sleep(self.interval)
+            yield b"data: %d\n\n" % i
+
+
+def relay(bridge: StreamBridge, upstream: SlowUpstream):
+    """The shape of the streaming routes: producer on a worker, consumer in the response"""
+    def run():
+        with upstream:
+            for chunk in upstream:
+                bridge.put(chunk)
+
+    bridge.start(run)
+    try:
+        yield from bridge
+    finally:
+        bridge.cancel()
+
+
+def wait_for(condition, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.mark.parametrize("maxsize", [64, 1])
+def test_disconnect_stops_producer_and_closes_upstream(maxsize):
+    baseline = threading.active_count()
+    upstream = SlowUpstream(interval=0.01)
+    bridge = StreamBridge(maxsize=maxsize)
+    stream = relay(bridge, upstream)
+
+    assert next(stream) == b"data: 0\n\n"
+    assert next(stream) == b"data: 1\n\n"
+    if maxsize == 1:
+        # Let the producer block on the full queue before the client goes away
+        time.sleep(0.1)
+    stream.close()  # What the server does when the client disconnects
+
+    bridge.thread.join(timeout=1.0)
+    assert not bridge.thread.is_alive()
+    assert upstream.closed
+    assert wait_for(lambda: threading.active_count() == baseline)
+
+
+def test_idle_stream_uses_no_cpu():
+    upstream = SlowUpstream(interval=1.0, chunks=1)
+    bridge = StreamBridge()
+    stream = relay(bridge, upstream)
+    reader = threading.Thread(target=lambda: list(stream))
+
+    started = time.process_time()
+    reader.start()
+    time.sleep(0.5)  # Producer and consumer are both waiting
+    used = time.process_time() - started
+
+    reader.join(timeout=2.0)
+    assert not reader.is_alive()
+    assert used < 0.05
+
+
+def test_coalesced_joins_queued_chunks():
+    bridge = StreamBridge()
+    for chunk in (b"a", b"b", b"c"):
+        bridge.put(chunk)
+    bridge.close()
+    assert list(bridge.coalesced(linger=0)) == [b"abc"]
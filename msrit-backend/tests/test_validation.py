@@ -0,0 +1,64 @@
+import importlib.util
+import os
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_langgraph():
+    """The langraph-chat module, whose file name is not importable"""
+    pytest.importorskip("langgraph")
+    spec = importlib.util.spec_from_file_location("langraph_chat", os.path.join(BACKEND, "langraph-chat.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="module", params=["app", "langgraph"])
+def client(request):
+    if request.param == "app":
+        import app
+        return app.app.test_client()
+    return load_langgraph().app.test_client()
+
+
+@pytest.mark.parametrize("path, body, message", [
+    ('/api/chat', {"model": 5, "messages": []}, "'model' must be a string"),
+    ('/api/chat/stream', {"model": ["x"], "messages": []}, "'model' must be a string"),
+    ('/api/chat', {"messages": "hi"}, "'messages' must be an array"),
+    ('/api/chat/stream', {"messages": [{"content": "hi"}]}, "'messages[].role' field is required"),
+    ('/api/chat', None, "'messages' field is required"),
+    ('/api/sessions', {"model": 5}, "'model' must be a string"),
+    ('/api/sessions', {"system": ["x"]}, "'system' must be a string"),
+])
+def test_invalid_bodies_are_rejected(client, path, body, message):
+    response = client.post(path, json=body) if body is not None else client.post(path, data="not json")
+    assert response.status_code == 400
+    assert message in response.get_json()["error"]
+    response.close()
+
+
+def test_session_message_content_must_be_a_string(client):
+    response = client.post('/api/sessions', json={})
+    session_id = response.get_json()["session_id"]
+    response.close()
+
+    for body, message in (({}, "'content' field is required"), ({"content": 5}, "'content' must be a string")):
+        response = client.post(f'/api/sessions/{session_id}/messages', json=body)
+        assert response.status_code == 400
+        assert message in response.get_json()["error"]
+        response.close()
+
+
+def test_stream_error_ends_with_a_single_done_frame(monkeypatch):
+    graph_module = load_langgraph()
+
+    def post(*args, **kwargs):
+        raise ConnectionError("upstream down")
+
+    monkeypatch.setattr(graph_module.ollama_client, "post", post)
+    frames = []
+    graph_module.stream_ollama_response({"model": "m", "messages": [], "stream_handler": frames.append})
+
+    assert len(frames) == 1
+    assert b'"error"' in frames[0] and b'"done"' in frames[0]
@@ -0,0 +1,309 @@
+"""
+Request tracing with OpenTelemetry-style spans.
+
+A trace covers one request: a server span for the Flask route, internal spans
+for each LangGraph node, and client spans for every call to Ollama. Spans carry
+attributes such as the model, prompt size and token counts, and streams add a
+"first_token" event. An incoming W3C traceparent header continues the caller's
+trace.
+
+Finished spans are queued and written by a background thread, either as JSON
+lines (TRACING_EXPORTER = "jsonl", to TRACING_JSONL_PATH or stdout) or as OTLP
+over HTTP/JSON to a collector (TRACING_EXPORTER = "otlp"). A full export queue
+drops spans instead of slowing requests down.
+
+With TRACING_ENABLED off, span() returns a shared no-op span and traced()
+returns the wrapped function unchanged, so nothing is allocated or timed.
+"""
+
+import contextvars
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Callable, List, Optional
+import requests
+from flask import g, request
+import config
+
+SERVER, CLIENT, INTERNAL = "server", "client", "internal"
+
+# OTLP span kinds
+_OTLP_KINDS = {INTERNAL: 1, SERVER: 2, CLIENT: 3}
+
+_current: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """A timed operation within a trace"""
+
+    def __init__(self, name: str, kind: str, parent: Optional["Span"] = None, trace_id: str = None, parent_id: str = None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent else (trace_id or os.urandom(16).hex())
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = {}
+        self.events = []
+        self.error = None
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def add_event(self, name: str, **attributes) -> None:
+        self.events.append((time.time_ns(), name, attributes))
+
+    def record_error(self, error: BaseException) -> None:
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            _exporter.submit(self)
+
+    def __enter__(self) -> "Span":
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _current.reset(self._token)
+        if exc is not None:
+            self.record_error(exc)
+        self.end()
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "events": [{"time_ns": t, "name": n, "attributes": a} for t, n, a in self.events],
+            "error": self.error
+        }
+
+
+class _NoopSpan:
+    """Stand-in returned while tracing is off"""
+
+    def set_attribute(self, key: str, value) -> None:
+        pass
+
+    def add_event(self, name: str, **attributes) -> None:
+        pass
+
+    def record_error(self, error: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+NOOP = _NoopSpan()
+
+
+def span(name: str, kind: str = INTERNAL, **attributes):
+    """Start a child of the current span; use as a context manager"""
+    if not config.TRACING_ENABLED:
+        return NOOP
+    s = Span(name, kind, _current.get())
+    s.attributes.update(attributes)
+    return s
+
+
+def current():
+    """The active span, or the no-op span"""
+    return _current.get() or NOOP
+
+
+def traced(name: str, fn: Callable, attributes: Callable = None) -> Callable:
+    """Wrap fn (e.g. a graph node) in a span; fn itself when tracing is off
+
+    attributes(*args) returns extra span attributes taken from the arguments.
+    """
+    if not config.TRACING_ENABLED:
+        return fn
+
+    def wrapper(*args, **kwargs):
+        with span(name) as s:
+            if attributes:
+                s.attributes.update(attributes(*args))
+            return fn(*args, **kwargs)
+
+    wrapper.__name__ = getattr(fn, "__name__", name)
+    wrapper.__doc__ = fn.__doc__
+    return wrapper
+
+
+def bind(fn: Callable) -> Callable:
+    """Run fn under the current span, e.g. on a worker thread; fn itself when tracing is off"""
+    if not config.TRACING_ENABLED:
+        return fn
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
+
+
+def _parse_traceparent(header: Optional[str]):
+    """(trace_id, parent_id) from a W3C traceparent header, or (None, None)"""
+    parts = (header or "").split("-")
+    if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+        return parts[1], parts[2]
+    return None, None
+
+
+class _Exporter:
+    """Background thread that writes finished spans in batches"""
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=config.TRACING_QUEUE_SIZE)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def submit(self, s: Span) -> None:
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(s)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        write = _otlp_write if config.TRACING_EXPORTER == "otlp" else _jsonl_write
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + config.TRACING_FLUSH_INTERVAL
+            while len(batch) < 512:
+                try:
+                    batch.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                write(batch)
+            except Exception as e:
+                print(f"Trace export failed: {e}", file=sys.stderr)
+
+
+_exporter = _Exporter()
+
+
+def _jsonl_write(batch: List[Span]) -> None:
+    lines = "".join(json.dumps(s.to_dict(), default=str) + "\n" for s in batch)
+    if config.TRACING_JSONL_PATH:
+        with open(config.TRACING_JSONL_PATH, "a") as f:
+            f.write(lines)
+    else:
+        sys.stdout.write(lines)
+        sys.stdout.flush()
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict) -> list:
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items() if v is not None]
+
+
+def _otlp_span(s: Span) -> dict:
+    data = {
+        "traceId": s.trace_id,
+        "spanId": s.span_id,
+        "name": s.name,
+        "kind": _OTLP_KINDS[s.kind],
+        "startTimeUnixNano": str(s.start_ns),
+        "endTimeUnixNano": str(s.end_ns),
+        "attributes": _otlp_attributes(s.attributes),
+        "events": [
+            {"timeUnixNano": str(t), "name": n, "attributes": _otlp_attributes(a)}
+            for t, n, a in s.events
+        ],
+        "status": {"code": 2, "message": s.error} if s.error else {"code": 0}
+    }
+    if s.parent_id:
+        data["parentSpanId"] = s.parent_id
+    return data
+
+
+_otlp_session = requests.Session()
+
+
+def _otlp_write(batch: List[Span]) -> None:
+    body = {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": config.TRACING_SERVICE_NAME})},
+            "scopeSpans": [{"scope": {"name": "msrit-backend"}, "spans": [_otlp_span(s) for s in batch]}]
+        }]
+    }
+    _otlp_session.post(config.TRACING_OTLP_ENDPOINT, json=body, timeout=5).raise_for_status()
+
+
+def install(app) -> None:
+    """Open a server span for every /api request; no hooks when tracing is off"""
+    if not config.TRACING_ENABLED:
+        return
+
+    @app.before_request
+    def start_span():
+        if not request.path.startswith('/api/'):
+            return
+        route = request.url_rule.rule if request.url_rule else request.path
+        trace_id, parent_id = _parse_traceparent(request.headers.get('traceparent'))
+        s = Span(f"{request.method} {route}", SERVER, trace_id=trace_id, parent_id=parent_id)
+        s.set_attribute("http.method", request.method)
+        s.set_attribute("http.route", route)
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            s.set_attribute("model", data.get('model', config.OLLAMA_MODEL))
+        g.trace_span = s
+        g.trace_token = _current.set(s)
+
+    @app.after_request
+    def end_span(response):
+        s = g.pop('trace_span', None)
+        if s is None:
+            return response
+        s.set_attribute("http.status_code", response.status_code)
+        # Streams end their span when the response is closed
+        response.call_on_close(s.end)
+        return response
+
+    @app.teardown_request
+    def end_span_on_error(exc):
+        s = g.pop('trace_span', None)
+        if s is not None:
+            if exc is not None:
+                s.record_error(exc)
+            s.end()
+        token = g.pop('trace_token', None)
+        if token is not None:
+            try:
+                _current.reset(token)
+            except ValueError:
+                _current.set(None)